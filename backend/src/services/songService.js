@@ -11,7 +11,52 @@ class SongService {
     }
 
     static async createSong(songData) {
-        return Song.create(songData);
+        const song = await Song.create(songData);
+        // Make the song recommendable right away instead of after the next model rebuild
+        if (song.release_date) {
+            axios.post('http://localhost:5000/tracks', {
+                tracks: [SongService.toRecommenderTrack(song)]
+            }).catch(error => console.error('Error adding song to the recommendation service:', error.message));
+        }
+        return song;
+    }
+
+    static toRecommenderTrack(song) {
+        const seed = SongService.toRecommenderSeed(song);
+        return {
+            track_id: song.spotify_id,
+            track_name: song.name || '',
+            track_artist: song.artist || '',
+            track_album_name: song.album || '',
+            track_album_release_date: seed.release_date,
+            track_popularity: seed.track_popularity,
+            playlist_genre: seed.playlist_genre,
+            playlist_subgenre: seed.playlist_subgenre,
+            lyrics: song.lyrics || null,
+            ...seed.audio_features
+        };
+    }
+
+    static toRecommenderSeed(song) {
+        return {
+            spotify_id: song.spotify_id,
+            audio_features: {
+                danceability: parseFloat(song.danceability) || 0,
+                energy: parseFloat(song.energy) || 0,
+                loudness: parseFloat(song.loudness) || 0,
+                speechiness: parseFloat(song.speechiness) || 0,
+                acousticness: parseFloat(song.acousticness) || 0,
+                instrumentalness: parseFloat(song.instrumentalness) || 0,
+                liveness: parseFloat(song.liveness) || 0,
+                valence: parseFloat(song.valence) || 0,
+                tempo: parseFloat(song.tempo) || 0
+            },
+            lyrics: song.lyrics || '',
+            release_date: song.release_date ? new Date(song.release_date).toISOString().split('T')[0] : null,
+            track_popularity: song.track_popularity || 0,
+            playlist_genre: song.playlist_genre || '',
+            playlist_subgenre: song.playlist_subgenre || ''
+        };
     }
 
     static async getRecommendations(spotifyIds) {
@@ -22,32 +67,26 @@ class SongService {
                 throw new Error('No songs found with provided spotify IDs');
             }
 
-            const songsData = songs.map(song => ({
-                spotify_id: song.spotify_id,
-                audio_features: {
-                    danceability: parseFloat(song.danceability) || 0,
-                    energy: parseFloat(song.energy) || 0,
-                    loudness: parseFloat(song.loudness) || 0,
-                    speechiness: parseFloat(song.speechiness) || 0,
-                    acousticness: parseFloat(song.acousticness) || 0,
-                    instrumentalness: parseFloat(song.instrumentalness) || 0,
-                    liveness: parseFloat(song.liveness) || 0,
-                    valence: parseFloat(song.valence) || 0,
-                    tempo: parseFloat(song.tempo) || 0
-                },
-                lyrics: song.lyrics || '',
-                release_date: song.release_date ? new Date(song.release_date).toISOString().split('T')[0] : null,
-                track_popularity: song.track_popularity || 0,
-                playlist_genre: song.playlist_genre || '',
-                playlist_subgenre: song.playlist_subgenre || ''
-            }));
-
-            console.log('Sending data to recommendation service:', JSON.stringify(songsData, null, 2));
-
-            const response = await axios.post('http://localhost:5000/recommend', {
-                songs: songsData,
+            // The recommender already has catalog songs featurized, so send ids first
+            // and only ship features and lyrics for songs it could not resolve
+            let response = await axios.post('http://localhost:5000/recommend', {
+                songs: songs.map(song => ({ spotify_id: song.spotify_id })),
                 n_recommendations: 5
             });
+
+            const unresolved = new Set(response.data.unresolved || []);
+            if (unresolved.size > 0) {
+                const songsData = songs.map(song => (
+                    unresolved.has(song.spotify_id) ? SongService.toRecommenderSeed(song) : { spotify_id: song.spotify_id }
+                ));
+
+                console.log('Sending features for songs unknown to the recommendation service:', [...unresolved]);
+
+                response = await axios.post('http://localhost:5000/recommend', {
+                    songs: songsData,
+                    n_recommendations: 5
+                });
+            }
             
             return response.data.recommendations;
         } catch (error) {
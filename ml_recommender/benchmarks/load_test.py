@@ -0,0 +1,225 @@
+"""Load test of /recommend against a real uvicorn server
+
+Starts `uvicorn main:app` from a checkout of the project in a subprocess,
+builds its artifact with that checkout's feature_store.py first (cached per
+checkout in --work-dir), and drives it over HTTP with closed-loop clients:
+--clients send /recommend requests whose seeds are unknown tracks, so each
+needs a full scan (the result cache is off), and --pollers call GET /model
+every 50 ms as the cheap requests that should not wait behind scoring.
+Point --app-root at a `git worktree` of an earlier commit to compare
+versions, and pass server options with --env:
+
+    git worktree add /tmp/before <commit>
+    python benchmarks/load_test.py --size 30000 --app-root /tmp/before/ml_recommender
+    python benchmarks/load_test.py --size 30000 --env RECOMMENDER_COALESCE_WAIT_MS=3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+ROOT = BENCHMARK_DIR.parent
+sys.path.append(str(BENCHMARK_DIR))
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+AUDIO_FEATURES = ['danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+                  'instrumentalness', 'liveness', 'valence', 'tempo']
+LYRICS_WORDS = ['love', 'night', 'heart', 'baby', 'dance', 'fire', 'rain', 'dream', 'light', 'party']
+
+
+def git_commit(path: Path) -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def build_artifact(app_root: Path, data_path: Path, artifact_dir: Path):
+    """Build the artifact with the checkout's own feature_store.py, once per checkout"""
+    if (artifact_dir / 'LATEST').exists():
+        return
+    logger.info(f"Building the artifact of {app_root} in {artifact_dir}")
+    subprocess.run([sys.executable, 'src/feature_store.py', '--data', str(data_path), '--out', str(artifact_dir),
+                    '--lyrics-cache', str(artifact_dir / 'lyrics_cache.sqlite')],
+                   cwd=app_root, check=True, stdout=subprocess.DEVNULL)
+
+
+def start_server(app_root: Path, env: Dict[str, str], port: int, timeout: float = 600) -> subprocess.Popen:
+    """Run uvicorn on the checkout's API and wait until it answers"""
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', str(app_root / 'src' / 'api'),
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'error'],
+        cwd=app_root, env=dict(os.environ, **env)
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/model', timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise TimeoutError(f"uvicorn did not answer within {timeout}s")
+
+
+def unknown_seed(rng: random.Random) -> Dict[str, Any]:
+    return {
+        'spotify_id': f'load-test-{rng.getrandbits(64):x}',
+        'audio_features': {feature: rng.random() for feature in AUDIO_FEATURES},
+        'lyrics': ' '.join(rng.choices(LYRICS_WORDS, k=12)),
+        'release_date': f'{rng.randint(1990, 2020)}-01-01',
+        'playlist_genre': rng.choice(['pop', 'rap', 'rock', 'latin', 'r&b', 'edm'])
+    }
+
+
+def latency_summary(seconds: List[float], duration: float) -> Dict[str, float]:
+    if not seconds:
+        return {'requests_per_second': 0.0}
+    ms = np.asarray(seconds) * 1000
+    summary = {f'p{p}_ms': float(np.percentile(ms, p)) for p in PERCENTILES}
+    summary['mean_ms'] = float(ms.mean())
+    summary['requests_per_second'] = len(seconds) / duration
+    return summary
+
+
+async def drive(port: int, clients: int, pollers: int, seeds_per_request: int, n_recommendations: int,
+                duration: float, seed: int) -> Dict[str, Any]:
+    """Run the closed-loop clients for duration seconds"""
+    import httpx
+
+    url = f'http://127.0.0.1:{port}'
+    rng = random.Random(seed)
+    latencies = {'recommend': [], 'model': []}
+    statuses = {'recommend': Counter(), 'model': Counter()}
+
+    async def recommend_client(client, end):
+        while time.monotonic() < end:
+            body = {'songs': [unknown_seed(rng) for _ in range(seeds_per_request)],
+                    'n_recommendations': n_recommendations}
+            start = time.monotonic()
+            response = await client.post(f'{url}/recommend', json=body)
+            statuses['recommend'][response.status_code] += 1
+            if response.status_code == 200:
+                latencies['recommend'].append(time.monotonic() - start)
+            elif response.status_code == 429:
+                await asyncio.sleep(float(response.headers.get('Retry-After', '0.1')) / 10)
+
+    async def model_poller(client, end):
+        while time.monotonic() < end:
+            start = time.monotonic()
+            response = await client.get(f'{url}/model')
+            statuses['model'][response.status_code] += 1
+            if response.status_code == 200:
+                latencies['model'].append(time.monotonic() - start)
+            await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=clients + pollers)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        # One request outside the measurement so lazily built structures are ready
+        await client.post(f'{url}/recommend', json={'songs': [unknown_seed(rng)], 'n_recommendations': 1})
+        end = time.monotonic() + duration
+        await asyncio.gather(*[recommend_client(client, end) for _ in range(clients)],
+                             *[model_poller(client, end) for _ in range(pollers)])
+        executor = (await client.get(f'{url}/executor')).json() if statuses['recommend'] else None
+
+    report = {}
+    for name in latencies:
+        report[name] = latency_summary(latencies[name], duration)
+        report[name]['statuses'] = {str(status): count for status, count in sorted(statuses[name].items())}
+    if executor is not None and 'detail' not in executor:
+        report['executor'] = executor
+    return report
+
+
+def main():
+    from synthetic import catalog_path
+
+    parser = argparse.ArgumentParser(description='Load test /recommend on a real uvicorn server')
+    parser.add_argument('--app-root', default=str(ROOT), help='Project checkout to serve (the ml_recommender directory)')
+    parser.add_argument('--data', help='Songs CSV (default: a synthetic catalog of --size tracks)')
+    parser.add_argument('--size', type=int, default=30000, help='Synthetic catalog size in tracks')
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'recommender-load'),
+                        help='Where catalogs and per-commit artifacts are kept')
+    parser.add_argument('--env', nargs='*', default=[], metavar='NAME=VALUE',
+                        help='Extra server environment, e.g. RECOMMENDER_COALESCE_WAIT_MS=3')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent /recommend clients')
+    parser.add_argument('--pollers', type=int, default=2, help='Concurrent GET /model clients')
+    parser.add_argument('--seeds', type=int, default=5, help='Seed songs per /recommend request')
+    parser.add_argument('-n', '--n-recommendations', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='JSON file to write (stdout if omitted)')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    app_root = Path(args.app_root).resolve()
+    work_dir = Path(args.work_dir)
+    data_path = Path(args.data).resolve() if args.data else catalog_path(str(work_dir), args.size, args.seed).resolve()
+    commit = git_commit(app_root)
+    artifact_dir = work_dir / f'artifacts-{data_path.stem}-{commit[:12]}'
+    build_artifact(app_root, data_path, artifact_dir)
+
+    env = {
+        'RECOMMENDER_DATA_PATH': str(data_path),
+        'RECOMMENDER_ARTIFACT_DIR': str(artifact_dir),
+        'RECOMMENDER_INGEST_LOG': str(artifact_dir / 'ingested_tracks.csv'),
+        'RECOMMENDER_CACHE_SIZE': '0'
+    }
+    env.update(item.split('=', 1) for item in args.env)
+    port = free_port()
+    server = start_server(app_root, env, port)
+    try:
+        results = asyncio.run(drive(port, args.clients, args.pollers, args.seeds, args.n_recommendations,
+                                    args.duration, args.seed))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        'commit': commit,
+        'cpu_count': os.cpu_count(),
+        'catalog': str(data_path),
+        'server_env': {name: value for name, value in env.items() if name not in
+                       ('RECOMMENDER_DATA_PATH', 'RECOMMENDER_ARTIFACT_DIR', 'RECOMMENDER_INGEST_LOG')},
+        'options': {'clients': args.clients, 'pollers': args.pollers, 'seeds': args.seeds,
+                    'n_recommendations': args.n_recommendations, 'duration': args.duration},
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
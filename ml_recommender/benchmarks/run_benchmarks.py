@@ -0,0 +1,269 @@
+"""Benchmarks for building and serving the recommender on synthetic catalogs
+
+Catalogs are generated and every size is benchmarked in fresh processes,
+so a peak RSS is not inflated by generation or by earlier sizes (the peak
+survives fork and exec, so the parent itself stays small). Results are
+written as JSON together with the git commit, so runs can be compared
+across commits:
+
+    python benchmarks/run_benchmarks.py --sizes 10000 100000 --output bench.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List
+
+import numpy as np
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+ROOT = BENCHMARK_DIR.parent
+sys.path.append(str(ROOT / 'src'))
+sys.path.append(str(BENCHMARK_DIR))
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+AUDIO_FEATURES = ['danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+                  'instrumentalness', 'liveness', 'valence', 'tempo']
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = np.asarray(seconds) * 1000
+    summary = {f'p{p}_ms': float(np.percentile(ms, p)) for p in PERCENTILES}
+    summary['mean_ms'] = float(ms.mean())
+    return summary
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def sample_seeds(recommender, n_queries: int, rng: np.random.Generator) -> Dict[str, List[Dict[str, Any]]]:
+    """Catalog seeds (by track id) and feature-only seeds (unknown tracks, as sent for new songs)"""
+    rows = rng.choice(len(recommender.df), size=min(n_queries, len(recommender.df)), replace=False)
+    sample = recommender.df.iloc[rows]
+    catalog = [{'track_id': track_id} for track_id in sample['track_id']]
+    features = [
+        {
+            'audio_features': {feature: float(row[feature]) for feature in AUDIO_FEATURES},
+            'lyrics': row['lyrics'] if isinstance(row['lyrics'], str) else None,
+            'release_date': str(row['track_album_release_date']),
+            'playlist_genre': row['playlist_genre'],
+            'playlist_subgenre': row['playlist_subgenre']
+        }
+        for _, row in sample.iterrows()
+    ]
+    return {'catalog': catalog, 'features': features}
+
+
+def bench_queries(recommender, seeds: Dict[str, List[Dict[str, Any]]], batch_sizes: List[int],
+                  n_recommendations: int) -> Dict[str, Any]:
+    """Latency of find_similar_songs for one seed per call and for batches of seeds"""
+    results = {}
+    for kind, kind_seeds in seeds.items():
+        # Warm up BLAS and lazily built structures outside the measurement
+        recommender.find_similar_songs_batch(kind_seeds[:1], n_recommendations=n_recommendations)
+        single = [
+            timed(recommender.find_similar_songs_batch, [seed], n_recommendations=n_recommendations)
+            for seed in kind_seeds
+        ]
+        results[f'single_{kind}'] = latency_summary(single)
+        for batch_size in batch_sizes:
+            batches = [kind_seeds[i:i + batch_size] for i in range(0, len(kind_seeds), batch_size)]
+            batches = [batch for batch in batches if len(batch) == batch_size]
+            if not batches:
+                continue
+            calls = [
+                timed(recommender.find_similar_songs_batch, batch, n_recommendations=n_recommendations)
+                for batch in batches
+            ]
+            summary = latency_summary(calls)
+            summary['seeds_per_second'] = batch_size * len(calls) / sum(calls)
+            results[f'batch{batch_size}_{kind}'] = summary
+    return results
+
+
+def bench_api(recommender, seeds: List[Dict[str, Any]], n_requests: int, concurrency: int,
+              n_recommendations: int) -> Dict[str, Any]:
+    """/recommend throughput through the FastAPI test client, with the result cache disabled"""
+    from feature_store import save_artifact
+
+    with tempfile.TemporaryDirectory(prefix='recommender-bench-') as artifact_dir:
+        save_artifact(recommender, artifact_dir)
+        os.environ.update({
+            'RECOMMENDER_ARTIFACT_DIR': artifact_dir,
+            'RECOMMENDER_DATA_PATH': str(recommender.data_processor.data_path),
+            'RECOMMENDER_INGEST_LOG': os.path.join(artifact_dir, 'ingested_tracks.csv'),
+            'RECOMMENDER_CACHE_SIZE': '0',
+            'RECOMMENDER_MAX_QUEUE': str(max(32, concurrency * 2))
+        })
+        sys.path.append(str(ROOT / 'src' / 'api'))
+        from fastapi.testclient import TestClient
+        import main as api
+
+        bodies = [
+            {'songs': [{'spotify_id': seed['track_id']}], 'n_recommendations': n_recommendations}
+            for seed in seeds
+        ]
+        with TestClient(api.app) as client:
+            client.post('/recommend', json=bodies[0])
+
+            def call(i):
+                start = time.perf_counter()
+                response = client.post('/recommend', json=bodies[i % len(bodies)])
+                return response.status_code, time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(call, range(n_requests)))
+            elapsed = time.perf_counter() - start
+
+        ok = [seconds for status, seconds in outcomes if status == 200]
+        summary = latency_summary(ok) if ok else {}
+        summary.update({
+            'requests': n_requests,
+            'concurrency': concurrency,
+            'errors': len(outcomes) - len(ok),
+            'requests_per_second': len(ok) / elapsed
+        })
+        return summary
+
+
+def bench_size(data_path: str, n_tracks: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Build and query a recommender on one catalog; meant to run in its own process"""
+    from data_processor import DataProcessor
+    from model import MusicRecommender
+
+    logging.basicConfig(level=options['log_level'])
+    result = {'n_tracks': n_tracks, 'baseline_rss_mb': peak_rss_mb()}
+
+    recommender = MusicRecommender(
+        DataProcessor(data_path),
+        index_type=options['index_type'],
+        n_probe=options['n_probe'],
+        n_lists=options['n_lists'],
+        popular_probe=options['popular_probe'],
+        max_popular=options['max_popular'],
+        feature_dtype=options['feature_dtype'],
+        lyrics_dims=options['lyrics_dims']
+    )
+    result['prepare_data_seconds'] = timed(recommender.prepare_data)
+    result['prepare_data_peak_rss_mb'] = peak_rss_mb()
+    result['catalog_rows'] = recommender.catalog.n_rows
+
+    seeds = sample_seeds(recommender, options['queries'], np.random.default_rng(options['seed']))
+    result['queries'] = bench_queries(recommender, seeds, options['batch_sizes'], options['n_recommendations'])
+    if options['index_type'] == 'ivf':
+        from ann_index import recall_at_k
+        # Served recall against exact search, candidates scanned and latency of both
+        result['index'] = recall_at_k(recommender, recommender.index, k=options['n_recommendations'],
+                                      n_queries=options['queries'], random_state=options['seed'])
+        result['index']['n_lists'] = len(recommender.index.centroids)
+        result['index']['popular_rows'] = len(recommender.index.popular_rows)
+    if options['api_requests']:
+        result['api'] = bench_api(recommender, seeds['catalog'], options['api_requests'],
+                                  options['api_concurrency'], options['n_recommendations'])
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    from synthetic import catalog_path
+
+    parser = argparse.ArgumentParser(description='Benchmark the recommender on synthetic catalogs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help='Catalog sizes in tracks (e.g. 10000 up to 5000000)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'recommender-bench'),
+                        help='Where synthetic catalogs are written and reused')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--queries', type=int, default=200, help='Seed tracks per latency measurement')
+    parser.add_argument('--batch-sizes', type=int, nargs='*', default=[8, 32])
+    parser.add_argument('-n', '--n-recommendations', type=int, default=10)
+    parser.add_argument('--index', dest='index_type', default='exact', choices=['exact', 'ivf'],
+                        help='ivf also reports recall@n and the scanned fraction against exact search')
+    parser.add_argument('--n-probe', type=int, default=4, help='IVF partitions probed per seed')
+    parser.add_argument('--n-lists', type=int, default=None, help='IVF partitions (default: about sqrt(n))')
+    parser.add_argument('--popular-probe', type=int, default=128,
+                        help='IVF partitions whose popular rows are scanned per seed')
+    parser.add_argument('--max-popular', type=int, default=1000, help='IVF popular rows scanned for every seed')
+    parser.add_argument('--dtype', dest='feature_dtype', default=None, choices=['float64', 'float32', 'int8'])
+    parser.add_argument('--lyrics-dims', type=int, default=None, help='Reduce the lyrics to this many SVD components')
+    parser.add_argument('--api-requests', type=int, default=500, help='/recommend calls; 0 skips the API run')
+    parser.add_argument('--api-concurrency', type=int, default=4)
+    parser.add_argument('--output', help='JSON file to write (stdout if omitted)')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    options = {
+        'queries': args.queries,
+        'batch_sizes': args.batch_sizes,
+        'n_recommendations': args.n_recommendations,
+        'index_type': args.index_type,
+        'n_probe': args.n_probe,
+        'n_lists': args.n_lists,
+        'popular_probe': args.popular_probe,
+        'max_popular': args.max_popular,
+        'feature_dtype': args.feature_dtype,
+        'lyrics_dims': args.lyrics_dims,
+        'api_requests': args.api_requests,
+        'api_concurrency': args.api_concurrency,
+        'seed': args.seed,
+        'log_level': args.log_level
+    }
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': options,
+        'results': []
+    }
+    context = multiprocessing.get_context('spawn')
+    for n_tracks in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            data_path = pool.submit(catalog_path, args.data_dir, n_tracks, args.seed).result()
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(bench_size, str(data_path), n_tracks, options).result()
+        logger.info(f"{n_tracks} tracks: {result}")
+        report['results'].append(result)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Column order of spotify_songs.csv
+COLUMNS = [
+    'track_id', 'track_name', 'track_artist', 'lyrics', 'track_popularity', 'track_album_id',
+    'track_album_name', 'track_album_release_date', 'playlist_name', 'playlist_id', 'playlist_genre',
+    'playlist_subgenre', 'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness',
+    'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms', 'language'
+]
+
+GENRES = {
+    'pop': ['dance pop', 'post-teen pop', 'electropop', 'indie poptimism'],
+    'rap': ['hip hop', 'southern hip hop', 'gangster rap', 'trap'],
+    'rock': ['album rock', 'classic rock', 'permanent wave', 'hard rock'],
+    'latin': ['tropical', 'latin pop', 'reggaeton', 'latin hip hop'],
+    'r&b': ['urban contemporary', 'hip pop', 'new jack swing', 'neo soul'],
+    'edm': ['electro house', 'big room', 'pop edm', 'progressive electro house']
+}
+
+# Per-genre means of (danceability, energy, speechiness, acousticness, valence, tempo, loudness)
+GENRE_PROFILES = {
+    'pop': (0.64, 0.70, 0.07, 0.17, 0.50, 121, -6.3),
+    'rap': (0.72, 0.65, 0.20, 0.19, 0.51, 120, -7.0),
+    'rock': (0.52, 0.73, 0.06, 0.15, 0.54, 125, -7.6),
+    'latin': (0.71, 0.71, 0.10, 0.21, 0.61, 119, -6.3),
+    'r&b': (0.67, 0.59, 0.12, 0.26, 0.53, 114, -7.9),
+    'edm': (0.66, 0.80, 0.09, 0.08, 0.40, 126, -5.4)
+}
+
+COMMON_WORDS = [
+    'love', 'night', 'heart', 'baby', 'dance', 'fire', 'rain', 'sun', 'road', 'dream', 'cry', 'light',
+    'dark', 'money', 'party', 'home', 'girl', 'boy', 'time', 'run', 'fly', 'sky', 'blue', 'gold',
+    'wild', 'free', 'city', 'lonely', 'summer', 'kiss', 'feel', 'know', 'want', 'never', 'forever'
+]
+LANGUAGES = np.array(['en', 'es', 'pt', 'fr', 'de'])
+LANGUAGE_P = np.array([0.86, 0.09, 0.02, 0.02, 0.01])
+
+
+def _beta(rng: np.random.Generator, mean: np.ndarray, concentration: float = 12.0) -> np.ndarray:
+    """Beta samples with the given per-row mean, bounded to [0, 1] like Spotify's audio features"""
+    return rng.beta(mean * concentration, (1 - mean) * concentration)
+
+
+def _lyrics(rng: np.random.Generator, n: int, vocabulary: np.ndarray, genre_offsets: np.ndarray) -> list:
+    """Bag-of-words lyrics; each genre draws part of its words from its own slice of the vocabulary"""
+    lengths = rng.integers(40, 250, n)
+    total = int(lengths.sum())
+    # Zipf-like word ranks: a few words are very common, most are rare
+    ranks = np.minimum(rng.zipf(1.3, total) - 1, len(vocabulary) - 1)
+    owner = np.repeat(np.arange(n), lengths)
+    genre_words = rng.random(total) < 0.3
+    ranks[genre_words] = (ranks[genre_words] + genre_offsets[owner[genre_words]]) % len(vocabulary)
+    words = vocabulary[ranks]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return [' '.join(words[bounds[i]:bounds[i + 1]]) for i in range(n)]
+
+
+def generate_chunk(n: int, start: int, n_total: int, rng: np.random.Generator,
+                   vocabulary_size: int = 20000) -> pd.DataFrame:
+    """Rows start..start+n of a synthetic catalog with n_total rows
+
+    Artists, albums and playlists are derived from the row number so chunks
+    of one catalog agree with each other. About 15% of the rows repeat an
+    earlier track in another playlist, as in the real dataset.
+    """
+    rows = np.arange(start, start + n)
+    genre_names = np.array(list(GENRES))
+    genre_index = rng.integers(0, len(genre_names), n)
+    genres = genre_names[genre_index]
+    subgenres = np.array([GENRES[genre][i] for genre, i in zip(genres, rng.integers(0, 4, n))])
+
+    track_numbers = rows.copy()
+    repeats = (rng.random(n) < 0.15) & (rows > 0)
+    track_numbers[repeats] = rng.integers(0, np.maximum(rows[repeats], 1))
+
+    profile = np.array([GENRE_PROFILES[genre] for genre in genre_names])[genre_index]
+    years = np.clip(np.rint(2020 - rng.gamma(1.5, 8.0, n)), 1957, 2020).astype(int)
+    months = rng.integers(1, 13, n)
+    days = rng.integers(1, 29, n)
+    full_dates = pd.Series(years).astype(str) + '-' + pd.Series(months).map('{:02d}'.format) + \
+        '-' + pd.Series(days).map('{:02d}'.format)
+    dates = np.where(rng.random(n) < 0.08, years.astype(str), full_dates.to_numpy())
+
+    vocabulary = np.array(COMMON_WORDS + [f'word{i}' for i in range(vocabulary_size - len(COMMON_WORDS))])
+    lyrics = np.array(_lyrics(rng, n, vocabulary, genre_index * (vocabulary_size // len(genre_names))),
+                      dtype=object)
+    lyrics[rng.random(n) < 0.25] = np.nan  # the real dataset lacks lyrics for a quarter of the tracks
+
+    n_artists = max(1, n_total // 6)
+    n_playlists = max(1, n_total // 60)
+    artists = track_numbers % n_artists
+    albums = track_numbers // 8
+    playlists = rng.integers(0, n_playlists, n)
+    return pd.DataFrame({
+        'track_id': [f'{t:022x}' for t in track_numbers],
+        'track_name': [f'Track {t}' for t in track_numbers],
+        'track_artist': [f'Artist {a}' for a in artists],
+        'lyrics': lyrics,
+        'track_popularity': np.clip(rng.normal(42, 25, n), 0, 100).astype(int),
+        'track_album_id': [f'{a:022x}' for a in albums],
+        'track_album_name': [f'Album {a}' for a in albums],
+        'track_album_release_date': dates,
+        'playlist_name': [f'Playlist {p}' for p in playlists],
+        'playlist_id': [f'{p:022x}' for p in playlists],
+        'playlist_genre': genres,
+        'playlist_subgenre': subgenres,
+        'danceability': _beta(rng, profile[:, 0]),
+        'energy': _beta(rng, profile[:, 1]),
+        'key': rng.integers(0, 12, n),
+        'loudness': np.minimum(rng.normal(profile[:, 6], 2.8), 1.2),
+        'mode': (rng.random(n) < 0.56).astype(int),
+        'speechiness': _beta(rng, profile[:, 2], 8.0),
+        'acousticness': _beta(rng, profile[:, 3], 3.0),
+        'instrumentalness': np.where(rng.random(n) < 0.7, rng.random(n) * 1e-3, rng.random(n) ** 2),
+        'liveness': _beta(rng, np.full(n, 0.19), 5.0),
+        'valence': _beta(rng, profile[:, 4], 4.0),
+        'tempo': np.clip(rng.normal(profile[:, 5], 27), 40, 240),
+        'duration_ms': np.clip(rng.normal(225000, 60000, n), 30000, 520000).astype(int),
+        'language': rng.choice(LANGUAGES, n, p=LANGUAGE_P)
+    }, columns=COLUMNS)
+
+
+def write_catalog(path: str, n_tracks: int, seed: int = 42, chunk_size: int = 250000) -> Path:
+    """Write a synthetic catalog shaped like spotify_songs.csv, chunk by chunk to bound memory"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    tmp_path = path.with_name(path.name + '.tmp')
+    for start in range(0, n_tracks, chunk_size):
+        chunk = generate_chunk(min(chunk_size, n_tracks - start), start, n_tracks, rng)
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+        logger.info(f"Wrote rows {start}..{start + len(chunk)} of {n_tracks}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def catalog_path(data_dir: str, n_tracks: int, seed: int = 42) -> Path:
+    """Write the catalog into data_dir unless a file for the same size and seed is already there"""
+    path = Path(data_dir) / f'synthetic_{n_tracks}_{seed}.csv'
+    if not path.exists():
+        logger.info(f"Generating synthetic catalog with {n_tracks} tracks at {path}")
+        write_catalog(path, n_tracks, seed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic catalog shaped like spotify_songs.csv')
+    parser.add_argument('n_tracks', type=int, help='Number of rows')
+    parser.add_argument('output', help='CSV path to write')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    write_catalog(args.output, args.n_tracks, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Shared fixtures: a small synthetic catalog and a recommender prepared on it"""
+import copy
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+N_TRACKS = 1500
+
+
+@pytest.fixture(scope='session')
+def catalog_csv(tmp_path_factory):
+    from synthetic import write_catalog
+    return write_catalog(tmp_path_factory.mktemp('data') / 'songs.csv', N_TRACKS, seed=7)
+
+
+@pytest.fixture(scope='session')
+def prepared(catalog_csv):
+    """Recommender prepared on the synthetic catalog; use the `recommender` fixture in tests"""
+    from data_processor import DataProcessor
+    from model import MusicRecommender
+
+    recommender = MusicRecommender(DataProcessor(str(catalog_csv), n_jobs=1))
+    recommender.prepare_data()
+    return recommender
+
+
+@pytest.fixture
+def recommender(prepared):
+    """A copy of the prepared recommender with its own history, so tests cannot leak state"""
+    from history import InMemoryHistoryStore
+
+    recommender = copy.copy(prepared)
+    recommender.history = InMemoryHistoryStore()
+    return recommender
+
+
+@pytest.fixture
+def track_ids(prepared):
+    return prepared.catalog.ids().tolist()
+
+
+@pytest.fixture(scope='session')
+def new_tracks(prepared):
+    """Tracks that are not in the test catalog"""
+    from synthetic import generate_chunk
+
+    tracks = generate_chunk(300, N_TRACKS, N_TRACKS + 300, np.random.default_rng(8))
+    tracks = tracks[~prepared.catalog.contains(tracks['track_id'])]
+    return tracks.drop_duplicates('track_id').reset_index(drop=True)
+
+
+def feature_seed(rng: np.random.Generator, release_year: int = None) -> dict:
+    """A seed for a track that is not in the catalog"""
+    return {
+        'audio_features': {
+            'danceability': rng.random(), 'energy': rng.random(), 'valence': rng.random(),
+            'acousticness': rng.random(), 'tempo': rng.random()
+        },
+        'lyrics': 'love night dance heart fire',
+        'release_date': f'{release_year or rng.integers(1970, 2020)}-06-01',
+        'playlist_genre': 'pop',
+        'playlist_subgenre': 'dance pop'
+    }
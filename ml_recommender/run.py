@@ -1,4 +1,40 @@
+import argparse
+import os
+import sys
+
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("src.api.main:app", host="0.0.0.0", port=5000, reload=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Run the recommendation API')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes; they share one memory-mapped artifact')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Build the artifact once in the parent so workers only memory-map it
+        # instead of each running prepare_data() on its own copy; it is built with
+        # the workers' options, so they do not have to convert it
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+        from data_processor import DataProcessor
+        from model import MusicRecommender
+        from feature_store import read_manifest, recommender_options_from_env, resolve_artifact, save_artifact
+
+        artifact_dir = os.environ.get('RECOMMENDER_ARTIFACT_DIR', 'artifacts')
+        path = resolve_artifact(artifact_dir)
+        try:
+            usable = path is not None and read_manifest(path) is not None
+        except ValueError as e:
+            print(e)
+            usable = False
+        if not usable:
+            data_path = os.environ.get('RECOMMENDER_DATA_PATH', 'src/data/spotify_songs.csv')
+            print(f"No usable artifact in {artifact_dir}, building it from {data_path}...")
+            recommender = MusicRecommender(DataProcessor(data_path), **recommender_options_from_env())
+            recommender.prepare_data()
+            save_artifact(recommender, artifact_dir)
+        # Workers poll for artifacts published by the refitting worker and for tracks
+        # ingested through the others
+        os.environ.setdefault('RECOMMENDER_WATCH_INTERVAL', '5')
+        uvicorn.run("src.api.main:app", host="0.0.0.0", port=5000, workers=args.workers)
+    else:
+        uvicorn.run("src.api.main:app", host="0.0.0.0", port=5000, reload=True)
@@ -0,0 +1,238 @@
+import copy
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from clustering import fit_clusters, nearest_centroid
+from comparison import catalog_seeds, compare_variants, sample_rows
+
+logger = logging.getLogger(__name__)
+
+
+class SearchIndex:
+    """Base class for candidate generation over the catalog feature matrix"""
+
+    def candidates(self, query_audio: np.ndarray, query_lyrics: np.ndarray = None) -> Optional[np.ndarray]:
+        """Return sorted candidate row ids for a query, or None to scan every row"""
+        raise NotImplementedError
+
+    def extend(self, audio_features: np.ndarray, lyrics_features=None,
+               popularity: np.ndarray = None) -> 'SearchIndex':
+        """Return an index that also covers rows appended to the catalog
+
+        audio_features and lyrics_features are the normalized float blocks of
+        the new rows and popularity their track popularity. The current index
+        is not modified, so it stays valid for the catalog it was built for.
+        """
+        raise NotImplementedError
+
+
+class ExactIndex(SearchIndex):
+    """Brute-force search: every catalog row is a candidate"""
+
+    def __init__(self, n_rows: int):
+        self.n_rows = n_rows
+
+    def candidates(self, query_audio, query_lyrics=None):
+        return None
+
+    def extend(self, audio_features, lyrics_features=None, popularity=None):
+        return ExactIndex(self.n_rows + len(audio_features))
+
+
+def default_n_lists(n_rows: int) -> int:
+    """About sqrt(n_rows) partitions, so one partition holds about sqrt(n_rows) rows"""
+    return max(1, int(round(np.sqrt(n_rows))))
+
+
+def fit_partitions(recommender, n_lists: Optional[int] = None, train_rows_per_list: int = 64,
+                   block_size: int = 65536, random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Partition the catalog rows for an IVF index, returning (centroids, labels)
+
+    MiniBatch k-means is trained on a sample of train_rows_per_list rows per
+    partition, so training does not grow with the catalog beyond the number
+    of partitions; every row is then assigned to its nearest centroid in
+    blocks of block_size rows. These partitions are separate from the 50
+    diversity clusters used in scoring.
+    """
+    n_rows = recommender.catalog.n_rows
+    n_lists = min(n_lists or default_n_lists(n_rows), n_rows)
+    rng = np.random.default_rng(random_state)
+    sample = np.sort(rng.choice(n_rows, size=min(n_rows, n_lists * train_rows_per_list), replace=False))
+    audio_features, lyrics_features = recommender.feature_rows(sample)
+    matrix = audio_features if lyrics_features is None else sp.hstack(
+        [sp.csr_matrix(audio_features), lyrics_features], format='csr')
+    _, centroids = fit_clusters(matrix, n_clusters=n_lists, method='minibatch', random_state=random_state)
+
+    labels = np.empty(n_rows, dtype=np.int32)
+    for start in range(0, n_rows, block_size):
+        block = slice(start, min(start + block_size, n_rows))
+        labels[block] = nearest_centroid(centroids, *recommender.feature_rows(block))
+    return centroids, labels
+
+
+class IVFIndex(SearchIndex):
+    """Inverted-file index over k-means partitions of the catalog
+
+    Rows are grouped by partition into contiguous inverted lists. A query
+    is scored against the centroids only, and the rows of the n_probe closest
+    partitions become the candidate set for exact re-ranking. With about
+    sqrt(n) partitions (fit_partitions) that is about n_probe * sqrt(n) rows.
+
+    The served ranking blends similarity with popularity (0.3 * popularity /
+    100), so popular tracks from partitions that are not probed still reach
+    the top-k. The most popular popular_fraction of the catalog therefore
+    has inverted lists of its own, and the popular rows of the popular_probe
+    closest partitions are candidates too. The most popular of them, at most
+    max_popular rows, are candidates for every query. Measure the effect on
+    the final recommendations with recall_at_k().
+    """
+
+    def __init__(self, centroids: np.ndarray, labels: np.ndarray, n_audio_features: int, n_probe: int = 4,
+                 popularity: np.ndarray = None, popular_fraction: float = 0.05, popular_probe: int = 128,
+                 max_popular: int = 1000):
+        self.n_probe = min(n_probe, len(centroids))
+        self.popular_probe = min(popular_probe, len(centroids))
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.centroid_audio = np.ascontiguousarray(self.centroids[:, :n_audio_features])
+        self.centroid_lyrics = np.ascontiguousarray(self.centroids[:, n_audio_features:])
+
+        labels = np.asarray(labels)
+        self.list_rows = np.argsort(labels, kind='stable').astype(np.int64)
+        counts = np.bincount(labels, minlength=len(centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        # Rows at least as popular as the top popular_fraction, grouped by partition,
+        # and the most popular of them, at most max_popular (ties: lowest row first)
+        self.tier_threshold = self.popular_threshold = np.inf
+        self.tier_rows = self.popular_rows = np.empty(0, dtype=np.int64)
+        self.tier_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        if popularity is not None and popular_fraction > 0 and len(labels):
+            popularity = np.asarray(popularity)
+            self.tier_threshold = np.quantile(popularity, 1 - popular_fraction, method='higher')
+            self.tier_rows = self.list_rows[popularity[self.list_rows] >= self.tier_threshold]
+            tier_counts = np.bincount(labels[self.tier_rows], minlength=len(centroids))
+            self.tier_offsets = np.concatenate([[0], np.cumsum(tier_counts)])
+            n_head = min(max_popular, int(np.ceil(popular_fraction * len(labels))))
+            head = np.lexsort((np.arange(len(popularity)), -popularity))[:n_head]
+            self.popular_threshold = popularity[head[-1]] if len(head) else np.inf
+            self.popular_rows = np.sort(head).astype(np.int64)
+
+        # Rows appended by extend() are kept in their own small inverted lists
+        self.added_labels = np.empty(0, dtype=labels.dtype)
+        self.added_rows = np.empty(0, dtype=np.int64)
+        self.added_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        self.added_popular = np.empty(0, dtype=np.int64)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.list_offsets[-1]) + len(self.added_labels)
+
+    def row_labels(self) -> np.ndarray:
+        """Partition of every row, appended rows included"""
+        n_lists = len(self.list_offsets) - 1
+        labels = np.empty(self.n_rows, dtype=self.added_labels.dtype)
+        labels[self.list_rows] = np.repeat(np.arange(n_lists), np.diff(self.list_offsets))
+        labels[self.added_rows] = np.repeat(np.arange(n_lists), np.diff(self.added_offsets))
+        return labels
+
+    def extend(self, audio_features, lyrics_features=None, popularity=None):
+        # New rows go to their nearest partition; centroids and the base lists are shared
+        n_lists = len(self.list_offsets) - 1
+        n_base = self.list_offsets[-1]
+        n_rows = self.n_rows
+        labels = nearest_centroid(self.centroids, audio_features, lyrics_features).astype(self.added_labels.dtype)
+
+        extended = copy.copy(self)
+        extended.added_labels = np.concatenate([self.added_labels, labels])
+        extended.added_rows = n_base + np.argsort(extended.added_labels, kind='stable').astype(np.int64)
+        extended.added_offsets = np.concatenate([[0], np.cumsum(np.bincount(extended.added_labels, minlength=n_lists))])
+        if popularity is not None:
+            # Added rows are few, so the popular ones are scanned for every query until the next build
+            popular = n_rows + np.flatnonzero(np.asarray(popularity) >= self.tier_threshold)
+            extended.added_popular = np.concatenate([self.added_popular, popular.astype(np.int64)])
+        return extended
+
+    def probe(self, query_audio: np.ndarray, query_lyrics: np.ndarray = None,
+              n_probe: Optional[int] = None) -> np.ndarray:
+        """Return the ids of the n_probe (default self.n_probe) partitions closest to the query, closest first"""
+        n_probe = self.n_probe if n_probe is None else n_probe
+        scores = self.centroid_audio @ query_audio
+        if query_lyrics is not None and self.centroid_lyrics.shape[1]:
+            scores = scores + self.centroid_lyrics @ query_lyrics
+        closest = np.argpartition(-scores, n_probe - 1)[:n_probe] if n_probe < len(scores) else np.arange(len(scores))
+        return closest[np.argsort(-scores[closest], kind='stable')]
+
+    def candidates(self, query_audio, query_lyrics=None):
+        lists = [self.popular_rows, self.added_popular]
+        partitions = self.probe(query_audio, query_lyrics, max(self.n_probe, self.popular_probe))
+        for c in partitions[:self.n_probe]:
+            lists.append(self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]])
+            lists.append(self.added_rows[self.added_offsets[c]:self.added_offsets[c + 1]])
+        for c in partitions[:self.popular_probe]:
+            lists.append(self.tier_rows[self.tier_offsets[c]:self.tier_offsets[c + 1]])
+        return np.unique(np.concatenate(lists))
+
+
+INDEX_TYPES = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex
+}
+
+
+def build_index(kind: str, recommender, partitions: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                n_lists: Optional[int] = None, **options) -> SearchIndex:
+    """Build a search index of the given kind for a prepared recommender
+
+    IVF partitions are fitted with n_lists partitions (about sqrt of the
+    catalog size by default) unless given as (centroids, labels), e.g. the
+    ones saved with an artifact.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {sorted(INDEX_TYPES)}")
+    if kind == 'ivf':
+        centroids, labels = partitions if partitions is not None else fit_partitions(recommender, n_lists)
+        return IVFIndex(
+            centroids,
+            labels,
+            n_audio_features=recommender.features.shape[1],
+            popularity=recommender.catalog.popularity if recommender.catalog is not None else None,
+            **options
+        )
+    return ExactIndex(len(recommender.features))
+
+
+def recall_at_k(recommender, index: SearchIndex, k: int = 10, n_queries: int = 100,
+                random_state: int = 42) -> Dict[str, float]:
+    """Compare an index against exact search using catalog tracks as seeds
+
+    Recall is measured on what is served: the fraction of the top-k
+    recommendations of exact search (after the genre, diversity and
+    popularity blending) that the recommender also returns with the index.
+    The report also gives the mean candidate set per seed and the mean
+    latency of one recommendation with either index.
+    """
+    rows = sample_rows(recommender, n_queries, random_state)
+    exact, approximate = copy.copy(recommender), copy.copy(recommender)
+    exact.index = ExactIndex(recommender.catalog.n_rows)
+    approximate.index = index
+    comparison = compare_variants({'exact': lambda: exact, 'index': lambda: approximate},
+                                  {'catalog': catalog_seeds(recommender, rows)}, k)
+
+    query_audio, query_lyrics = recommender.build_queries([{}] * len(rows), rows)
+    candidate_counts = []
+    for j in range(len(rows)):
+        candidates = index.candidates(query_audio[:, j], query_lyrics[:, j] if query_lyrics is not None else None)
+        candidate_counts.append(recommender.catalog.n_rows if candidates is None else len(candidates))
+
+    report = {
+        f'recall@{k}': comparison['index'][f'overlap@{k}'],
+        'mean_candidates': float(np.mean(candidate_counts)),
+        'scanned_fraction': float(np.mean(candidate_counts) / recommender.catalog.n_rows),
+        'exact_latency_ms': comparison['exact']['latency_ms'],
+        'index_latency_ms': comparison['index']['latency_ms']
+    }
+    logger.info(f"Index recall report: {report}")
+    return report
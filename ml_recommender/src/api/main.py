@@ -1,21 +1,82 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import sys
 import os
 import numpy as np
+import pandas as pd
+import logging
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from model import MusicRecommender
 from data_processor import DataProcessor
+from feature_store import recommender_options_from_env, save_artifact
+from registry import ModelRegistry
+from ingest import IngestLog, RefitScheduler, refit
+from history import InMemoryHistoryStore, SQLiteHistoryStore
+from cache import ResultCache, make_key
+from executor import BoundedExecutor, Saturated
+from coalescer import RequestCoalescer
+from metrics import Metrics, timing_header
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = os.environ.get('RECOMMENDER_DATA_PATH', 'src/data/spotify_songs.csv')
+ARTIFACT_DIR = os.environ.get('RECOMMENDER_ARTIFACT_DIR', 'artifacts')
+HISTORY_DB = os.environ.get('RECOMMENDER_HISTORY_DB')
+HISTORY_MAX_ITEMS = int(os.environ.get('RECOMMENDER_HISTORY_MAX_ITEMS', '500'))
+HISTORY_TTL = float(os.environ['RECOMMENDER_HISTORY_TTL']) if os.environ.get('RECOMMENDER_HISTORY_TTL') else None
+INGEST_LOG = os.environ.get('RECOMMENDER_INGEST_LOG', os.path.join(ARTIFACT_DIR, 'ingested_tracks.csv'))
+REFIT_INTERVAL = float(os.environ.get('RECOMMENDER_REFIT_INTERVAL', '0'))  # seconds, 0 disables
+WATCH_INTERVAL = float(os.environ.get('RECOMMENDER_WATCH_INTERVAL', '0'))  # seconds, 0 disables
+
+if HISTORY_DB:
+    history = SQLiteHistoryStore(HISTORY_DB, max_items=HISTORY_MAX_ITEMS, ttl=HISTORY_TTL)
+else:
+    history = InMemoryHistoryStore(
+        max_users=int(os.environ.get('RECOMMENDER_HISTORY_MAX_USERS', '100000')),
+        max_items=HISTORY_MAX_ITEMS,
+        ttl=HISTORY_TTL
+    )
+
+# Shared by every model snapshot so stage histograms survive swaps and refits
+metrics = Metrics()
+
+RECOMMENDER_OPTIONS = dict(recommender_options_from_env(), history=history, metrics=metrics)
+
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RECOMMENDER_CACHE_SIZE', '1024')),
+    ttl=float(os.environ.get('RECOMMENDER_CACHE_TTL', '300'))
+)
+
+# Scoring runs on a bounded pool so the event loop stays responsive; requests
+# beyond workers + queue are rejected with 429 instead of piling up
+scoring_executor = BoundedExecutor(
+    max_workers=int(os.environ.get('RECOMMENDER_WORKERS', str(os.cpu_count() or 1))),
+    max_queue=int(os.environ.get('RECOMMENDER_MAX_QUEUE', '32'))
+)
+
+metrics.callback('recommender_cache_hits_total', lambda: result_cache.hits, 'counter',
+                 help='Result cache hits')
+metrics.callback('recommender_cache_misses_total', lambda: result_cache.misses, 'counter',
+                 help='Result cache misses')
+metrics.callback('recommender_cache_evictions_total', lambda: result_cache.evictions, 'counter',
+                 help='Result cache evictions')
+metrics.callback('recommender_executor_pending', lambda: scoring_executor.pending,
+                 help='Scoring jobs running or queued')
+metrics.callback('recommender_executor_rejected_total', lambda: scoring_executor.rejected, 'counter',
+                 help='Scoring jobs rejected because the queue was full')
 
 app = FastAPI()
 
 class SongFeatures(BaseModel):
+    # Songs already in the catalog only need spotify_id; the rest is used for unknown tracks
     spotify_id: str
-    audio_features: Dict[str, float]
-    lyrics: str
-    release_date: str
+    audio_features: Optional[Dict[str, float]] = None
+    lyrics: Optional[str] = None
+    release_date: Optional[str] = None
     track_popularity: int = 0
     playlist_genre: str = ''
     playlist_subgenre: str = ''
@@ -26,74 +87,333 @@ class RecommendationRequest(BaseModel):
     user_id: Optional[str] = None
     exclude_songs: Optional[List[str]] = None
 
+class TrackRecord(BaseModel):
+    # Same fields as the source CSV; release date is ISO formatted (a bare year is fine)
+    track_id: str
+    track_name: str = ''
+    track_artist: str = ''
+    track_album_name: str = ''
+    track_album_release_date: str
+    track_popularity: int = 0
+    playlist_genre: str = ''
+    playlist_subgenre: str = ''
+    lyrics: Optional[str] = None
+    danceability: float
+    energy: float
+    loudness: float
+    speechiness: float
+    acousticness: float
+    instrumentalness: float
+    liveness: float
+    valence: float
+    tempo: float
+
+class IngestRequest(BaseModel):
+    tracks: List[TrackRecord]
+
 class RecommendationResponse(BaseModel):
     recommendations: List[Dict[str, Any]]
+    # spotify_ids that are not in the catalog and came without audio_features
+    unresolved: List[str] = []
+    model_version: Optional[str] = None
+
+class ModelLoadRequest(BaseModel):
+    version: Optional[str] = None  # artifact version to activate, LATEST by default
+
+# Tracks ingested after a model was built; known track ids are skipped. Every worker
+# process appends to the same log and follows what the others append
+ingest_log = IngestLog(INGEST_LOG)
+ingest_offset = 0  # end of the part of the log applied to the active model
+
+def replay_ingest_log(recommender: MusicRecommender) -> MusicRecommender:
+    """Add the tracks logged after the model was built to a model about to go live"""
+    global ingest_offset
+    tracks, ingest_offset = ingest_log.read_since(recommender.ingest_offset or 0)
+    return recommender.add_tracks(tracks)
+
+def follow_ingest_log(recommender: MusicRecommender) -> MusicRecommender:
+    """Add the tracks other workers logged since the last call"""
+    global ingest_offset
+    tracks, ingest_offset = ingest_log.read_since(ingest_offset)
+    return recommender.add_tracks(tracks) if len(tracks) else recommender
+
+registry = ModelRegistry(
+    ARTIFACT_DIR,
+    processor_factory=lambda: DataProcessor(DATA_PATH),
+    recommender_options=RECOMMENDER_OPTIONS,
+    prepare=replay_ingest_log,
+    refresh=follow_ingest_log
+)
+try:
+    registry.activate(registry.load_version())
+except (FileNotFoundError, ValueError) as e:
+    # No prebuilt artifact, or one in an older format: build the model in-process (slow)
+    logger.warning(f"No usable artifact in {ARTIFACT_DIR} ({e}), building model from {DATA_PATH}")
+    initial = MusicRecommender(DataProcessor(DATA_PATH), **RECOMMENDER_OPTIONS)
+    initial.prepare_data()
+    initial.release_metadata()
+    registry.activate(initial)
+if WATCH_INTERVAL > 0:
+    registry.watch(WATCH_INTERVAL)
 
-processor = DataProcessor('src/data/spotify_songs.csv')
-recommender = MusicRecommender(processor)
-recommender.prepare_data()
+def refit_model():
+    """Full rebuild from the dataset plus ingested tracks, saved as a new artifact"""
+    refitted = refit(DATA_PATH, ingest_log, previous=registry.active, **RECOMMENDER_OPTIONS)
+    save_artifact(refitted, ARTIFACT_DIR)
+    # The published artifact includes the logged tracks; later startups only replay newer ones
+    ingest_log.compact(refitted.ingest_offset)
+    refitted.release_metadata()
+    return refitted
+
+# With several workers only the one holding the lock refits; the others load its artifact
+refit_scheduler = RefitScheduler(REFIT_INTERVAL, refit_model, registry.activate,
+                                 lock_path=os.path.join(ARTIFACT_DIR, '.refit.lock'))
+if REFIT_INTERVAL > 0:
+    refit_scheduler.start()
+
+def request_cache_key(request: RecommendationRequest, model_version: str) -> str:
+    """Canonical cache key for a stateless recommendation request"""
+    seeds = [
+        [
+            song.spotify_id,
+            song.audio_features,
+            song.lyrics,
+            song.release_date,
+            song.track_popularity,
+            song.playlist_genre,
+            song.playlist_subgenre
+        ]
+        for song in request.songs
+    ]
+    return make_key(seeds, request.n_recommendations, sorted(set(request.exclude_songs or [])), model_version)
+
+def split_seeds(recommender: MusicRecommender, request: RecommendationRequest):
+    """Separate usable seeds from unknown songs that cannot be featurized"""
+    songs, unresolved = [], []
+    for song in request.songs:
+        if song.audio_features is None and recommender.catalog.row_of(song.spotify_id) < 0:
+            unresolved.append(song.spotify_id)
+        else:
+            songs.append(song)
+    return songs, unresolved
+
+def request_group(request: RecommendationRequest, songs: List[SongFeatures]) -> Dict[str, Any]:
+    """Arguments of MusicRecommender.find_similar_songs_batch for one request"""
+    seeds = [
+        {
+            'track_id': song.spotify_id,
+            'audio_features': song.audio_features,
+            'lyrics': song.lyrics,
+            'release_date': song.release_date,
+            'track_popularity': song.track_popularity,
+            'playlist_genre': song.playlist_genre,
+            'playlist_subgenre': song.playlist_subgenre
+        }
+        for song in songs
+    ]
+    return {
+        'seeds': seeds,
+        'n_recommendations': request.n_recommendations * 2,
+        'user_id': request.user_id,
+        'exclude_songs': request.exclude_songs
+    }
+
+def merge_recommendations(request: RecommendationRequest,
+                          batch_recommendations: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Combine the per-seed lists of one request into its final ranking"""
+    all_recommendations = {}
+    
+    for song_recommendations in batch_recommendations:
+        for rec in song_recommendations:
+            track_id = rec['track_id']
+            if track_id not in all_recommendations:
+                all_recommendations[track_id] = {
+                    'track_id': track_id,
+                    'track_name': rec['track_name'],
+                    'track_artist': rec['track_artist'],
+                    'similarity_scores': [rec['similarity_score']],  
+                    'track_popularity': rec['track_popularity'],
+                    'playlist_genre': rec['playlist_genre'],
+                    'playlist_subgenre': rec['playlist_subgenre']
+                }
+            else:
+                all_recommendations[track_id]['similarity_scores'].append(rec['similarity_score'])
+    
+    recommendations = []
+    for track_id, rec in all_recommendations.items():
+        avg_score = np.mean(rec['similarity_scores'])
+        score_count = len(rec['similarity_scores'])
+        
+        final_rec = {
+            'track_id': rec['track_id'],
+            'track_name': rec['track_name'],
+            'track_artist': rec['track_artist'],
+            'similarity_score': float(avg_score),
+            'recommendation_count': score_count,  
+            'track_popularity': rec['track_popularity'],
+            'playlist_genre': rec['playlist_genre'],
+            'playlist_subgenre': rec['playlist_subgenre']
+        }
+        recommendations.append(final_rec)
+    
+   
+    sorted_recommendations = sorted(
+        recommendations,
+        key=lambda x: (x['recommendation_count'], x['similarity_score'], x['track_popularity']),
+        reverse=True
+    )[:request.n_recommendations]
+    
+    for rec in sorted_recommendations:
+        del rec['recommendation_count']
+    
+    return sorted_recommendations
+
+def score_requests(recommender: MusicRecommender, requests: List[RecommendationRequest]):
+    """CPU-bound part of /recommend for one or more requests, run on the scoring executor
+
+    The seeds of all requests are scored together in one batch; returns a
+    (recommendations, unresolved, stage timings) triple per request. The
+    timings are those of the whole batch, shared by coalesced requests.
+    """
+    with metrics.collect() as timings:
+        split = [split_seeds(recommender, request) for request in requests]
+        groups = [request_group(request, songs) for request, (songs, _) in zip(requests, split)]
+        grouped = recommender.find_similar_songs_grouped(groups)
+        with metrics.stage('merge'):
+            results = [
+                (merge_recommendations(request, batch_recommendations), unresolved)
+                for request, batch_recommendations, (_, unresolved) in zip(requests, grouped, split)
+            ]
+    return [(recommendations, unresolved, timings) for recommendations, unresolved in results]
+
+# Optional micro-batching: concurrent requests arriving within the wait window
+# are scored together as one matrix-matrix product
+COALESCE_WAIT_MS = float(os.environ.get('RECOMMENDER_COALESCE_WAIT_MS', '0'))  # 0 disables
+coalescer = None
+if COALESCE_WAIT_MS > 0:
+    coalescer = RequestCoalescer(
+        score_requests,
+        scoring_executor,
+        max_batch=int(os.environ.get('RECOMMENDER_COALESCE_MAX_BATCH', '32')),
+        max_wait=COALESCE_WAIT_MS / 1000
+    )
+
+def debug_timing_requested(http_request: Request) -> bool:
+    return http_request.headers.get('X-Debug-Timing', '').lower() in ('1', 'true', 'yes', 'on')
+
+def record_request(start: float, status: int, cache: str) -> float:
+    elapsed = time.perf_counter() - start
+    metrics.inc('recommender_requests_total', help='Recommendation requests by status and result cache use',
+                status=status, cache=cache)
+    metrics.observe('recommender_request_seconds', elapsed, help='Recommendation request latency',
+                    cache=cache)
+    return elapsed
 
 @app.post("/recommend", response_model=RecommendationResponse)
-async def get_recommendations(request: RecommendationRequest):
+async def get_recommendations(request: RecommendationRequest, http_request: Request, response: Response):
+    """Recommendations for the request's songs
+
+    With an 'X-Debug-Timing: 1' request header the response carries an
+    X-Debug-Timing header with the time of each scoring stage and the total,
+    in milliseconds. Cached responses only report the total.
+    """
+    start = time.perf_counter()
+    cache = 'miss'
+    # One model snapshot per request, so a concurrent swap cannot mix versions
+    recommender = registry.active
     try:
-        all_recommendations = {}
-        
-        for song in request.songs:
-            song_recommendations = recommender.find_similar_songs(
-                audio_features=song.audio_features,
-                lyrics=song.lyrics,
-                release_date=song.release_date,
-                n_recommendations=request.n_recommendations * 2,  
-                track_popularity=song.track_popularity,
-                playlist_genre=song.playlist_genre,
-                playlist_subgenre=song.playlist_subgenre,
-                user_id=request.user_id,
-                exclude_songs=request.exclude_songs
-            )
-            
-            for rec in song_recommendations:
-                track_id = rec['track_id']
-                if track_id not in all_recommendations:
-                    all_recommendations[track_id] = {
-                        'track_id': track_id,
-                        'track_name': rec['track_name'],
-                        'track_artist': rec['track_artist'],
-                        'similarity_scores': [rec['similarity_score']],  
-                        'track_popularity': rec['track_popularity'],
-                        'playlist_genre': rec['playlist_genre'],
-                        'playlist_subgenre': rec['playlist_subgenre']
-                    }
-                else:
-                    all_recommendations[track_id]['similarity_scores'].append(rec['similarity_score'])
+        # Requests with a user_id depend on (and update) that user's history
+        cache_key = None
+        timings = {}
+        if request.user_id is None and result_cache.enabled:
+            cache_key = request_cache_key(request, recommender.version)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                cache = 'hit'
+                recommendations, unresolved = cached
         
-        recommendations = []
-        for track_id, rec in all_recommendations.items():
-            avg_score = np.mean(rec['similarity_scores'])
-            score_count = len(rec['similarity_scores'])
-            
-            final_rec = {
-                'track_id': rec['track_id'],
-                'track_name': rec['track_name'],
-                'track_artist': rec['track_artist'],
-                'similarity_score': float(avg_score),
-                'recommendation_count': score_count,  
-                'track_popularity': rec['track_popularity'],
-                'playlist_genre': rec['playlist_genre'],
-                'playlist_subgenre': rec['playlist_subgenre']
-            }
-            recommendations.append(final_rec)
+        if cache == 'miss':
+            if coalescer is not None:
+                recommendations, unresolved, timings = await coalescer.submit(recommender, request)
+            else:
+                recommendations, unresolved, timings = (
+                    await scoring_executor.run(score_requests, recommender, [request])
+                )[0]
+            if cache_key is not None:
+                result_cache.put(cache_key, (recommendations, unresolved))
         
-       
-        sorted_recommendations = sorted(
-            recommendations,
-            key=lambda x: (x['recommendation_count'], x['similarity_score'], x['track_popularity']),
-            reverse=True
-        )[:request.n_recommendations]
+        elapsed = record_request(start, 200, cache)
+        if debug_timing_requested(http_request):
+            response.headers['X-Debug-Timing'] = timing_header(timings, elapsed)
+        return RecommendationResponse(recommendations=recommendations, unresolved=unresolved,
+                                      model_version=recommender.version)
+    
+    except Saturated as e:
+        record_request(start, 429, cache)
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': '1'})
+    except Exception as e:
+        record_request(start, 500, cache)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+@app.get("/cache")
+async def get_cache_stats():
+    return result_cache.stats()
+
+@app.get("/executor")
+async def get_executor_stats():
+    stats = scoring_executor.stats()
+    if coalescer is not None:
+        stats['coalescer'] = coalescer.stats()
+    return stats
+
+@app.post("/tracks")
+def ingest_tracks(request: IngestRequest):
+    """Add tracks to the live catalog without a rebuild; they are kept for the next refit
+
+    Other worker processes add them when they next poll the ingest log
+    (RECOMMENDER_WATCH_INTERVAL).
+    """
+    try:
+        tracks = pd.DataFrame([track.model_dump() for track in request.tracks])
+        added = []
         
-        for rec in sorted_recommendations:
-            del rec['recommendation_count']
+        def add(recommender):
+            global ingest_offset
+            # Catch up with other workers first, so their tracks are not logged twice
+            recommender = follow_ingest_log(recommender)
+            new_tracks = recommender.unknown_tracks(tracks) if len(tracks) else tracks
+            if not len(new_tracks):
+                return recommender
+            updated = recommender.add_tracks(new_tracks)
+            start, end = ingest_log.append(new_tracks)
+            if start == ingest_offset:
+                ingest_offset = end
+            added.append(len(new_tracks))
+            return updated
         
-        return RecommendationResponse(recommendations=sorted_recommendations)
+        recommender = registry.update(add)
+        return {'added': sum(added), 'model_version': recommender.version}
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/model")
+async def get_model():
+    return registry.status()
+
+@app.post("/model", status_code=202)
+async def load_model(request: ModelLoadRequest):
+    """Load an artifact version in the background and swap it in once warmed up
+
+    A requested version (e.g. a rollback) also becomes LATEST once it is live,
+    so every worker and every restart serves it until the next artifact is
+    published.
+    """
+    if not registry.load_async(request.version, publish=True):
+        raise HTTPException(status_code=409, detail=f"Already loading {registry.loading_version}")
+    return registry.status()
@@ -0,0 +1,343 @@
+import logging
+from typing import Iterable, List, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+from segments import Segmented
+
+logger = logging.getLogger(__name__)
+
+# Year used for rows without a parsable release date; never inside a search window
+MISSING_YEAR = np.iinfo(np.int16).min
+
+# Free-text columns stored as StringColumn (a UTF-8 buffer plus offsets per column)
+STRING_COLUMNS = {'track_names': 'track_name', 'track_artists': 'track_artist'}
+
+
+class StringColumn:
+    """Strings laid out like an Arrow string array: one UTF-8 buffer plus row offsets
+
+    Row i is data[offsets[i]:offsets[i + 1]]. Each row costs its encoded
+    length plus 8 bytes, where a NumPy unicode array pays 4 bytes per
+    character of the longest string for every row. Both arrays can be
+    memory-mapped.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_values(cls, values) -> 'StringColumn':
+        encoded = [value.encode('utf-8') for value in pd.Series(values, dtype=object).fillna('').astype(str).tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def take(self, rows) -> List[str]:
+        """Decoded strings of the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows].tolist()
+        ends = self.offsets[rows + 1].tolist()
+        return [self.data[start:end].tobytes().decode('utf-8') for start, end in zip(starts, ends)]
+
+    def to_numpy(self) -> np.ndarray:
+        """All strings as an object array"""
+        return np.array(self.take(np.arange(len(self))), dtype=object)
+
+    def concat(self, other: 'StringColumn') -> 'StringColumn':
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return StringColumn(np.concatenate([self.data, other.data]), offsets)
+
+
+class CatalogIndex:
+    """Columnar view of the catalog used for filtering and scoring
+
+    Built once when the model is prepared or loaded, so a request only does
+    NumPy integer/bitmask work on row ids instead of pandas masking.
+
+    All state is a set of plain NumPy arrays, so the index can be saved
+    with the model artifact and memory-mapped by every worker process
+    instead of being rebuilt per process. Track ids are UTF-8 bytes looked
+    up by binary search over a sorted copy; track names and artists are
+    StringColumns and genres are integer codes into a small table of names.
+    Response fields are read with gather().
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._set_arrays(self.frame_arrays(df))
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'CatalogIndex':
+        """Wrap arrays previously taken from CatalogIndex.arrays (e.g. memory-mapped)"""
+        catalog = cls.__new__(cls)
+        catalog._set_arrays(arrays)
+        return catalog
+
+    @staticmethod
+    def encode_ids(track_ids: Iterable[str]) -> np.ndarray:
+        """Track ids as a fixed-width bytes array, the form they are stored and searched in"""
+        return np.array([track_id.encode('utf-8') for track_id in track_ids], dtype=bytes)
+
+    @classmethod
+    def frame_arrays(cls, df: pd.DataFrame, genre_names: np.ndarray = None,
+                     subgenre_names: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """Columnar arrays for the rows of df, extending the given category names if any"""
+        arrays = {
+            'track_ids': cls.encode_ids(df['track_id'].fillna('').astype(str).tolist()),
+            'popularity': df['track_popularity'].fillna(0).to_numpy(dtype=np.int16)
+        }
+        for name, column in STRING_COLUMNS.items():
+            strings = StringColumn.from_values(df[column])
+            arrays[f'{name}_data'], arrays[f'{name}_offsets'] = strings.data, strings.offsets
+        if 'release_date' in df.columns:
+            years = df['release_date'].dt.year
+            arrays['years'] = years.fillna(MISSING_YEAR).to_numpy(dtype=np.int16)
+        arrays['genre_codes'], arrays['genre_names'] = cls._encode(df, 'playlist_genre', genre_names)
+        arrays['subgenre_codes'], arrays['subgenre_names'] = cls._encode(df, 'playlist_subgenre', subgenre_names)
+        return arrays
+
+    @staticmethod
+    def _encode(df: pd.DataFrame, column: str, names: np.ndarray = None):
+        """Integer-code a categorical column; names[-1] is '' so missing values (-1) decode to ''"""
+        categories = [] if names is None else names[:-1].tolist()
+        if column not in df.columns:
+            return np.full(len(df), -1, dtype=np.int16), np.array(categories + [''], dtype=str)
+        code_of = {value: code for code, value in enumerate(categories)}
+        codes = np.empty(len(df), dtype=np.int16)
+        for i, value in enumerate(df[column].tolist()):
+            if pd.isna(value):
+                codes[i] = -1
+                continue
+            if value not in code_of:
+                code_of[value] = len(categories)
+                categories.append(value)
+            codes[i] = code_of[value]
+        return codes, np.array(categories + [''], dtype=str)
+
+    def _set_arrays(self, arrays: Dict[str, np.ndarray]):
+        if 'id_rows' not in arrays:
+            # The same track can appear in several playlists, so one id may map to many rows;
+            # a stable sort keeps those rows in ascending order
+            arrays['id_rows'] = np.argsort(arrays['track_ids'], kind='stable').astype(np.int64)
+            arrays['sorted_ids'] = arrays['track_ids'][arrays['id_rows']]
+        self.arrays = arrays
+        self.n_rows = len(arrays['track_ids'])
+
+        self.track_ids = arrays['track_ids']
+        self.track_names = StringColumn(arrays['track_names_data'], arrays['track_names_offsets'])
+        self.track_artists = StringColumn(arrays['track_artists_data'], arrays['track_artists_offsets'])
+        self.sorted_ids = arrays['sorted_ids']
+        self.id_rows = arrays['id_rows']
+        self.years = arrays.get('years')
+        self.genre_codes = arrays['genre_codes']
+        self.genre_names = arrays['genre_names']
+        self.subgenre_codes = arrays['subgenre_codes']
+        self.subgenre_names = arrays['subgenre_names']
+        self.popularity = arrays['popularity']
+        self._year_counts = None  # (years, cumulative row counts), built on first use
+
+        self.genres = {name: code for code, name in enumerate(self.genre_names[:-1].tolist())}
+        self.subgenres = {name: code for code, name in enumerate(self.subgenre_names[:-1].tolist())}
+
+    def extend(self, df: pd.DataFrame) -> 'CatalogIndex':
+        """Return a catalog with the rows of df appended; this one is left unchanged
+
+        The rows go to a small delta catalog next to this one (see
+        SegmentedCatalog), so the cost does not grow with the catalog and
+        memory-mapped arrays stay shared.
+        """
+        return SegmentedCatalog(self, CatalogIndex.from_arrays(
+            self.frame_arrays(df, self.genre_names, self.subgenre_names)))
+
+    def concat(self, other: 'CatalogIndex') -> 'CatalogIndex':
+        """One catalog with the rows of other after these; other's genre tables must extend ours"""
+        arrays = {
+            name: np.concatenate([self.arrays[name], other.arrays[name]])
+            for name in ('track_ids', 'popularity', 'genre_codes', 'subgenre_codes')
+        }
+        for name in STRING_COLUMNS:
+            strings = getattr(self, name).concat(getattr(other, name))
+            arrays[f'{name}_data'], arrays[f'{name}_offsets'] = strings.data, strings.offsets
+        arrays['genre_names'] = other.genre_names
+        arrays['subgenre_names'] = other.subgenre_names
+        if self.years is not None:
+            other_years = other.years if other.years is not None else np.full(other.n_rows, MISSING_YEAR, dtype=np.int16)
+            arrays['years'] = np.concatenate([self.years, other_years])
+
+        # Merge the other ids into the sorted lookup instead of re-sorting everything;
+        # inserting after equal ids keeps our rows first
+        positions = np.searchsorted(self.sorted_ids, other.sorted_ids, side='right')
+        arrays['sorted_ids'] = np.insert(self.sorted_ids, positions, other.sorted_ids)
+        arrays['id_rows'] = np.insert(self.id_rows, positions, self.n_rows + other.id_rows)
+        return CatalogIndex.from_arrays(arrays)
+
+    def merged(self) -> 'CatalogIndex':
+        """This catalog as one set of arrays (see SegmentedCatalog)"""
+        return self
+
+    def _ranges(self, track_ids: Iterable[str]):
+        track_ids = self.encode_ids(track_id for track_id in track_ids if track_id is not None)
+        # Searching with wider ids than the stored ones would copy sorted_ids at that width
+        # on every call; such ids cannot be in the catalog, so they get empty ranges
+        left = np.zeros(len(track_ids), dtype=np.int64)
+        right = np.zeros(len(track_ids), dtype=np.int64)
+        fits = np.char.str_len(track_ids) <= self.sorted_ids.dtype.itemsize
+        searched = track_ids[fits].astype(self.sorted_ids.dtype)
+        left[fits] = np.searchsorted(self.sorted_ids, searched, side='left')
+        right[fits] = np.searchsorted(self.sorted_ids, searched, side='right')
+        return left, right
+
+    def contains(self, track_ids: Iterable) -> np.ndarray:
+        """Boolean mask telling which of the given track ids are in the catalog"""
+        track_ids = list(track_ids)
+        known = np.array([track_id is not None for track_id in track_ids], dtype=bool)
+        left, right = self._ranges(track_ids)
+        known[known] = right > left
+        return known
+
+    def rows_for(self, track_ids: Iterable[str]) -> np.ndarray:
+        """Return every row id holding one of the given track ids (unknown ids are skipped)"""
+        left, right = self._ranges(track_ids)
+        counts = right - left
+        if not counts.sum():
+            return np.empty(0, dtype=np.int64)
+        # Concatenate the id_rows[left:right] slices without a Python loop
+        starts = np.repeat(left - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        return self.id_rows[starts + np.arange(counts.sum())]
+
+    def row_of(self, track_id: str) -> int:
+        """First row id holding track_id, or -1 if the track is not in the catalog"""
+        if track_id is None:
+            return -1
+        track_id = track_id.encode('utf-8')
+        if len(track_id) > self.sorted_ids.dtype.itemsize:
+            return -1
+        position = np.searchsorted(self.sorted_ids, np.array(track_id, dtype=self.sorted_ids.dtype))
+        if position == self.n_rows or self.sorted_ids[position] != track_id:
+            return -1
+        return int(self.id_rows[position])
+
+    def genre_code(self, genre: str) -> int:
+        """Integer code of a playlist genre, or -2 if it never occurs in the catalog"""
+        return self.genres.get(genre, -2)
+
+    def subgenre_code(self, subgenre: str) -> int:
+        """Integer code of a playlist subgenre, or -2 if it never occurs in the catalog"""
+        return self.subgenres.get(subgenre, -2)
+
+    def year_window(self, year: int, year_range: int, rows: np.ndarray = None) -> np.ndarray:
+        """Boolean mask of rows (all rows by default) released within year_range years of year"""
+        if self.years is None:
+            return np.ones(self.n_rows if rows is None else len(rows), dtype=bool)
+        years = np.asarray(self.years) if rows is None else self.years[rows]
+        return (years >= year - year_range) & (years <= year + year_range)
+
+    def count_in_window(self, year: int, year_range: int) -> int:
+        """Number of rows released within year_range years of year, from a per-year histogram"""
+        if self.years is None:
+            return self.n_rows
+        if self._year_counts is None:
+            years, counts = np.unique(self.years, return_counts=True)
+            self._year_counts = years, np.concatenate([[0], np.cumsum(counts)])
+        years, cumulative = self._year_counts
+        return int(cumulative[np.searchsorted(years, year + year_range, side='right')]
+                   - cumulative[np.searchsorted(years, year - year_range, side='left')])
+
+    def ids(self, rows=None) -> np.ndarray:
+        """Track ids of rows (all rows by default) as a unicode array"""
+        track_ids = np.asarray(self.track_ids) if rows is None else self.track_ids[rows]
+        return np.char.decode(track_ids, 'utf-8') if len(track_ids) else np.array([], dtype=str)
+
+    def gather(self, rows: np.ndarray) -> Dict[str, List[Any]]:
+        """Metadata fields of rows, one list per field, decoded from the compact columns"""
+        rows = np.asarray(rows, dtype=np.int64)
+        return {
+            'track_id': self.ids(rows).tolist(),
+            'track_name': self.track_names.take(rows),
+            'track_artist': self.track_artists.take(rows),
+            'track_popularity': self.popularity[rows].tolist(),
+            'playlist_genre': self.genre_names[self.genre_codes[rows]].tolist(),
+            'playlist_subgenre': self.subgenre_names[self.subgenre_codes[rows]].tolist()
+        }
+
+    def records(self, rows: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        """Build recommendation dicts for rows from one gather per field"""
+        fields = self.gather(rows)
+        columns = zip(
+            fields['track_id'],
+            fields['track_name'],
+            fields['track_artist'],
+            np.asarray(scores, dtype=float).tolist(),
+            fields['track_popularity'],
+            fields['playlist_genre'],
+            fields['playlist_subgenre']
+        )
+        return [
+            {
+                'track_id': track_id,
+                'track_name': track_name,
+                'track_artist': track_artist,
+                'similarity_score': score,
+                'track_popularity': popularity,
+                'playlist_genre': genre,
+                'playlist_subgenre': subgenre
+            }
+            for track_id, track_name, track_artist, score, popularity, genre, subgenre in columns
+        ]
+
+
+class SegmentedCatalog(CatalogIndex):
+    """A catalog followed by a small delta catalog of rows added while serving
+
+    Row ids continue from the base into the delta. Columns are Segmented,
+    lookups search the id index of both parts, and the genre tables are the
+    delta's, which extend the base's. Neither part is copied when rows are
+    appended; merged() folds the delta into one CatalogIndex (for saving).
+    """
+
+    def __init__(self, base: CatalogIndex, delta: CatalogIndex):
+        self.base = base
+        self.delta = delta
+        self.n_base = base.n_rows
+        self.n_rows = base.n_rows + delta.n_rows
+
+        for name in ('track_ids', 'track_names', 'track_artists', 'popularity', 'genre_codes', 'subgenre_codes'):
+            setattr(self, name, Segmented(getattr(base, name), getattr(delta, name)))
+        self.years = None
+        if base.years is not None:
+            delta_years = delta.years if delta.years is not None else np.full(delta.n_rows, MISSING_YEAR, dtype=np.int16)
+            self.years = Segmented(base.years, delta_years)
+        self.genre_names = delta.genre_names
+        self.subgenre_names = delta.subgenre_names
+        self.genres = delta.genres
+        self.subgenres = delta.subgenres
+
+    def extend(self, df: pd.DataFrame) -> 'CatalogIndex':
+        new = CatalogIndex.from_arrays(self.frame_arrays(df, self.genre_names, self.subgenre_names))
+        return SegmentedCatalog(self.base, self.delta.concat(new))
+
+    def merged(self) -> CatalogIndex:
+        return self.base.concat(self.delta)
+
+    def contains(self, track_ids: Iterable) -> np.ndarray:
+        track_ids = list(track_ids)
+        return self.base.contains(track_ids) | self.delta.contains(track_ids)
+
+    def rows_for(self, track_ids: Iterable[str]) -> np.ndarray:
+        track_ids = list(track_ids)
+        return np.concatenate([self.base.rows_for(track_ids), self.n_base + self.delta.rows_for(track_ids)])
+
+    def row_of(self, track_id: str) -> int:
+        row = self.base.row_of(track_id)
+        if row < 0:
+            row = self.delta.row_of(track_id)
+            row = row + self.n_base if row >= 0 else -1
+        return row
+
+    def count_in_window(self, year: int, year_range: int) -> int:
+        return self.base.count_in_window(year, year_range) + self.delta.count_in_window(year, year_range)
@@ -0,0 +1,181 @@
+import argparse
+import copy
+import logging
+import time
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score
+
+from comparison import catalog_seeds, compare_variants, sample_rows
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_METHODS = ('kmeans', 'minibatch')
+CLUSTER_DTYPES = ('float64', 'float32')
+
+
+def fit_clusters(matrix, n_clusters: int = 50, method: str = 'kmeans', dtype: str = 'float64',
+                 init: Optional[np.ndarray] = None, batch_size: int = 4096,
+                 random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster the rows of a dense or CSR matrix, returning (labels, float64 centroids)
+
+    'kmeans' is full-batch Lloyd; 'minibatch' updates the centroids from
+    random batches of batch_size rows, so each iteration costs the same
+    whatever the catalog size. float32 halves the memory the fit works on.
+    init warm-starts from previous centroids (one run instead of several
+    k-means++ seedings).
+    """
+    if method not in CLUSTER_METHODS:
+        raise ValueError(f"Unknown clustering method '{method}', expected one of {CLUSTER_METHODS}")
+    if dtype not in CLUSTER_DTYPES:
+        raise ValueError(f"Unknown clustering dtype '{dtype}', expected one of {CLUSTER_DTYPES}")
+    matrix = matrix.astype(dtype, copy=False) if sp.issparse(matrix) else np.asarray(matrix, dtype=dtype)
+    options = {'n_clusters': n_clusters, 'random_state': random_state}
+    if init is not None:
+        options.update(init=np.asarray(init, dtype=dtype), n_init=1)
+    if method == 'minibatch':
+        model = MiniBatchKMeans(batch_size=batch_size, **options)
+    else:
+        model = KMeans(**options)
+
+    start = time.perf_counter()
+    labels = model.fit_predict(matrix)
+    logger.info(f"{method} clustering of {matrix.shape[0]} rows ({dtype}, "
+                f"{'warm' if init is not None else 'cold'} start) took {time.perf_counter() - start:.1f}s")
+    return labels, model.cluster_centers_.astype(np.float64)
+
+
+def nearest_centroid(centroids: np.ndarray, audio_features: np.ndarray, lyrics_features=None) -> np.ndarray:
+    """Label rows with their nearest centroid (the KMeans predict rule)
+
+    Rows come as a dense audio block and an optional lyrics block (dense or
+    CSR) holding the remaining centroid columns.
+    """
+    n_audio = audio_features.shape[1]
+    # argmin ||x - c||^2 == argmin ||c||^2 - 2 x.c, computed per block
+    distances = np.einsum('ij,ij->i', centroids, centroids)[None, :] - 2 * (audio_features @ centroids[:, :n_audio].T)
+    if lyrics_features is not None and centroids.shape[1] > n_audio:
+        distances = distances - 2 * np.asarray(lyrics_features @ centroids[:, n_audio:].T)
+    return distances.argmin(axis=1)
+
+
+def align_centroids(centroids: np.ndarray, n_audio: int, old_vocabulary: Dict[str, int],
+                    new_vocabulary: Dict[str, int]) -> np.ndarray:
+    """Move the lyrics columns of centroids from one TF-IDF vocabulary to another
+
+    Refits learn a new vocabulary, so the previous snapshot's centroids are
+    re-indexed by term before warm-starting; terms that left the vocabulary
+    are dropped and new terms start at zero.
+    """
+    aligned = np.zeros((len(centroids), n_audio + len(new_vocabulary)))
+    aligned[:, :n_audio] = centroids[:, :n_audio]
+    shared = [(old_vocabulary[term], index) for term, index in new_vocabulary.items() if term in old_vocabulary]
+    if shared:
+        old_columns, new_columns = np.array(shared).T
+        aligned[:, n_audio + new_columns] = centroids[:, n_audio + old_columns]
+    return aligned
+
+
+def assignment_stability(previous, current) -> float:
+    """ARI of the cluster labels of tracks present in both snapshots"""
+    previous_catalog, current_catalog = previous.catalog.merged(), current.catalog.merged()
+    positions = np.searchsorted(previous_catalog.sorted_ids, current_catalog.track_ids)
+    positions = np.minimum(positions, previous_catalog.n_rows - 1)
+    shared = previous_catalog.sorted_ids[positions] == current_catalog.track_ids
+    if not shared.any():
+        return float('nan')
+    previous_rows = previous_catalog.id_rows[positions[shared]]
+    return adjusted_rand_score(np.asarray(previous.clusters)[previous_rows], np.asarray(current.clusters)[shared])
+
+
+def inertia(matrix, labels: np.ndarray, centroids: np.ndarray) -> float:
+    """Sum of squared distances of rows to their centroid"""
+    if sp.issparse(matrix):
+        row_norms = np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+        dots = np.asarray(matrix.multiply(centroids[labels]).sum(axis=1)).ravel()
+    else:
+        row_norms = np.einsum('ij,ij->i', matrix, matrix)
+        dots = np.einsum('ij,ij->i', matrix, centroids[labels])
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)[labels]
+    return float(np.sum(row_norms - 2 * dots + centroid_norms))
+
+
+def clustered_variant(recommender, matrix, method: str = 'kmeans', dtype: str = 'float64',
+                      init: Optional[np.ndarray] = None, n_clusters: int = 50, random_state: int = 42):
+    """Copy of a recommender with its clusters refitted from matrix
+
+    The search index has its own partitions (see ann_index), so it is shared.
+    """
+    variant = copy.copy(recommender)
+    variant.clusters, variant.centroids = fit_clusters(matrix, n_clusters, method, dtype, init=init,
+                                                       random_state=random_state)
+    return variant
+
+
+def clustering_report(recommender, variants: Iterable[Tuple[str, str]] = (('minibatch', 'float32'),),
+                      n_clusters: int = 50, k: int = 10, n_queries: int = 200,
+                      random_state: int = 42) -> Dict[str, Dict[str, Any]]:
+    """Fit time, inertia and agreement with full-batch float64 KMeans for clustering variants
+
+    Agreement is the adjusted Rand index (ARI) of the cluster labels with a
+    reference KMeans fit, and the top-k overlap of the recommendations with
+    that fit (see comparison.compare_variants). For scale, the report
+    includes KMeans with another seed (how stable the reference is on its
+    own) and every variant warm-started from the reference centroids, as a
+    refit would be.
+    """
+    matrix = recommender.feature_matrix()
+    seeds = {'catalog': catalog_seeds(recommender, sample_rows(recommender, n_queries, random_state))}
+
+    def build(method, dtype, warm_start=False, seed=random_state):
+        def builder():
+            init = np.asarray(reference[0].centroids) if warm_start else None
+            variant = clustered_variant(recommender, matrix, method, dtype, init, n_clusters, seed)
+            if not reference:
+                reference.append(variant)
+            return variant
+        return builder
+
+    def describe(variant, reference_model):
+        labels = np.asarray(variant.clusters)
+        return {
+            'inertia': inertia(matrix, labels, np.asarray(variant.centroids)),
+            'ari_vs_kmeans': adjusted_rand_score(np.asarray(reference_model.clusters), labels)
+        }
+
+    reference = []
+    builders = {
+        'kmeans/float64': build('kmeans', 'float64'),
+        'kmeans/float64 (other seed)': build('kmeans', 'float64', seed=random_state + 1)
+    }
+    for method, dtype in variants:
+        builders[f'{method}/{dtype}'] = build(method, dtype)
+        builders[f'{method}/{dtype} (warm start)'] = build(method, dtype, warm_start=True)
+    return compare_variants(builders, seeds, k, describe=describe)
+
+
+def main():
+    from data_processor import DataProcessor
+    from feature_store import load_latest
+
+    parser = argparse.ArgumentParser(description='Compare clustering methods on an artifact')
+    parser.add_argument('--artifacts', default='artifacts', help='Artifact root directory')
+    parser.add_argument('--data', default='src/data/spotify_songs.csv', help='Path to the songs CSV')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    recommender = load_latest(args.artifacts, DataProcessor(args.data), metadata=False)
+    if recommender is None:
+        raise SystemExit(f"No artifact in {args.artifacts}")
+    recommender.set_feature_dtype('float64')
+    report = clustering_report(recommender, [('minibatch', 'float32'), ('minibatch', 'float64'), ('kmeans', 'float32')])
+    for name, row in report.items():
+        print(f"{name:34s} fit={row['build_seconds']:.2f}s inertia={row['inertia']:.1f} "
+              f"ARI vs kmeans={row['ari_vs_kmeans']:.3f} overlap@10={row['overlap@10']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+from executor import Saturated
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Micro-batches concurrent calls into one batch call
+
+    Submitted items wait until a worker is free, and at most max_wait seconds
+    when one already is, so whatever arrives in the meantime is scored as one
+    batch: batch_fn(key, items) runs on the executor and returns one result
+    per item. Batches hold at most max_batch items and only items with the
+    same key (e.g. the same model snapshot). At most executor.max_queue items
+    may wait; beyond that submit() raises Saturated. If a batch fails, its
+    items are retried one by one so a single bad request cannot fail the rest.
+    """
+
+    def __init__(self, batch_fn: Callable[[Any, List[Any]], List[Any]], executor,
+                 max_batch: int = 32, max_wait: float = 0.002):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = OrderedDict()  # id(key) -> (key, [(item, future)])
+        self._n_pending = 0
+        self._in_flight = 0
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+
+    async def submit(self, key: Any, item: Any) -> Any:
+        if self._n_pending >= self.executor.max_queue:
+            self.rejected += 1
+            raise Saturated(f"{self._n_pending} requests waiting to be batched")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(id(key), (key, []))[1].append((item, future))
+        self._n_pending += 1
+
+        if len(self._pending[id(key)][1]) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._on_timer)
+        return await future
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Start batches, oldest key first, while there are free workers"""
+        while self._pending and self._in_flight < self.executor.max_workers:
+            key_id, (key, batch) = next(iter(self._pending.items()))
+            if len(batch) > self.max_batch:
+                self._pending[key_id] = (key, batch[self.max_batch:])
+                batch = batch[:self.max_batch]
+            else:
+                del self._pending[key_id]
+            self._n_pending -= len(batch)
+            self._in_flight += 1
+            self.batches += 1
+            self.items += len(batch)
+            asyncio.ensure_future(self._run(key, batch))
+
+    async def _run(self, key: Any, batch: List) -> None:
+        try:
+            await self._execute(key, batch)
+        finally:
+            self._in_flight -= 1
+            # Items that arrived while this batch ran have waited long enough
+            self._dispatch()
+
+    async def _execute(self, key: Any, batch: List) -> None:
+        try:
+            results = await self.executor.run(self.batch_fn, key, [item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1 or isinstance(e, Saturated):
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            logger.warning(f"Batch of {len(batch)} failed ({e}), retrying items individually")
+            await asyncio.gather(*(self._execute(key, [entry]) for entry in batch))
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_batch': self.max_batch,
+            'max_wait': self.max_wait,
+            'pending': self._n_pending,
+            'batches': self.batches,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,71 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def sample_rows(recommender, n_queries: int = 200, random_state: int = 42) -> np.ndarray:
+    """Random catalog rows to use as seeds"""
+    rng = np.random.default_rng(random_state)
+    n_rows = recommender.catalog.n_rows
+    return rng.choice(n_rows, size=min(n_queries, n_rows), replace=False)
+
+
+def catalog_seeds(recommender, rows: np.ndarray) -> List[Dict[str, Any]]:
+    """Seeds referring to catalog tracks by track id"""
+    return [{'track_id': track_id} for track_id in recommender.catalog.ids(rows).tolist()]
+
+
+def run_seeds(model, seeds: Sequence[Dict[str, Any]], k: int = 10) -> Tuple[List[List[str]], float]:
+    """Top-k track ids of every seed, one call per seed, and the mean seconds per call"""
+    results, elapsed = [], 0.0
+    for seed in seeds:
+        start = time.perf_counter()
+        recommendations = model.find_similar_songs_batch([seed], n_recommendations=k)[0]
+        elapsed += time.perf_counter() - start
+        results.append([rec['track_id'] for rec in recommendations])
+    return results, elapsed / max(len(seeds), 1)
+
+
+def overlap_at_k(reference: Sequence[Sequence[str]], results: Sequence[Sequence[str]]) -> float:
+    """Mean fraction of each reference list that is also in the matching result list"""
+    return float(np.mean([len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(reference, results)]))
+
+
+def compare_variants(builders: Dict[str, Callable[[], Any]], seeds: Dict[str, Sequence[Dict[str, Any]]],
+                     k: int = 10, describe: Optional[Callable[[Any, Any], Dict[str, Any]]] = None
+                     ) -> Dict[str, Dict[str, Any]]:
+    """Compare the recommendations of model variants against the first one
+
+    builders maps a variant name to a function building that variant (the
+    first builder gives the reference); variants are built one at a time.
+    seeds maps a kind of seed to a list of seeds. For every variant the
+    report gives the build time, the mean top-k overlap with the reference
+    per kind ('overlap@k' for 'catalog' seeds, '<kind>_overlap@k' for the
+    others), the mean latency of one recommendation and whatever
+    describe(variant, reference) returns.
+    """
+    report = {}
+    reference = reference_ids = None
+    for name, build in builders.items():
+        start = time.perf_counter()
+        model = build()
+        row = {'build_seconds': time.perf_counter() - start}
+        ids, latencies = {}, []
+        for kind, kind_seeds in seeds.items():
+            ids[kind], latency = run_seeds(model, kind_seeds, k)
+            latencies.extend([latency] * len(kind_seeds))
+        if reference is None:
+            reference, reference_ids = model, ids
+        for kind in seeds:
+            key = f'overlap@{k}' if kind == 'catalog' else f'{kind}_overlap@{k}'
+            row[key] = overlap_at_k(reference_ids[kind], ids[kind])
+        row['latency_ms'] = float(np.mean(latencies)) * 1000 if latencies else 0.0
+        if describe is not None:
+            row.update(describe(model, reference))
+        report[name] = row
+    logger.info(f"Variant comparison: {report}")
+    return report
@@ -0,0 +1,171 @@
+import argparse
+import importlib.util
+import logging
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Explicit dtypes of the spotify_songs.csv columns; columns not listed are inferred
+COLUMN_DTYPES = {
+    'track_id': 'str',
+    'track_name': 'str',
+    'track_artist': 'str',
+    'lyrics': 'str',
+    'track_popularity': 'Int8',
+    'track_album_id': 'str',
+    'track_album_name': 'str',
+    'track_album_release_date': 'str',
+    'playlist_name': 'category',
+    'playlist_id': 'str',
+    'playlist_genre': 'category',
+    'playlist_subgenre': 'category',
+    'danceability': 'float64',
+    'energy': 'float64',
+    'key': 'Int8',
+    'loudness': 'float64',
+    'mode': 'Int8',
+    'speechiness': 'float64',
+    'acousticness': 'float64',
+    'instrumentalness': 'float64',
+    'liveness': 'float64',
+    'valence': 'float64',
+    'tempo': 'float64',
+    'duration_ms': 'Int32',
+    'language': 'category'
+}
+
+# The audio features are read as float32 when streaming, which halves chunk memory; the model
+# keeps float64 so its recommendations do not change
+STREAMING_DTYPES = dict(COLUMN_DTYPES, **{
+    column: 'float32' for column, dtype in COLUMN_DTYPES.items() if dtype == 'float64'
+})
+
+# track_album_release_date parsed once by the conversion; CSV readers parse it themselves
+PARSED_DATE_COLUMN = 'release_date'
+
+COLUMNAR_FORMATS = {'.parquet': 'parquet', '.feather': 'feather'}
+
+
+def has_pyarrow() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def columnar_copy(csv_path) -> Optional[Path]:
+    """The Parquet or Feather copy next to csv_path, if there is one; rebuilt first if the CSV is newer"""
+    csv_path = Path(csv_path)
+    if not has_pyarrow():
+        return None
+    for suffix in COLUMNAR_FORMATS:
+        path = csv_path.with_suffix(suffix)
+        if not path.exists():
+            continue
+        if csv_path.exists() and path.stat().st_mtime < csv_path.stat().st_mtime:
+            logger.info(f"{csv_path} changed since {path} was written, rebuilding it")
+            convert(csv_path, path)
+        return path
+    return None
+
+
+def resolve(path) -> Path:
+    """The file to read for path: a columnar file as given, else the CSV's columnar copy, else the CSV"""
+    path = Path(path)
+    if path.suffix in COLUMNAR_FORMATS:
+        return path
+    return columnar_copy(path) or path
+
+
+def available_columns(path) -> List[str]:
+    path = Path(path)
+    if path.suffix in COLUMNAR_FORMATS:
+        import pyarrow.dataset as ds
+        return ds.dataset(path, format=COLUMNAR_FORMATS[path.suffix]).schema.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def _projection(path: Path, columns: Optional[List[str]]) -> List[str]:
+    """Requested columns present in the file, in the requested order (all columns if None)"""
+    names = available_columns(path)
+    if columns is None:
+        return names
+    return [column for column in columns if column in names]
+
+
+def _csv_dtypes(columns: List[str], dtypes: dict = COLUMN_DTYPES) -> dict:
+    return {column: dtypes[column] for column in columns if column in dtypes}
+
+
+def read_table(path, columns: List[str] = None) -> pd.DataFrame:
+    """Read the dataset with explicit dtypes, only the given columns (missing ones are skipped)
+
+    Reads the columnar copy written by convert() when there is one (after
+    rebuilding it if the CSV changed since), which is much faster than
+    parsing the CSV and already has parsed release dates (PARSED_DATE_COLUMN).
+    """
+    source = resolve(path)
+    columns = _projection(source, columns)
+    logger.info(f"Reading {len(columns)} columns from {source}")
+    if source.suffix == '.parquet':
+        return pd.read_parquet(source, columns=columns)
+    if source.suffix == '.feather':
+        return pd.read_feather(source, columns=columns)
+    return pd.read_csv(source, usecols=columns, dtype=_csv_dtypes(columns))
+
+
+def iter_table(path, columns: List[str] = None, chunksize: int = 100000) -> Iterator[pd.DataFrame]:
+    """Read the dataset chunksize rows at a time, like read_table but with STREAMING_DTYPES"""
+    source = resolve(path)
+    columns = _projection(source, columns)
+    if source.suffix in COLUMNAR_FORMATS:
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(source, format=COLUMNAR_FORMATS[source.suffix])
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            if batch.num_rows:
+                chunk = batch.to_pandas()
+                yield chunk.astype(_csv_dtypes(chunk.columns, STREAMING_DTYPES))
+        return
+    yield from pd.read_csv(source, usecols=columns, dtype=_csv_dtypes(columns, STREAMING_DTYPES), chunksize=chunksize)
+
+
+def convert(csv_path, output=None) -> Path:
+    """Write a typed columnar copy of the CSV (Parquet by default, Feather for a .feather output)
+
+    Genres and other low-cardinality columns are stored as categoricals and
+    release dates are parsed once into PARSED_DATE_COLUMN. The loaders pick
+    the copy up automatically and rebuild it once the CSV is newer.
+    """
+    csv_path = Path(csv_path)
+    output = Path(output) if output else csv_path.with_suffix('.parquet')
+    if output.suffix not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown columnar format '{output.suffix}', expected one of {sorted(COLUMNAR_FORMATS)}")
+    columns = available_columns(csv_path)
+    df = pd.read_csv(csv_path, dtype=_csv_dtypes(columns))
+    if 'track_album_release_date' in df.columns:
+        df[PARSED_DATE_COLUMN] = pd.to_datetime(df['track_album_release_date'], format='ISO8601')
+
+    # Per process, as several workers may rebuild a stale copy at once
+    tmp_path = output.with_name(f'{output.name}.{os.getpid()}.tmp')
+    if output.suffix == '.parquet':
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_feather(tmp_path)
+    tmp_path.replace(output)
+    logger.info(f"Wrote {len(df)} rows of {csv_path} to {output}")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the songs CSV to a typed columnar file')
+    parser.add_argument('--data', default='src/data/spotify_songs.csv', help='Path to the songs CSV')
+    parser.add_argument('--output', help='.parquet or .feather file to write (default: the CSV path as .parquet)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"Wrote {convert(args.data, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+from pathlib import Path
+from typing import List, Dict, Any, Iterator
+import logging
+import argparse
+import json
+
+try:
+    from .columnar import PARSED_DATE_COLUMN, iter_table, read_table
+    from .streaming_stats import NumericSummary, CategoricalSummary
+except ImportError:  # run as a script
+    from columnar import PARSED_DATE_COLUMN, iter_table, read_table
+    from streaming_stats import NumericSummary, CategoricalSummary
+
+logger = logging.getLogger(__name__)
+
+class DataAnalyzer:
+    def __init__(self, data_path: str, chunksize: int = 100000):
+        self.data_path = Path(data_path)
+        self.data = None
+        self.chunksize = chunksize  # rows per chunk in streaming mode
+        
+    def load_data(self, columns: List[str] = None) -> pd.DataFrame:
+        """Load the dataset (only the given columns, if any) from its columnar copy or the CSV"""
+        try:
+            logger.info(f"Loading data from {self.data_path}")
+            self.data = read_table(self.data_path, columns)
+            logger.info(f"Successfully loaded {len(self.data)} records")
+            return self.data
+        except Exception as e:
+            logger.error(f"Error loading data: {str(e)}")
+            raise
+            
+    def iter_chunks(self, chunksize: int = None) -> Iterator[pd.DataFrame]:
+        """Read the dataset chunk by chunk with explicit dtypes"""
+        yield from iter_table(self.data_path, chunksize=chunksize or self.chunksize)
+
+    def stream_report(self, chunksize: int = None, top_n: int = 5) -> Dict[str, Any]:
+        """Report in one pass over the CSV without loading it into memory
+
+        Has the sections of generate_full_report() (basic info, describe-style
+        numeric statistics with pairwise correlations, categorical value
+        counts) plus lyrics length statistics and songs per release year.
+        Chunks feed mergeable accumulators, so memory stays bounded by the
+        chunk size; quartiles, and counts of columns with very many distinct
+        values, are approximate on large catalogs (see streaming_stats).
+        """
+        numeric = categorical = None
+        lyrics = NumericSummary(['lyrics_length'])
+        release_years = pd.Series(dtype=np.int64)
+        dtypes = None
+        logger.info(f"Streaming {self.data_path} in chunks of {chunksize or self.chunksize} rows")
+        for chunk in self.iter_chunks(chunksize):
+            # Dates parsed by the columnar conversion only feed the release years
+            release_dates = chunk.pop(PARSED_DATE_COLUMN) if PARSED_DATE_COLUMN in chunk.columns else None
+            if numeric is None:
+                dtypes = chunk.dtypes
+                numeric = NumericSummary(chunk.select_dtypes(include=[np.number]).columns)
+                categorical = CategoricalSummary(chunk.columns.difference(numeric.columns, sort=False))
+            numeric.update(chunk)
+            categorical.update(chunk)
+            if 'lyrics' in chunk.columns:
+                lyrics.update(chunk['lyrics'].str.len().to_frame('lyrics_length'))
+            if release_dates is not None:
+                years = release_dates.dt.year
+                release_years = release_years.add(years.value_counts(), fill_value=0)
+            elif 'track_album_release_date' in chunk.columns:
+                years = pd.to_datetime(chunk['track_album_release_date'], format='mixed', errors='coerce').dt.year
+                release_years = release_years.add(years.value_counts(), fill_value=0)
+        if numeric is None:
+            raise ValueError(f"No rows in {self.data_path}")
+
+        missing_values = {**numeric.missing_values(), **categorical.missing}
+        report = {
+            "basic_info": {
+                "shape": (numeric.rows, len(dtypes)),
+                "columns": list(dtypes.index),
+                "missing_values": {column: missing_values[column] for column in dtypes.index},
+                "dtypes": dtypes.to_dict()
+            },
+            "numeric_analysis": {
+                "descriptive_stats": numeric.describe(),
+                "correlations": numeric.correlations()
+            },
+            "categorical_analysis": categorical.summary(top_n),
+            "release_years": {int(year): int(count) for year, count in release_years.sort_index().items()}
+        }
+        if 'lyrics' in dtypes.index:
+            report["lyrics_length"] = lyrics.describe()['lyrics_length']
+        logger.info(f"Streamed {numeric.rows} records")
+        return report
+
+    def get_basic_info(self) -> dict:
+        """Get basic information about the dataset"""
+        if self.data is None:
+            raise ValueError("Data not loaded. Call load_data() first")
+            
+        info = {
+            "shape": self.data.shape,
+            "columns": list(self.data.columns),
+            "missing_values": self.data.isnull().sum().to_dict(),
+            "dtypes": self.data.dtypes.to_dict()
+        }
+        
+        return info
+    
+    def analyze_audio_features(self):
+        """Analyze audio features"""
+        audio_features = [
+            'danceability', 'energy', 'loudness', 
+            'speechiness', 'acousticness', 'instrumentalness',
+            'liveness', 'valence', 'tempo'
+        ]
+        
+        # Check for missing values
+        missing = self.data[audio_features].isnull().sum()
+        print("\nMissing values in audio features:")
+        print(missing)
+        
+        # Basic statistics
+        print("\nBasic statistics for audio features:")
+        print(self.data[audio_features].describe())
+        
+        # Plot distributions
+        plt.figure(figsize=(15, 10))
+        for i, feature in enumerate(audio_features, 1):
+            plt.subplot(3, 3, i)
+            sns.histplot(data=self.data, x=feature, bins=30)
+            plt.title(f'{feature} distribution')
+        plt.tight_layout()
+        plt.savefig('audio_features_distribution.png')
+        plt.close()
+        
+    def analyze_lyrics(self):
+        """Analyze lyrics data"""
+        if 'lyrics' not in self.data.columns:
+            print("\nNo lyrics column found in the dataset")
+            return
+            
+        # Check for missing values
+        missing_lyrics = self.data['lyrics'].isnull().sum()
+        print(f"\nMissing lyrics: {missing_lyrics}")
+        
+        # Basic statistics about lyrics length
+        self.data['lyrics_length'] = self.data['lyrics'].str.len()
+        print("\nLyrics length statistics:")
+        print(self.data['lyrics_length'].describe())
+        
+        # Plot lyrics length distribution
+        plt.figure(figsize=(10, 6))
+        sns.histplot(data=self.data, x='lyrics_length', bins=50)
+        plt.title('Distribution of lyrics length')
+        plt.savefig('lyrics_length_distribution.png')
+        plt.close()
+        
+    def analyze_release_dates(self):
+        """Analyze release dates"""
+        if 'release_date' not in self.data.columns:
+            print("\nNo release_date column found in the dataset")
+            return
+            
+        # Convert to datetime
+        self.data['release_date'] = pd.to_datetime(self.data['release_date'])
+        
+        # Basic statistics
+        print("\nRelease date range:")
+        print(f"Earliest: {self.data['release_date'].min()}")
+        print(f"Latest: {self.data['release_date'].max()}")
+        
+        # Plot distribution by year
+        plt.figure(figsize=(12, 6))
+        self.data['release_year'] = self.data['release_date'].dt.year
+        sns.histplot(data=self.data, x='release_year', bins=50)
+        plt.title('Distribution of songs by release year')
+        plt.savefig('release_year_distribution.png')
+        plt.close()
+        
+    def analyze_genres(self):
+        """Analyze genres if available"""
+        if 'genre' not in self.data.columns:
+            print("\nNo genre column found in the dataset")
+            return
+            
+        # Count unique genres
+        unique_genres = self.data['genre'].nunique()
+        print(f"\nNumber of unique genres: {unique_genres}")
+        
+        # Top 10 genres
+        top_genres = self.data['genre'].value_counts().head(10)
+        print("\nTop 10 genres:")
+        print(top_genres)
+        
+        # Plot top genres
+        plt.figure(figsize=(12, 6))
+        top_genres.plot(kind='bar')
+        plt.title('Top 10 genres')
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        plt.savefig('top_genres.png')
+        plt.close()
+        
+    def analyze_numeric_features(self) -> Dict[str, Any]:
+        """Analyze all numeric features"""
+        numeric_columns = self.data.select_dtypes(include=[np.number]).columns
+        stats = self.data[numeric_columns].describe()
+        correlations = self.data[numeric_columns].corr()
+        
+        return {
+            "descriptive_stats": stats.to_dict(),
+            "correlations": correlations.to_dict()
+        }
+    
+    def analyze_categorical_features(self) -> Dict[str, Any]:
+        """Analyze all categorical features"""
+        categorical_columns = self.data.select_dtypes(include=['object', 'string', 'category']).columns
+        analysis = {}
+        
+        for col in categorical_columns:
+            value_counts = self.data[col].value_counts()
+            analysis[col] = {
+                "unique_values": len(value_counts),
+                "most_common": value_counts.head(5).to_dict(),
+                "missing_values": self.data[col].isnull().sum()
+            }
+            
+        return analysis
+    
+    def plot_correlation_matrix(self, save_path: str = None):
+        """Plot correlation matrix for numeric features"""
+        numeric_columns = self.data.select_dtypes(include=[np.number]).columns
+        corr_matrix = self.data[numeric_columns].corr()
+        
+        plt.figure(figsize=(12, 8))
+        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0)
+        plt.title('Correlation Matrix')
+        
+        if save_path:
+            plt.savefig(save_path)
+        plt.close()
+    
+    def generate_full_report(self, save_dir: str = None) -> Dict[str, Any]:
+        """Generate a complete analysis report"""
+        if self.data is None:
+            self.load_data()
+            
+        report = {
+            "basic_info": self.get_basic_info(),
+            "numeric_analysis": self.analyze_numeric_features(),
+            "categorical_analysis": self.analyze_categorical_features()
+        }
+        
+        # Analyze specific features
+        self.analyze_audio_features()
+        self.analyze_lyrics()
+        self.analyze_release_dates()
+        self.analyze_genres()
+        
+        if save_dir:
+            Path(save_dir).mkdir(parents=True, exist_ok=True)
+            self.plot_correlation_matrix(f"{save_dir}/correlation_matrix.png")
+            
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze the songs dataset')
+    parser.add_argument('--data', default='src/data/spotify_songs.csv',
+                        help='Path to the songs CSV (its columnar copy is used if present) or a .parquet/.feather file')
+    parser.add_argument('--stream', action='store_true',
+                        help='Analyze in one chunked pass without loading the file (no plots)')
+    parser.add_argument('--chunksize', type=int, default=100000, help='Rows per chunk with --stream')
+    parser.add_argument('--output', help='With --stream, write the report as JSON to this file')
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    analyzer = DataAnalyzer(args.data, chunksize=args.chunksize)
+    if args.stream:
+        report = analyzer.stream_report()
+        print(f"Dataset shape: {report['basic_info']['shape']}")
+        print("\nMissing values:")
+        print(pd.Series(report['basic_info']['missing_values']))
+        print("\nNumeric statistics:")
+        print(pd.DataFrame(report['numeric_analysis']['descriptive_stats']))
+        for column, analysis in report['categorical_analysis'].items():
+            print(f"\n{column}: {analysis['unique_values']} distinct, most common {analysis['most_common']}")
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2, default=str))
+        return
+
+    analyzer.load_data()
+    
+    print("=== Starting Full Data Analysis ===")
+    
+    print("\n1. Getting Basic Info...")
+    basic_info = analyzer.get_basic_info()
+    print(f"Dataset shape: {basic_info['shape']}")
+    print(f"Columns: {basic_info['columns']}")
+    
+    print("\n2. Analyzing Audio Features...")
+    analyzer.analyze_audio_features()
+    
+    print("\n3. Analyzing Lyrics...")
+    analyzer.analyze_lyrics()
+    
+    print("\n4. Analyzing Release Dates...")
+    analyzer.analyze_release_dates()
+    
+    print("\n5. Analyzing Genres...")
+    analyzer.analyze_genres()
+    
+    print("\n6. Generating Correlation Matrix...")
+    analyzer.plot_correlation_matrix('correlation_matrix.png')
+    
+    print("\n=== Analysis Complete ===")
+    print("Check the generated plots for visualizations.")
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
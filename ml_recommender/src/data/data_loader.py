@@ -0,0 +1,71 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import logging
+from typing import List
+
+try:
+    from .columnar import read_table
+except ImportError:  # run as a script
+    from columnar import read_table
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class DataLoader:
+    def __init__(self, data_path: str):
+        self.data_path = Path(data_path)
+        self.data = None
+        
+    def load_data(self, columns: List[str] = None) -> pd.DataFrame:
+        try:
+            logger.info(f"Loading data from {self.data_path}")
+            self.data = read_table(self.data_path, columns)
+            logger.info(f"Successfully loaded {len(self.data)} records")
+            return self.data
+        except Exception as e:
+            logger.error(f"Error loading data: {str(e)}")
+            raise
+            
+    def get_basic_info(self) -> dict:
+        if self.data is None:
+            raise ValueError("Data not loaded. Call load_data() first")
+            
+        info = {
+            "shape": self.data.shape,
+            "columns": list(self.data.columns),
+            "missing_values": self.data.isnull().sum().to_dict(),
+            "dtypes": self.data.dtypes.to_dict()
+        }
+        
+        return info
+    
+    def preprocess_data(self) -> pd.DataFrame:
+        if self.data is None:
+            raise ValueError("Data not loaded. Call load_data() first")
+            
+        self.data = self.data.drop_duplicates()
+        
+        # Integer columns are read as nullable integers; filling them with the mean needs floats
+        numeric_columns = [column for column in self.data.select_dtypes(include=[np.number]).columns
+                           if self.data[column].isna().any()]
+        numeric_data = self.data[numeric_columns].astype(np.float64)
+        self.data[numeric_columns] = numeric_data.fillna(numeric_data.mean())
+        
+        text_columns = self.data.select_dtypes(include=['object', 'string']).columns
+        self.data[text_columns] = self.data[text_columns].fillna('')
+        for column in self.data.select_dtypes(include=['category']).columns:
+            if self.data[column].isna().any() and '' not in self.data[column].cat.categories:
+                self.data[column] = self.data[column].cat.add_categories('')
+            self.data[column] = self.data[column].fillna('')
+        
+        return self.data
+
+if __name__ == "__main__":
+    loader = DataLoader("../../data/spotify_songs.csv")
+    data = loader.load_data()
+    info = loader.get_basic_info()
+    processed_data = loader.preprocess_data() 
\ No newline at end of file
@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any
+
+
+class NumericSummary:
+    """Mergeable one-pass statistics of numeric columns
+
+    Keeps pairwise-complete sums (counts, sums, sums of squares and cross
+    products, shifted by a per-column reference value for numerical
+    stability), so describe()-style moments and a pandas-style pairwise
+    correlation matrix come out of any number of chunks. Quantiles are
+    estimated from a bottom-k sample per column (every value gets a random
+    key and the sample_size smallest keys are kept), which is uniform,
+    mergeable and exact while a column has at most sample_size values.
+    """
+
+    def __init__(self, columns: List[str], sample_size: int = 50000, seed: int = 0):
+        self.columns = list(columns)
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        n = len(self.columns)
+        self.rows = 0
+        self.shift = None
+        self.pair_counts = np.zeros((n, n))
+        self.sums = np.zeros((n, n))  # sums[i, j]: sum of column i over rows where j is present
+        self.squares = np.zeros((n, n))
+        self.products = np.zeros((n, n))
+        self.minimum = np.full(n, np.inf)
+        self.maximum = np.full(n, -np.inf)
+        self.sample_keys = [np.empty(0) for _ in self.columns]
+        self.sample_values = [np.empty(0) for _ in self.columns]
+
+    def update(self, frame: pd.DataFrame) -> 'NumericSummary':
+        values = frame[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        present = ~np.isnan(values)
+        if self.shift is None:
+            with np.errstate(invalid='ignore'):
+                self.shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(len(self.columns))
+        shifted = np.where(present, values - self.shift, 0.0)
+        mask = present.astype(np.float64)
+
+        self.rows += len(values)
+        self.pair_counts += mask.T @ mask
+        self.sums += shifted.T @ mask
+        self.squares += (shifted * shifted).T @ mask
+        self.products += shifted.T @ shifted
+        with np.errstate(invalid='ignore'):
+            if len(values):
+                self.minimum = np.fmin(self.minimum, np.nanmin(np.where(present, values, np.inf), axis=0))
+                self.maximum = np.fmax(self.maximum, np.nanmax(np.where(present, values, -np.inf), axis=0))
+
+        for i in range(len(self.columns)):
+            column = values[present[:, i], i]
+            self._sample(i, self.rng.random(len(column)), column)
+        return self
+
+    def _sample(self, i: int, keys: np.ndarray, values: np.ndarray):
+        keys = np.concatenate([self.sample_keys[i], keys])
+        values = np.concatenate([self.sample_values[i], values])
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size - 1)[:self.sample_size]
+            keys, values = keys[keep], values[keep]
+        self.sample_keys[i], self.sample_values[i] = keys, values
+
+    def _shifted_sums(self, shift: np.ndarray):
+        """Sums, squares and products relative to another reference value"""
+        delta = self.shift - shift
+        counts = self.pair_counts
+        products = self.products + delta[None, :] * self.sums + delta[:, None] * self.sums.T + np.outer(delta, delta) * counts
+        squares = self.squares + 2 * delta[:, None] * self.sums + (delta ** 2)[:, None] * counts
+        sums = self.sums + delta[:, None] * counts
+        return sums, squares, products
+
+    def merge(self, other: 'NumericSummary') -> 'NumericSummary':
+        """Add another summary's rows to this one; other is left unchanged"""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge summaries of different columns")
+        if other.shift is None:
+            return self
+        if self.shift is None:
+            self.shift = other.shift.copy()
+        sums, squares, products = other._shifted_sums(self.shift)
+        self.rows += other.rows
+        self.pair_counts += other.pair_counts
+        self.sums += sums
+        self.squares += squares
+        self.products += products
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        for i in range(len(self.columns)):
+            self._sample(i, other.sample_keys[i], other.sample_values[i])
+        return self
+
+    def describe(self) -> Dict[str, Dict[str, float]]:
+        """Per column count, mean, std, min, quartiles and max like DataFrame.describe()"""
+        stats = {}
+        for i, column in enumerate(self.columns):
+            count = self.pair_counts[i, i]
+            if count == 0:
+                stats[column] = {'count': 0.0}
+                continue
+            mean = self.sums[i, i] / count
+            variance = (self.squares[i, i] - count * mean ** 2) / (count - 1) if count > 1 else np.nan
+            quartiles = np.quantile(self.sample_values[i], [0.25, 0.5, 0.75])
+            stats[column] = {
+                'count': float(count),
+                'mean': float(mean + self.shift[i]),
+                'std': float(np.sqrt(max(variance, 0.0))),
+                'min': float(self.minimum[i]),
+                '25%': float(quartiles[0]),
+                '50%': float(quartiles[1]),
+                '75%': float(quartiles[2]),
+                'max': float(self.maximum[i])
+            }
+        return stats
+
+    def correlations(self) -> Dict[str, Dict[str, float]]:
+        """Pearson correlations over pairwise complete rows, like DataFrame.corr()"""
+        counts = self.pair_counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = self.products - self.sums * self.sums.T / counts
+            variance_i = self.squares - self.sums ** 2 / counts
+            correlation = covariance / np.sqrt(variance_i * variance_i.T)
+        correlation = np.clip(correlation, -1.0, 1.0)
+        correlation[counts < 2] = np.nan
+        return pd.DataFrame(correlation, index=self.columns, columns=self.columns).to_dict()
+
+    def missing_values(self) -> Dict[str, int]:
+        return {column: int(self.rows - self.pair_counts[i, i]) for i, column in enumerate(self.columns)}
+
+
+class CategoricalSummary:
+    """Mergeable one-pass value counts of categorical columns
+
+    Value counts are exact until a column has seen more than capacity
+    distinct values; beyond that only the capacity most frequent values are
+    kept and 'count_error' bounds how much any reported count may be short.
+    Distinct values are counted exactly while nothing was dropped and
+    estimated with a HyperLogLog sketch otherwise.
+    """
+
+    def __init__(self, columns: List[str], capacity: int = 10000, precision: int = 14):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.precision = precision
+        self.rows = 0
+        self.counts = {column: pd.Series(dtype=np.int64) for column in self.columns}
+        self.missing = dict.fromkeys(self.columns, 0)
+        self.count_error = dict.fromkeys(self.columns, 0)
+        self.registers = {column: np.zeros(2 ** precision, dtype=np.uint8) for column in self.columns}
+
+    def update(self, frame: pd.DataFrame) -> 'CategoricalSummary':
+        self.rows += len(frame)
+        for column in self.columns:
+            values = frame[column]
+            self.missing[column] += int(values.isna().sum())
+            counts = values.value_counts(dropna=True)
+            counts = counts[counts > 0]  # categorical columns list unused categories too
+            counts.index = counts.index.astype(object)
+            self._add(column, counts.astype(np.int64))
+            self._observe(column, counts.index.to_numpy(dtype=object))
+        return self
+
+    def _add(self, column: str, counts: pd.Series):
+        merged = self.counts[column].add(counts, fill_value=0).astype(np.int64)
+        if len(merged) > self.capacity:
+            merged = merged.sort_values(ascending=False, kind='stable')
+            self.count_error[column] += int(merged.iloc[self.capacity])
+            merged = merged.iloc[:self.capacity]
+        self.counts[column] = merged
+
+    def _observe(self, column: str, values: np.ndarray):
+        """Add distinct values to the column's HyperLogLog registers"""
+        if not len(values):
+            return
+        hashes = pd.util.hash_array(values.astype(str).astype(object))
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = (hashes << np.uint64(p)).astype(np.float64)
+        # Position of the leftmost 1-bit among the remaining 64 - p bits
+        _, exponent = np.frexp(rest)
+        rank = np.minimum(65 - exponent, 64 - p + 1).astype(np.uint8)
+        np.maximum.at(self.registers[column], index, rank)
+
+    def merge(self, other: 'CategoricalSummary') -> 'CategoricalSummary':
+        """Add another summary's rows to this one; other is left unchanged"""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge summaries of different columns")
+        self.rows += other.rows
+        for column in self.columns:
+            self.missing[column] += other.missing[column]
+            self.count_error[column] += other.count_error[column]
+            self._add(column, other.counts[column])
+            np.maximum(self.registers[column], other.registers[column], out=self.registers[column])
+        return self
+
+    def distinct(self, column: str) -> int:
+        if not self.count_error[column]:
+            return len(self.counts[column])
+        registers = self.registers[column].astype(np.float64)
+        m = len(registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(2.0 ** -registers)
+        empty = np.count_nonzero(registers == 0)
+        if estimate <= 2.5 * m and empty:
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+    def summary(self, top_n: int = 5) -> Dict[str, Dict[str, Any]]:
+        """Distinct values, top_n most common values and missing values per column"""
+        analysis = {}
+        for column in self.columns:
+            counts = self.counts[column].sort_values(ascending=False, kind='stable')
+            analysis[column] = {
+                'unique_values': self.distinct(column),
+                'most_common': counts.head(top_n).to_dict(),
+                'missing_values': self.missing[column],
+                'count_error': self.count_error[column]
+            }
+        return analysis
@@ -2,17 +2,48 @@ import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 from datetime import datetime
+from functools import lru_cache
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 import re
+from lyrics_pipeline import LyricsPreprocessor
+from data.columnar import PARSED_DATE_COLUMN, read_table
+
+AUDIO_FEATURES = [
+    'danceability', 'energy', 'loudness', 
+    'speechiness', 'acousticness', 'instrumentalness',
+    'liveness', 'valence', 'tempo'
+]
+
+# Columns the model reads; playlist names, album ids, keys, ... are never loaded
+MODEL_COLUMNS = [
+    'track_id', 'track_name', 'track_artist', 'lyrics', 'track_popularity', 'track_album_name',
+    'track_album_release_date', 'playlist_id', 'playlist_genre', 'playlist_subgenre'
+] + AUDIO_FEATURES + [PARSED_DATE_COLUMN]
+
+# Distinct tokens whose lemma is memoized; lyrics reuse a small vocabulary, but
+# preprocess_lyrics() also runs on request lyrics, so the memo must stay bounded
+LEMMA_CACHE_SIZE = 100000
+
+# Stateless, so one instance serves every DataProcessor and the memo is keyed on the token alone
+_lemmatizer = WordNetLemmatizer()
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemma(token):
+    return _lemmatizer.lemmatize(token)
+
 
 class DataProcessor:
-    def __init__(self, data_path):
+    def __init__(self, data_path, lyrics_cache=None, n_jobs=None):
         self.data_path = data_path
         self.df = None
         self.scaler = MinMaxScaler()
+        self.ranges = {}  # column -> (min, max) used for manual normalization
+        self.lyrics_cache = lyrics_cache  # SQLite file caching processed lyrics by content hash
+        self.n_jobs = n_jobs
         
         # Download required NLTK data
         try:
@@ -29,20 +60,18 @@ class DataProcessor:
             nltk.download('wordnet')
             
         self.stop_words = set(stopwords.words('english'))
-        self.lemmatizer = WordNetLemmatizer()
         
     def load_data(self):
-        """Load the dataset"""
-        self.df = pd.read_csv(self.data_path)
+        """Load the model's columns, from the dataset's columnar copy if there is one"""
+        self.df = read_table(self.data_path, MODEL_COLUMNS)
         return self.df
     
     def preprocess_audio_features(self):
         """Preprocess audio features"""
-        audio_features = [
-            'danceability', 'energy', 'loudness', 
-            'speechiness', 'acousticness', 'instrumentalness',
-            'liveness', 'valence', 'tempo'
-        ]
+        audio_features = AUDIO_FEATURES
+        
+        self.ranges['loudness'] = (float(self.df['loudness'].min()), float(self.df['loudness'].max()))
+        self.ranges['tempo'] = (float(self.df['tempo'].min()), float(self.df['tempo'].max()))
         
         # Normalize loudness (it's in dB, usually negative)
         self.df['loudness'] = (self.df['loudness'] - self.df['loudness'].min()) / (self.df['loudness'].max() - self.df['loudness'].min())
@@ -68,17 +97,29 @@ class DataProcessor:
         tokens = word_tokenize(text)
         
         # Remove stopwords and lemmatize
-        tokens = [self.lemmatizer.lemmatize(token) for token in tokens if token not in self.stop_words]
+        tokens = [self.lemmatize(token) for token in tokens if token not in self.stop_words]
         
         return ' '.join(tokens)
     
+    def lemmatize(self, token):
+        """WordNet lemma of a token, memoized in a bounded LRU cache (LEMMA_CACHE_SIZE tokens)"""
+        return _lemma(token)
+    
     def preprocess_release_date(self):
         """Convert release date to numerical features"""
-        # Convert to datetime with ISO8601 format
-        self.df['release_date'] = pd.to_datetime(self.df['track_album_release_date'], format='ISO8601')
+        # Convert to datetime with ISO8601 format; a columnar copy comes with the dates parsed,
+        # so only rows added to it (e.g. ingested tracks) are left
+        if PARSED_DATE_COLUMN in self.df.columns:
+            unparsed = self.df[PARSED_DATE_COLUMN].isna()
+            if unparsed.any():
+                self.df.loc[unparsed, PARSED_DATE_COLUMN] = pd.to_datetime(
+                    self.df.loc[unparsed, 'track_album_release_date'], format='ISO8601')
+        else:
+            self.df[PARSED_DATE_COLUMN] = pd.to_datetime(self.df['track_album_release_date'], format='ISO8601')
         
         self.df['release_year'] = self.df['release_date'].dt.year
         self.df['release_month'] = self.df['release_date'].dt.month
+        self.ranges['release_year'] = (int(self.df['release_year'].min()), int(self.df['release_year'].max()))
         
         # Normalize year and month
         self.df['release_year'] = (self.df['release_year'] - self.df['release_year'].min()) / (self.df['release_year'].max() - self.df['release_year'].min())
@@ -98,12 +139,53 @@ class DataProcessor:
         
         # Process lyrics if available
         if 'lyrics' in self.df.columns:
-            self.df['processed_lyrics'] = self.df['lyrics'].apply(self.preprocess_lyrics)
+            preprocessor = LyricsPreprocessor(self, cache_path=self.lyrics_cache, n_jobs=self.n_jobs)
+            self.df['processed_lyrics'] = preprocessor.process(self.df['lyrics'])
         
         # Combine all features
         features = pd.concat([audio_features, release_features], axis=1)
         
         return features, self.df
+    
+    def transform_features(self, df):
+        """Featurize new rows with the already fitted normalization, without refitting it
+        
+        Returns the same feature columns as prepare_features() and a processed
+        copy of df; values outside the fitted ranges are not clipped.
+        """
+        df = df.copy()
+        
+        for column in ('loudness', 'tempo'):
+            low, high = self.ranges[column]
+            df[column] = (df[column] - low) / (high - low)
+        df[AUDIO_FEATURES] = self.scaler.transform(df[AUDIO_FEATURES])
+        
+        df['release_date'] = pd.to_datetime(df['track_album_release_date'], format='ISO8601')
+        year_min, year_max = self.ranges['release_year']
+        df['release_year'] = (df['release_date'].dt.year - year_min) / (year_max - year_min)
+        df['release_month'] = (df['release_date'].dt.month - 1) / 11
+        
+        if 'lyrics' in df.columns:
+            preprocessor = LyricsPreprocessor(self, cache_path=self.lyrics_cache, n_jobs=1)
+            df['processed_lyrics'] = preprocessor.process(df['lyrics'])
+        
+        return df[AUDIO_FEATURES + ['release_year', 'release_month']], df
+    
+    def export_params(self):
+        """Return the fitted normalization parameters as plain values"""
+        return {
+            'audio_features': list(AUDIO_FEATURES),
+            'ranges': {name: list(bounds) for name, bounds in self.ranges.items()},
+            'scaler_min': self.scaler.data_min_.tolist(),
+            'scaler_max': self.scaler.data_max_.tolist()
+        }
+    
+    def load_params(self, params):
+        """Restore normalization parameters saved with export_params"""
+        self.ranges = {name: tuple(bounds) for name, bounds in params['ranges'].items()}
+        # Fitting on the two boundary rows reproduces the original scaler exactly
+        bounds = pd.DataFrame([params['scaler_min'], params['scaler_max']], columns=params['audio_features'])
+        self.scaler.fit(bounds)
 
 def main():
     # Test the data processor
@@ -0,0 +1,205 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+logger = logging.getLogger(__name__)
+
+# Ground truth: two tracks are relevant to each other when they share a value of this column
+GROUND_TRUTH = {
+    'playlist': 'playlist_id',
+    'artist': 'track_artist'
+}
+
+# Recommender shared with forked evaluation workers
+_worker_recommender = None
+
+
+def track_labels(recommender, ground_truth: str = 'playlist') -> Tuple[np.ndarray, sp.csr_matrix]:
+    """Sorted unique track ids and their track x label incidence matrix
+
+    A track appearing in several playlists gets one label per playlist.
+    Playlist labels need the metadata frame; artists also come from the
+    catalog of a model loaded only for serving.
+    """
+    if ground_truth not in GROUND_TRUTH:
+        raise ValueError(f"Unknown ground truth {ground_truth!r}, expected one of {sorted(GROUND_TRUTH)}")
+    column = GROUND_TRUTH[ground_truth]
+    if recommender.df is not None and column in recommender.df.columns:
+        track_ids = recommender.catalog.ids()
+        labels = recommender.df[column].to_numpy()
+    elif ground_truth == 'artist':
+        track_ids = recommender.catalog.ids()
+        labels = recommender.catalog.track_artists.to_numpy()
+    else:
+        raise ValueError(f"{ground_truth} ground truth needs the '{column}' column; "
+                         "load the artifact with its metadata")
+
+    unique_ids, track_index = np.unique(track_ids, return_inverse=True)
+    codes, names = pd.factorize(pd.Series(labels), use_na_sentinel=True)
+    labelled = codes >= 0
+    incidence = sp.csr_matrix(
+        (np.ones(labelled.sum(), dtype=np.int32), (track_index[labelled], codes[labelled])),
+        shape=(len(unique_ids), len(names))
+    )
+    # Rows repeating a (track, label) pair were summed; only membership matters
+    incidence.data[:] = 1
+    return unique_ids, incidence
+
+
+def ranking_metrics(relevant: np.ndarray, n_relevant: np.ndarray, ks: Sequence[int]) -> Dict[str, float]:
+    """Mean precision, recall, NDCG, MAP and hit rate at each k
+
+    relevant is a (n_queries, max_k) boolean matrix of the ranked
+    recommendations, n_relevant the number of relevant tracks per query.
+    """
+    relevant = relevant.astype(np.float64)
+    n_relevant = np.asarray(n_relevant, dtype=np.float64)
+    discounts = 1.0 / np.log2(np.arange(relevant.shape[1]) + 2)
+    hits = np.cumsum(relevant, axis=1)
+    # Precision at every rank, counted only at the ranks holding a relevant track
+    precision_at_hits = hits / np.arange(1, relevant.shape[1] + 1) * relevant
+    ideal_gains = np.cumsum(discounts)
+
+    metrics = {}
+    for k in ks:
+        k_hits = hits[:, k - 1]
+        n_ideal = np.minimum(n_relevant, k).astype(np.int64)
+        dcg = relevant[:, :k] @ discounts[:k]
+        idcg = ideal_gains[n_ideal - 1]
+        metrics[f'precision@{k}'] = float(np.mean(k_hits / k))
+        metrics[f'recall@{k}'] = float(np.mean(k_hits / n_relevant))
+        metrics[f'ndcg@{k}'] = float(np.mean(dcg / idcg))
+        metrics[f'map@{k}'] = float(np.mean(precision_at_hits[:, :k].sum(axis=1) / n_ideal))
+        metrics[f'hit_rate@{k}'] = float(np.mean(k_hits > 0))
+    return metrics
+
+
+def _recommend(track_ids: List[str], k: int, recommender=None) -> List[List[str]]:
+    """Top-k track ids for each seed track, every seed scored as its own request"""
+    recommender = recommender if recommender is not None else _worker_recommender
+    groups = [{'seeds': [{'track_id': track_id}], 'n_recommendations': k} for track_id in track_ids]
+    return [
+        [rec['track_id'] for rec in recs[0]]
+        for recs in recommender.find_similar_songs_grouped(groups)
+    ]
+
+
+def _recommend_all(recommender, track_ids: np.ndarray, k: int, batch_size: int, n_jobs: int) -> List[List[str]]:
+    global _worker_recommender
+
+    batches = [track_ids[i:i + batch_size].tolist() for i in range(0, len(track_ids), batch_size)]
+    if n_jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        logger.warning("Parallel evaluation needs the fork start method, running in one process")
+        n_jobs = 1
+    if n_jobs <= 1 or len(batches) == 1:
+        return [recs for batch in batches for recs in _recommend(batch, k, recommender)]
+
+    # Forked workers share the loaded model copy-on-write instead of pickling it
+    _worker_recommender = recommender
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = pool.map(_recommend, batches, [k] * len(batches), chunksize=max(1, len(batches) // (n_jobs * 4)))
+            return [recs for batch in results for recs in batch]
+    finally:
+        _worker_recommender = None
+
+
+def evaluate(recommender, ground_truth: str = 'playlist', ks: Sequence[int] = (5, 10, 20),
+             n_queries: int = None, batch_size: int = 32, n_jobs: int = None,
+             random_state: int = 42) -> Dict[str, Any]:
+    """Offline ranking metrics of the recommender against playlist or artist ground truth
+
+    Every catalog track sharing a label with at least one other track is a
+    candidate query (n_queries samples that many, None uses all of them).
+    A query is its track id, scored the way /recommend scores it, which
+    holds the seed itself out of its recommendations; the other tracks
+    sharing a label are the relevant ones. A track recommended twice only
+    counts once. Queries run in batches of batch_size through
+    find_similar_songs_grouped, spread over n_jobs processes (default: CPU
+    count). coverage@k is the share of catalog tracks recommended at least
+    once within the top k.
+    """
+    ks = sorted(set(ks))
+    max_k = ks[-1]
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    track_ids, incidence = track_labels(recommender, ground_truth)
+    label_sizes = np.asarray(incidence.sum(axis=0)).ravel()
+    has_relevant = (incidence @ (label_sizes >= 2).astype(np.int32)) > 0
+    candidates = np.flatnonzero(has_relevant)
+    if n_queries is not None and n_queries < len(candidates):
+        rng = np.random.default_rng(random_state)
+        candidates = np.sort(rng.choice(candidates, size=n_queries, replace=False))
+    if not len(candidates):
+        raise ValueError(f"No track shares a {ground_truth} with another track")
+
+    start = time.perf_counter()
+    recommendations = _recommend_all(recommender, track_ids[candidates], max_k, batch_size, n_jobs)
+    elapsed = time.perf_counter() - start
+
+    # Ranked recommendations as track indices, -1 where fewer than max_k came back
+    ranked = np.full((len(candidates), max_k), -1, dtype=np.int64)
+    lengths = np.array([len(recs) for recs in recommendations])
+    flat_ids = np.array([track_id for recs in recommendations for track_id in recs], dtype=track_ids.dtype)
+    ranked[np.arange(max_k)[None, :] < lengths[:, None]] = np.searchsorted(track_ids, flat_ids)
+    valid = ranked >= 0
+    repeated = ((ranked[:, :, None] == ranked[:, None, :]) & np.tri(max_k, k=-1, dtype=bool)).any(axis=2)
+
+    # A recommendation is relevant when it shares a label with its query
+    query_rows = incidence[np.repeat(candidates, max_k)]
+    shared = query_rows.multiply(incidence[np.where(valid, ranked, 0).ravel()]).getnnz(axis=1)
+    relevant = (shared.reshape(ranked.shape) > 0) & valid & ~repeated
+    # Tracks sharing a label with the query, the query itself excluded
+    n_relevant = (incidence[candidates] @ incidence.T).getnnz(axis=1) - 1
+
+    results = ranking_metrics(relevant, n_relevant, ks)
+    for k in ks:
+        recommended = np.unique(ranked[:, :k][valid[:, :k]])
+        results[f'coverage@{k}'] = len(recommended) / len(track_ids)
+    results.update({
+        'ground_truth': ground_truth,
+        'queries': int(len(candidates)),
+        'queries_per_second': len(candidates) / elapsed,
+        'n_jobs': n_jobs
+    })
+    logger.info(f"Evaluated {len(candidates)} queries against {ground_truth} ground truth "
+                f"in {elapsed:.1f}s ({results['queries_per_second']:.1f} queries/s)")
+    return results
+
+
+def main():
+    from data_processor import DataProcessor
+    from feature_store import load_latest
+    from model import MusicRecommender
+
+    parser = argparse.ArgumentParser(description='Offline evaluation of the recommender')
+    parser.add_argument('--artifacts', default='artifacts', help='Artifact root directory; built from --data if empty')
+    parser.add_argument('--data', default='src/data/spotify_songs.csv', help='Path to the songs CSV')
+    parser.add_argument('--ground-truth', default='playlist', choices=sorted(GROUND_TRUTH))
+    parser.add_argument('-k', type=int, nargs='+', default=[5, 10, 20], help='Cutoffs to report')
+    parser.add_argument('--queries', type=int, default=None, help='Number of query tracks (default: all)')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    recommender = load_latest(args.artifacts, DataProcessor(args.data))
+    if recommender is None:
+        recommender = MusicRecommender(DataProcessor(args.data))
+        recommender.prepare_data()
+    results = evaluate(recommender, args.ground_truth, args.k, n_queries=args.queries,
+                       batch_size=args.batch_size, n_jobs=args.jobs)
+    for metric, value in results.items():
+        print(f"{metric}: {value:.4f}" if isinstance(value, float) else f"{metric}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class Saturated(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class BoundedExecutor:
+    """Thread pool for CPU-bound scoring with a bounded wait queue
+
+    Keeps NumPy/pandas work off the asyncio event loop. At most max_workers
+    calls run at once and at most max_queue more may wait; beyond that, run()
+    fails fast with Saturated instead of letting latency grow without bound.
+    Threads share the loaded model, and the heavy NumPy kernels release the GIL.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scoring')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Saturated(f"{self.max_workers} workers busy and {self.max_queue} requests queued")
+        with self._lock:
+            self.pending += 1
+        future = self._pool.submit(fn, *args)
+        # Free the slot when the work is done, even if the awaiting request was cancelled
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'pending': self.pending,
+                'rejected': self.rejected
+            }
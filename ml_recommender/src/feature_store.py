@@ -0,0 +1,284 @@
+import copy
+import json
+import os
+import shutil
+import tempfile
+import logging
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from model import MusicRecommender
+from data_processor import DataProcessor
+from catalog import CatalogIndex
+from ann_index import IVFIndex
+from quantization import FEATURE_DTYPES
+from clustering import CLUSTER_METHODS, CLUSTER_DTYPES
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the on-disk layout changes so stale artifacts are rejected
+FORMAT_VERSION = 4
+LATEST_POINTER = 'LATEST'
+
+# Raw text is only needed to fit the vectorizer, never to serve requests
+DROPPED_COLUMNS = ['lyrics', 'processed_lyrics']
+
+
+def recommender_options_from_env() -> Dict[str, Any]:
+    """MusicRecommender options set through RECOMMENDER_* environment variables
+
+    Shared by the API and by run.py, so an artifact built before starting
+    the workers has the storage dtype, clustering and lyrics reduction the
+    workers ask for and can be memory-mapped as is.
+    """
+    return {
+        'index_type': os.environ.get('RECOMMENDER_INDEX', 'exact'),
+        'n_probe': int(os.environ.get('RECOMMENDER_N_PROBE', '4')),
+        'popular_fraction': float(os.environ.get('RECOMMENDER_POPULAR_FRACTION', '0.05')),
+        'popular_probe': int(os.environ.get('RECOMMENDER_POPULAR_PROBE', '128')),
+        'max_popular': int(os.environ.get('RECOMMENDER_MAX_POPULAR', '1000')),
+        'n_lists': int(os.environ['RECOMMENDER_N_LISTS']) if os.environ.get('RECOMMENDER_N_LISTS') else None,
+        'feature_dtype': os.environ.get('RECOMMENDER_FEATURE_DTYPE') or None,
+        'cluster_method': os.environ.get('RECOMMENDER_CLUSTERING', 'kmeans'),
+        'cluster_dtype': os.environ.get('RECOMMENDER_CLUSTER_DTYPE', 'float64'),
+        'lyrics_dims': int(os.environ['RECOMMENDER_LYRICS_DIMS']) if os.environ.get('RECOMMENDER_LYRICS_DIMS') else None
+    }
+
+
+def save_artifact(recommender: MusicRecommender, root: str) -> Path:
+    """Write a prepared recommender to root/<version> and mark it as latest"""
+    if recommender.features is None:
+        raise ValueError("Recommender is not prepared. Call prepare_data() first")
+
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    target = root / recommender.version
+    if target.exists():
+        raise FileExistsError(f"Artifact version {recommender.version} already exists in {root}")
+
+    # Rows added while serving (add_tracks) are saved with the others
+    recommender = copy.copy(recommender)
+    recommender.merge_delta()
+
+    # Write into a scratch directory first so readers never see a partial artifact
+    staging = Path(tempfile.mkdtemp(prefix=f'.{recommender.version}-', dir=root))
+    try:
+        np.save(staging / 'features.npy', np.ascontiguousarray(recommender.features))
+        np.save(staging / 'clusters.npy', np.asarray(recommender.clusters))
+        np.save(staging / 'centroids.npy', np.asarray(recommender.centroids))
+        if isinstance(recommender.index, IVFIndex):
+            # IVF partitions are kept so loading does not train them again
+            np.save(staging / 'ivf_centroids.npy', recommender.index.centroids)
+            np.save(staging / 'ivf_labels.npy', recommender.index.row_labels())
+        if recommender.feature_scale is not None:
+            np.save(staging / 'feature_scale.npy', recommender.feature_scale)
+        if recommender.lyrics_scale is not None:
+            np.save(staging / 'lyrics_scale.npy', recommender.lyrics_scale)
+
+        if recommender.lyrics_features is not None:
+            # Store the CSR components separately so each one can be memory-mapped
+            lyrics = recommender.lyrics_features
+            np.save(staging / 'lyrics_data.npy', lyrics.data)
+            np.save(staging / 'lyrics_indices.npy', lyrics.indices)
+            np.save(staging / 'lyrics_indptr.npy', lyrics.indptr)
+
+        if recommender.has_lyrics:
+            vocabulary = recommender.tfidf_vectorizer.vocabulary_
+            terms = sorted(vocabulary, key=vocabulary.get)
+            with open(staging / 'tfidf_vocabulary.json', 'w', encoding='utf-8') as f:
+                json.dump(terms, f)
+            np.save(staging / 'tfidf_idf.npy', recommender.tfidf_vectorizer.idf_)
+            if recommender.lyrics_components is not None:
+                np.save(staging / 'lyrics_components.npy', recommender.lyrics_components)
+
+        # The catalog index is what serving needs; the full metadata frame is optional
+        for name, array in recommender.catalog.arrays.items():
+            np.save(staging / f'catalog_{name}.npy', np.asarray(array))
+        if recommender.df is not None:
+            metadata = recommender.df.drop(columns=DROPPED_COLUMNS, errors='ignore')
+            metadata.to_pickle(staging / 'metadata.pkl')
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'version': recommender.version,
+            'n_tracks': int(recommender.features.shape[0]),
+            'n_features': int(recommender.features.shape[1]),
+            'feature_dtype': np.dtype(recommender.features.dtype).name,
+            'n_lyrics_features': int(recommender.lyrics_features.shape[1]) if recommender.lyrics_features is not None else 0,
+            'has_lyrics': recommender.has_lyrics,
+            'lyrics_dims': int(len(recommender.lyrics_components)) if recommender.lyrics_components is not None else None,
+            'has_metadata': recommender.df is not None,
+            'catalog_arrays': sorted(recommender.catalog.arrays),
+            'ivf_lists': len(recommender.index.centroids) if isinstance(recommender.index, IVFIndex) else None,
+            'year_range': list(recommender.year_range) if recommender.year_range else None,
+            'ingest_offset': recommender.ingest_offset,
+            'processor': recommender.data_processor.export_params()
+        }
+        with open(staging / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    set_latest(root, recommender.version)
+
+    logger.info(f"Saved artifact {recommender.version} to {target}")
+    return target
+
+
+def set_latest(root: str, version: str) -> None:
+    """Point LATEST at an existing artifact version"""
+    root = Path(root)
+    if resolve_artifact(root, version) is None:
+        raise FileNotFoundError(f"No artifact {version} in {root}")
+    pointer = root / f'.{LATEST_POINTER}.{os.getpid()}.tmp'
+    pointer.write_text(version)
+    os.replace(pointer, root / LATEST_POINTER)
+
+
+def resolve_artifact(root: str, version: Optional[str] = None) -> Optional[Path]:
+    """Return the directory of the requested (or latest) artifact version, if any"""
+    root = Path(root)
+    if version is None:
+        pointer = root / LATEST_POINTER
+        if not pointer.exists():
+            return None
+        version = pointer.read_text().strip()
+    path = root / version
+    return path if (path / 'manifest.json').exists() else None
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """The manifest of a saved artifact; ValueError if it was written in another format version"""
+    path = Path(path)
+    with open(path / 'manifest.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != FORMAT_VERSION:
+        raise ValueError(
+            f"Artifact {path} has format version {manifest['format_version']}, expected {FORMAT_VERSION}"
+        )
+    return manifest
+
+
+def load_artifact(path: str, data_processor: DataProcessor, mmap: bool = True, metadata: bool = True,
+                  **recommender_options) -> MusicRecommender:
+    """Load a saved artifact into a ready-to-serve recommender
+
+    With mmap enabled the feature matrices and the catalog index are mapped
+    read-only, so every worker process loading the same artifact shares the
+    same physical pages. Serving does not need the metadata DataFrame
+    (recommender.df); pass metadata=False to skip loading it.
+    Extra keyword arguments are passed to MusicRecommender (e.g. index_type).
+    """
+    path = Path(path)
+    manifest = read_manifest(path)
+
+    mmap_mode = 'r' if mmap else None
+    recommender = MusicRecommender(data_processor, **recommender_options)
+    recommender.features = np.load(path / 'features.npy', mmap_mode=mmap_mode)
+    if manifest['n_lyrics_features']:
+        recommender.lyrics_features = sp.csr_matrix(
+            (
+                np.load(path / 'lyrics_data.npy', mmap_mode=mmap_mode),
+                np.load(path / 'lyrics_indices.npy', mmap_mode=mmap_mode),
+                np.load(path / 'lyrics_indptr.npy', mmap_mode=mmap_mode)
+            ),
+            shape=(manifest['n_tracks'], manifest['n_lyrics_features']),
+            copy=False
+        )
+    if (path / 'feature_scale.npy').exists():
+        recommender.feature_scale = np.load(path / 'feature_scale.npy')
+    if (path / 'lyrics_scale.npy').exists():
+        recommender.lyrics_scale = np.load(path / 'lyrics_scale.npy')
+    requested_dtype = recommender.feature_dtype
+    recommender.feature_dtype = manifest.get('feature_dtype', 'float64')
+    if requested_dtype is not None and requested_dtype != recommender.feature_dtype:
+        # Converting loses the memory mapping; build the artifact with --dtype instead
+        logger.warning(f"Converting artifact {path.name} from {recommender.feature_dtype} to {requested_dtype}; "
+                       f"the feature blocks are copied into process memory instead of memory-mapped")
+        recommender.set_feature_dtype(requested_dtype)
+    recommender.clusters = np.load(path / 'clusters.npy', mmap_mode=mmap_mode)
+    recommender.centroids = np.load(path / 'centroids.npy')
+    if metadata and manifest['has_metadata']:
+        recommender.df = pd.read_pickle(path / 'metadata.pkl')
+    recommender.has_lyrics = manifest['has_lyrics']
+    recommender.year_range = tuple(manifest['year_range']) if manifest['year_range'] else None
+    recommender.version = manifest['version']
+    recommender.ingest_offset = manifest.get('ingest_offset')
+
+    if recommender.has_lyrics:
+        with open(path / 'tfidf_vocabulary.json', encoding='utf-8') as f:
+            terms = json.load(f)
+        recommender.tfidf_vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        recommender.tfidf_vectorizer.idf_ = np.load(path / 'tfidf_idf.npy')
+        recommender.tfidf_vectorizer.dtype = recommender.tfidf_vectorizer.idf_.dtype.type
+    # The artifact decides whether lyrics are reduced, whatever the options asked for
+    recommender.lyrics_dims = manifest.get('lyrics_dims')
+    if recommender.lyrics_dims:
+        recommender.lyrics_components = np.load(path / 'lyrics_components.npy')
+
+    data_processor.load_params(manifest['processor'])
+    recommender.catalog = CatalogIndex.from_arrays({
+        name: np.load(path / f'catalog_{name}.npy', mmap_mode=mmap_mode)
+        for name in manifest['catalog_arrays']
+    })
+    partitions = None
+    n_lists = manifest.get('ivf_lists')
+    if recommender.index_type == 'ivf' and n_lists and recommender.n_lists in (None, n_lists):
+        partitions = (np.load(path / 'ivf_centroids.npy'), np.load(path / 'ivf_labels.npy', mmap_mode=mmap_mode))
+    recommender.build_index(partitions)
+
+    logger.info(f"Loaded artifact {recommender.version} ({manifest['n_tracks']} tracks) from {path}")
+    return recommender
+
+
+def load_latest(root: str, data_processor: DataProcessor, mmap: bool = True, metadata: bool = True,
+                **recommender_options) -> Optional[MusicRecommender]:
+    """Load the latest artifact under root, or return None if there is none"""
+    path = resolve_artifact(root)
+    if path is None:
+        return None
+    return load_artifact(path, data_processor, mmap=mmap, metadata=metadata, **recommender_options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a recommender artifact from the songs CSV')
+    parser.add_argument('--data', default='src/data/spotify_songs.csv', help='Path to the songs CSV')
+    parser.add_argument('--out', default='artifacts', help='Artifact root directory')
+    parser.add_argument('--lyrics-cache', default='artifacts/lyrics_cache.sqlite',
+                        help='SQLite file caching processed lyrics between builds')
+    parser.add_argument('--jobs', type=int, default=None, help='Lyrics preprocessing processes (default: all cores)')
+    parser.add_argument('--dtype', choices=FEATURE_DTYPES, default='float64',
+                        help='Storage dtype of the feature matrices (int8 uses per-dimension scales)')
+    parser.add_argument('--clustering', choices=CLUSTER_METHODS, default='kmeans',
+                        help='Diversity clustering; minibatch scales to multi-million-track catalogs')
+    parser.add_argument('--cluster-dtype', choices=CLUSTER_DTYPES, default='float64')
+    parser.add_argument('--lyrics-dims', type=int, default=None,
+                        help='Reduce the TF-IDF lyrics to this many SVD components (e.g. 64-256)')
+    parser.add_argument('--warm-start', action='store_true',
+                        help="Start clustering from the latest artifact's centroids")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Path(args.lyrics_cache).parent.mkdir(parents=True, exist_ok=True)
+
+    processor = DataProcessor(args.data, lyrics_cache=args.lyrics_cache, n_jobs=args.jobs)
+    recommender = MusicRecommender(processor, feature_dtype=args.dtype, cluster_method=args.clustering,
+                                   cluster_dtype=args.cluster_dtype, lyrics_dims=args.lyrics_dims)
+    previous = load_latest(args.out, DataProcessor(args.data), metadata=False) if args.warm_start else None
+
+    print("Preparing data...")
+    recommender.prepare_data(previous=previous)
+
+    path = save_artifact(recommender, args.out)
+    print(f"Artifact {recommender.version} written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Iterable, List, Optional
+
+
+class HistoryStore:
+    """Per-user record of already recommended track ids
+
+    Track ids rather than row ids are stored so a persisted history stays
+    valid across catalog rebuilds; the recommender maps them to rows through
+    its catalog index, which is O(history) per request.
+    """
+
+    def get(self, user_id: str) -> List[str]:
+        raise NotImplementedError
+
+    def add(self, user_id: str, track_ids: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def clear(self, user_id: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryHistoryStore(HistoryStore):
+    """Bounded in-process store: LRU over users, TTL per user, capped ring buffer per user"""
+
+    def __init__(self, max_users: int = 100_000, max_items: int = 500, ttl: Optional[float] = None):
+        self.max_users = max_users
+        self.max_items = max_items
+        self.ttl = ttl
+        self._users = OrderedDict()  # user_id -> (last_seen, deque of track ids)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return []
+            last_seen, items = entry
+            if self.ttl is not None and time.monotonic() - last_seen > self.ttl:
+                del self._users[user_id]
+                return []
+            self._users.move_to_end(user_id)
+            return list(items)
+
+    def add(self, user_id, track_ids):
+        with self._lock:
+            entry = self._users.pop(user_id, None)
+            items = entry[1] if entry is not None else deque(maxlen=self.max_items)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                items.clear()
+            items.extend(track_ids)
+            self._users[user_id] = (time.monotonic(), items)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def clear(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._users)
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """Durable store shared by every worker process pointing at the same database file"""
+
+    def __init__(self, path: str, max_items: int = 500, ttl: Optional[float] = None):
+        self.path = path
+        self.max_items = max_items
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS history ('
+                ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' user_id TEXT NOT NULL,'
+                ' track_id TEXT NOT NULL,'
+                ' created REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS history_user ON history (user_id, seq)')
+
+    def get(self, user_id):
+        query = 'SELECT track_id FROM history WHERE user_id = ?'
+        params = [user_id]
+        if self.ttl is not None:
+            query += ' AND created >= ?'
+            params.append(time.time() - self.ttl)
+        query += ' ORDER BY seq DESC LIMIT ?'
+        params.append(self.max_items)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [track_id for (track_id,) in reversed(rows)]
+
+    def add(self, user_id, track_ids):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO history (user_id, track_id, created) VALUES (?, ?, ?)',
+                [(user_id, track_id, now) for track_id in track_ids]
+            )
+            # Trim to the ring buffer size so the table stays bounded per user
+            self._conn.execute(
+                'DELETE FROM history WHERE user_id = ? AND seq <= ('
+                ' SELECT seq FROM history WHERE user_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)',
+                (user_id, user_id, self.max_items)
+            )
+
+    def clear(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM history WHERE user_id = ?', (user_id,))
+
+    def purge_expired(self):
+        """Delete entries older than the TTL for all users"""
+        if self.ttl is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM history WHERE created < ?', (time.time() - self.ttl,))
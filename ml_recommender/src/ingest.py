@@ -0,0 +1,223 @@
+import io
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover the threads of one process
+    fcntl = None
+
+import pandas as pd
+
+from model import MusicRecommender
+from data_processor import DataProcessor, AUDIO_FEATURES
+from data.columnar import COLUMN_DTYPES
+
+logger = logging.getLogger(__name__)
+
+# Columns kept for ingested tracks, in the order of the source CSV
+TRACK_COLUMNS = [
+    'track_id', 'track_name', 'track_artist', 'lyrics', 'track_popularity',
+    'track_album_name', 'track_album_release_date', 'playlist_genre', 'playlist_subgenre'
+] + AUDIO_FEATURES
+
+
+@contextmanager
+def file_lock(f, exclusive: bool = True):
+    """Advisory lock on an open file shared by every process using it (no-op without fcntl)"""
+    if fcntl is None:
+        yield f
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield f
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class IngestLog:
+    """Append-only CSV of tracks ingested since the base dataset was built
+
+    A full refit reads the base dataset plus this log, so ingested tracks
+    survive restarts and end up in the next model. Writes take a file lock,
+    so several worker processes can share one log, and read_since() lets
+    each of them pick up the tracks the others appended.
+
+    Once a refit covering the log up to some offset is published, compact()
+    moves those rows to an archive file next to the log. Refits still read
+    the archive; startup and polling only read the rows after the offset of
+    the artifact they serve. Offsets count the archived bytes too, so
+    offsets handed out before a compaction stay valid after it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        stem, extension = os.path.splitext(path)
+        self.archive_path = f'{stem}.archive{extension}'
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, exclusive: bool = True):
+        # compact() replaces the log file, so the lock is taken on a file of its own
+        with self._lock:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f'{self.path}.lock', 'a') as f, file_lock(f, exclusive=exclusive):
+                yield
+
+    @staticmethod
+    def _header() -> bytes:
+        return pd.DataFrame(columns=TRACK_COLUMNS).to_csv(index=False).encode('utf-8')
+
+    def _archived(self) -> int:
+        """Bytes of rows moved to the archive, i.e. the offset of the log's first row minus its header"""
+        if not os.path.exists(self.archive_path):
+            return 0
+        return os.path.getsize(self.archive_path) - len(self._header())
+
+    def append(self, tracks: pd.DataFrame) -> Tuple[int, int]:
+        """Append tracks; returns the offsets of the log before and after them"""
+        with self._locked():
+            archived = self._archived()
+            with open(self.path, 'ab') as f:
+                start = f.seek(0, os.SEEK_END)
+                if start == 0:
+                    start = f.write(self._header())
+                text = tracks.reindex(columns=TRACK_COLUMNS).to_csv(header=False, index=False)
+                f.write(text.encode('utf-8'))
+                return archived + start, archived + f.tell()
+
+    def read(self) -> pd.DataFrame:
+        """Every logged track, archived ones included (empty if nothing was logged)"""
+        return self.read_since(0)[0]
+
+    def read_since(self, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+        """Tracks logged after an offset returned earlier, and the offset of the end of the log"""
+        header = self._header()
+        body = b''
+        with self._locked(exclusive=False):
+            archived = self._archived()
+            if archived and offset < len(header) + archived:
+                with open(self.archive_path, 'rb') as f:
+                    f.seek(max(offset, len(header)))
+                    body += f.read()
+            end = len(header) + archived
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    f.seek(max(offset - archived, len(header)))
+                    body += f.read()
+                    end = archived + f.tell()
+        if not body:
+            return pd.DataFrame(columns=TRACK_COLUMNS), end
+        dtypes = {column: COLUMN_DTYPES[column] for column in TRACK_COLUMNS if column in COLUMN_DTYPES}
+        return pd.read_csv(io.BytesIO(header + body), dtype=dtypes), end
+
+    def compact(self, offset: int) -> int:
+        """Move the rows logged before an offset to the archive; returns the bytes moved"""
+        header = self._header()
+        with self._locked():
+            if not os.path.exists(self.path):
+                return 0
+            archived = self._archived()
+            with open(self.path, 'rb') as f:
+                f.seek(len(header))
+                covered = f.read(max(offset - archived - len(header), 0))
+                rest = f.read()
+            if not covered:
+                return 0
+            staging = f'{self.path}.tmp'
+            with open(staging, 'wb') as f:
+                f.write(header + rest)
+            with open(self.archive_path, 'ab') as f:
+                if f.seek(0, os.SEEK_END) == 0:
+                    f.write(header)
+                f.write(covered)
+            os.replace(staging, self.path)
+        logger.info(f"Archived {len(covered)} bytes of {self.path}, {len(rest)} bytes left")
+        return len(covered)
+
+
+def refit(data_path: str, ingest_log: Optional[IngestLog] = None, lyrics_cache: Optional[str] = None,
+          n_jobs: Optional[int] = None, previous: Optional[MusicRecommender] = None,
+          **recommender_options) -> MusicRecommender:
+    """Rebuild the model from the base dataset plus every logged track
+
+    Clustering warm-starts from the previous snapshot's centroids if given.
+    The model's ingest_offset is the end of the log it includes.
+    """
+    processor = DataProcessor(data_path, lyrics_cache=lyrics_cache, n_jobs=n_jobs)
+    processor.load_data()
+    ingest_offset = None
+    if ingest_log is not None:
+        logged, ingest_offset = ingest_log.read_since(0)
+        if len(logged):
+            processor.df = pd.concat([processor.df, logged], ignore_index=True)
+
+    recommender = MusicRecommender(processor, **recommender_options)
+    recommender.prepare_data(previous=previous)
+    recommender.ingest_offset = ingest_offset
+    return recommender
+
+
+class RefitScheduler:
+    """Daemon thread running a full refit every interval seconds
+
+    refit_fn does the (slow) rebuild and returns its result; on_refit is
+    called with that result to swap it in. Failures are logged and the
+    current model keeps serving until the next attempt.
+
+    With a lock_path, only the process holding an exclusive lock on that
+    file refits, so several workers started with the same settings run one
+    refit per interval between them (the others pick up the new artifact
+    with ModelRegistry.watch). The lock is kept until the process exits;
+    another worker takes over at its next attempt.
+    """
+
+    def __init__(self, interval: float, refit_fn: Callable, on_refit: Callable, lock_path: Optional[str] = None):
+        self.interval = interval
+        self.refit_fn = refit_fn
+        self.on_refit = on_refit
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='refit-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def is_leader(self) -> bool:
+        """Whether this process is the one refitting; tries to take the lock if nobody holds it"""
+        if self.lock_path is None or fcntl is None or self._lock_file is not None:
+            return True
+        if os.path.dirname(self.lock_path):
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        logger.info(f"Process {os.getpid()} runs the scheduled refits")
+        self._lock_file = lock_file
+        return True
+
+    def run_once(self) -> None:
+        logger.info("Starting scheduled full refit")
+        self.on_refit(self.refit_fn())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if self.is_leader():
+                    self.run_once()
+            except Exception:
+                logger.exception("Scheduled refit failed, keeping the current model")
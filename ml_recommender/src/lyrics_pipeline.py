@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Part of every cache key: bump when DataProcessor.preprocess_lyrics changes output
+PIPELINE_VERSION = '1'
+
+_worker_processor = None
+
+
+def _preprocess_chunk(texts: List[str]) -> List[str]:
+    """Process-pool entry point: preprocess a chunk with a per-process DataProcessor"""
+    global _worker_processor
+    if _worker_processor is None:
+        from data_processor import DataProcessor
+        _worker_processor = DataProcessor(None)
+    return [_worker_processor.preprocess_lyrics(text) for text in texts]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(f'{PIPELINE_VERSION}\0{text}'.encode('utf-8')).hexdigest()
+
+
+class LyricsPreprocessor:
+    """Parallel, disk-cached driver for DataProcessor.preprocess_lyrics
+
+    Processed lyrics are cached by a hash of the raw text, so rebuilding after
+    a catalog update only processes new or changed lyrics. Duplicate texts are
+    processed once, and cache misses are split into chunks across a process pool.
+    """
+
+    def __init__(self, data_processor, cache_path: Optional[str] = None,
+                 n_jobs: Optional[int] = None, chunk_size: int = 1000):
+        self.data_processor = data_processor
+        self.cache_path = cache_path
+        self.n_jobs = n_jobs if n_jobs is not None else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.cache_path, timeout=30)
+        conn.execute('CREATE TABLE IF NOT EXISTS lyrics (hash TEXT PRIMARY KEY, processed TEXT NOT NULL)')
+        return conn
+
+    def _read_cache(self, hashes: List[str]) -> dict:
+        if not self.cache_path or not hashes:
+            return {}
+        found = {}
+        with self._connect() as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 900):
+                batch = hashes[start:start + 900]
+                placeholders = ','.join('?' * len(batch))
+                found.update(conn.execute(
+                    f'SELECT hash, processed FROM lyrics WHERE hash IN ({placeholders})', batch
+                ).fetchall())
+        return found
+
+    def _write_cache(self, entries: dict):
+        if not self.cache_path or not entries:
+            return
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO lyrics (hash, processed) VALUES (?, ?)', entries.items())
+
+    def _process(self, texts: List[str]) -> List[str]:
+        if self.n_jobs <= 1 or len(texts) <= self.chunk_size:
+            return [self.data_processor.preprocess_lyrics(text) for text in texts]
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+            return [processed for chunk in pool.map(_preprocess_chunk, chunks) for processed in chunk]
+
+    def process(self, lyrics: Iterable) -> List[str]:
+        """Preprocess a sequence of raw lyrics (missing values become '')"""
+        lyrics = list(lyrics)
+        keys = [None if pd.isna(text) else content_hash(text) for text in lyrics]
+
+        unique = {}
+        for key, text in zip(keys, lyrics):
+            if key is not None and key not in unique:
+                unique[key] = text
+
+        results = self._read_cache(list(unique))
+        missing = [key for key in unique if key not in results]
+        self.cache_hits += len(unique) - len(missing)
+        self.cache_misses += len(missing)
+        logger.info(f"Lyrics preprocessing: {len(unique) - len(missing)} cached, {len(missing)} to process")
+
+        processed = dict(zip(missing, self._process([unique[key] for key in missing])))
+        self._write_cache(processed)
+        results.update(processed)
+
+        return ['' if key is None else results[key] for key in keys]
@@ -0,0 +1,165 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+# Histogram buckets (upper bounds) for durations in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Histogram buckets for candidate-set sizes in rows
+SIZE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a sum and count, like a Prometheus histogram"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-wide counters and histograms, rendered in the Prometheus text format
+
+    stage() times a block into the recommender_stage_seconds histogram and,
+    while collect() is active on the same thread, into that collection, which
+    gives the per-request breakdown. Callbacks report values owned by other
+    objects (e.g. cache hit counts) when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._help = {}
+        self._types = {}
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._callbacks = {}  # name -> fn
+
+    def _declare(self, name: str, kind: str, help: str) -> None:
+        self._types.setdefault(name, kind)
+        if help:
+            self._help.setdefault(name, help)
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, help: str = '', **labels) -> None:
+        with self._lock:
+            self._declare(name, 'counter', help)
+            key = (name, self._labels(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS,
+                help: str = '', **labels) -> None:
+        with self._lock:
+            self._declare(name, 'histogram', help)
+            key = (name, self._labels(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def callback(self, name: str, fn: Callable[[], float], kind: str = 'gauge', help: str = '') -> None:
+        """Report fn() as name whenever the metrics are rendered"""
+        with self._lock:
+            self._declare(name, kind, help)
+            self._callbacks[name] = fn
+
+    @contextmanager
+    def collect(self) -> Iterator[Dict[str, float]]:
+        """Collect the stage timings of this thread into the yielded dict (seconds per stage)"""
+        previous = getattr(self._local, 'timings', None)
+        timings = self._local.timings = {}
+        try:
+            yield timings
+        finally:
+            self._local.timings = previous
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def stopwatch(self) -> Callable[[str], None]:
+        """Return lap(stage), which records the time since the previous lap (or this call) as stage"""
+        last = [time.perf_counter()]
+
+        def lap(name: str) -> None:
+            now = time.perf_counter()
+            self.record_stage(name, now - last[0])
+            last[0] = now
+        return lap
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        self.observe('recommender_stage_seconds', seconds, help='Time spent in each recommendation stage',
+                     stage=name)
+        timings = getattr(self._local, 'timings', None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                for key, histogram in self._histograms.items()
+            }
+            callbacks = dict(self._callbacks)
+            types, helps = dict(self._types), dict(self._help)
+
+        samples = {}  # name -> lines
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (buckets, counts, total, count) in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + [float('inf')], counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, fn in callbacks.items():
+            samples.setdefault(name, []).append(f"{name} {_format_value(fn())}")
+
+        output = []
+        for name in sorted(samples):
+            if name in helps:
+                output.append(f"# HELP {name} {helps[name]}")
+            output.append(f"# TYPE {name} {types[name]}")
+            output.extend(samples[name])
+        return '\n'.join(output) + '\n'
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def timing_header(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    """Stage timings as an X-Debug-Timing value: 'stage;dur=ms' entries, like Server-Timing"""
+    entries = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.3f}")
+    return ', '.join(entries)
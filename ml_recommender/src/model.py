@@ -1,51 +1,355 @@
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from typing import List, Dict, Any, Tuple
+from sklearn.preprocessing import normalize
+from typing import List, Dict, Any, Tuple, Optional
 import logging
-from sklearn.metrics import ndcg_score
-import random
-from sklearn.cluster import KMeans
+import copy
+import uuid
+from datetime import datetime, timezone
+from ann_index import build_index
+from clustering import fit_clusters, align_centroids, assignment_stability, nearest_centroid
+from reduction import fit_lyrics_reduction
+from catalog import CatalogIndex, MISSING_YEAR
+from segments import append_rows, merge
+from topk import top_k
+from history import InMemoryHistoryStore
+from metrics import Metrics, SIZE_BUCKETS
+from data_processor import AUDIO_FEATURES
+from evaluation import evaluate
+from quantization import FEATURE_DTYPES, column_scale, quantize, dequantize, compute_dtype, stored_product
 
 logger = logging.getLogger(__name__)
 
+def new_version() -> str:
+    """A new model version: the UTC build time to the microsecond and a random suffix
+
+    Two builds started in the same second (e.g. a refit racing an offline
+    build) get different artifact directories, and versions still sort by
+    build time.
+    """
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+
 class MusicRecommender:
-    def __init__(self, data_processor):
+    def __init__(self, data_processor, lyrics_dtype=np.float64, index_type='exact', n_probe=4,
+                 popular_fraction=0.05, popular_probe=128, max_popular=1000, n_lists=None, history=None,
+                 feature_dtype=None, cluster_method='kmeans', cluster_dtype='float64',
+                 lyrics_dims=None, metrics=None):
         self.data_processor = data_processor
-        self.features = None
-        self.df = None
+        self.index_type = index_type
+        self.n_probe = n_probe
+        # IVF only, see ann_index.IVFIndex: popular rows are searched over popular_probe
+        # partitions and the max_popular most popular rows are always scored
+        self.popular_fraction = popular_fraction
+        self.popular_probe = popular_probe
+        self.max_popular = max_popular
+        self.n_lists = n_lists  # IVF partitions, about sqrt(catalog size) by default
+        self.cluster_method = cluster_method  # 'kmeans' or 'minibatch', see clustering.fit_clusters
+        self.cluster_dtype = cluster_dtype
+        self.index = None
+        self.catalog = None
+        self.features = None  # dense audio + release date block
+        self.lyrics_features = None  # sparse CSR TF-IDF block, rows share the joint L2 norm
+        # After add_tracks() the blocks, clusters and catalog are segments.Segmented: the
+        # artifact's rows plus the added ones, until merge_delta() or the next refit
+        # With lyrics_dims set, TF-IDF rows are projected onto lyrics_dims SVD components
+        # and appended to the dense block instead; lyrics_features then stays None
+        self.lyrics_dims = lyrics_dims
+        self.lyrics_components = None  # (lyrics_dims, vocabulary size) projection
+        # Storage dtype of both blocks ('float64', 'float32' or 'int8'); None keeps
+        # float64 when preparing and the artifact's dtype when loading
+        self.feature_dtype = feature_dtype
+        self.feature_scale = None  # per-column scales of the int8 blocks
+        self.lyrics_scale = None
+        self.df = None  # full metadata frame; None for models loaded only for serving
         self.clusters = None
-        self.history = {}  # user_id -> list of recommended songs
+        self.centroids = None
+        self.year_range = None  # (min, max) release year of the catalog
+        self.has_lyrics = False
+        self.version = None
+        self.ingest_offset = None  # end of the ingest log included by a refit (ingest.refit)
+        self.history = history if history is not None else InMemoryHistoryStore()
+        # Stage timings of find_similar_songs_grouped; the API shares one Metrics across snapshots
+        self.metrics = metrics if metrics is not None else Metrics()
         self.tfidf_vectorizer = TfidfVectorizer(
             max_features=5000,
             stop_words='english',
-            ngram_range=(1, 2)
+            ngram_range=(1, 2),
+            dtype=lyrics_dtype
         )
         
-    def prepare_data(self):
+    def prepare_data(self, previous: 'MusicRecommender' = None):
+        """Build features, clusters, catalog and index from the dataset
+
+        With a previous snapshot, clustering warm-starts from its centroids
+        and logs how stable the assignments of shared tracks stayed.
+        """
         self.features, self.df = self.data_processor.prepare_features()
+        self.has_lyrics = 'processed_lyrics' in self.df.columns
+        self.year_range = self.data_processor.ranges.get('release_year')
         
-        if 'processed_lyrics' in self.df.columns:
-            lyrics_matrix = self.tfidf_vectorizer.fit_transform(self.df['processed_lyrics'])
-            lyrics_features = lyrics_matrix.toarray()
-            
-            row_norms = np.linalg.norm(lyrics_features, axis=1, keepdims=True)
-            row_norms[row_norms == 0] = 1
-            lyrics_features = lyrics_features / row_norms
-            
-            self.features = np.hstack([self.features, lyrics_features])
-        
-        row_norms = np.linalg.norm(self.features, axis=1, keepdims=True)
-        row_norms[row_norms == 0] = 1
-        self.features = self.features / row_norms
-        self.features = np.nan_to_num(self.features, nan=0.0)
+        lyrics_features = None
+        if self.has_lyrics:
+            # Keep the TF-IDF block sparse: densifying 5000 columns costs gigabytes
+            lyrics_features = self.tfidf_vectorizer.fit_transform(self.df['processed_lyrics'])
+            # Processed lyrics are only needed to fit the vectorizer
+            self.df.drop(columns='processed_lyrics', inplace=True)
+        self.features, self.lyrics_features = self.normalize_rows(self.features, lyrics_features)
+        if self.lyrics_dims and self.lyrics_features is not None:
+            self.reduce_lyrics_block(fit_lyrics_reduction(self.lyrics_features, self.lyrics_dims))
         
         # Add clustering for diversity
-        kmeans = KMeans(n_clusters=50, random_state=42)
-        self.clusters = kmeans.fit_predict(self.features)
+        self.clusters, self.centroids = fit_clusters(
+            self.feature_matrix(), n_clusters=50, method=self.cluster_method,
+            dtype=self.cluster_dtype, init=self.warm_start_centroids(previous))
+        if self.feature_dtype is not None:
+            self.set_feature_dtype(self.feature_dtype)
+        self.build_catalog()
+        self.build_index()
+        if previous is not None and previous.catalog is not None:
+            logger.info(f"Cluster assignment stability vs previous snapshot: "
+                        f"ARI={assignment_stability(previous, self):.3f}")
         
+        self.version = new_version()
         return self.features
+    
+    def release_metadata(self):
+        """Drop the metadata frame, here and in the data processor
+
+        Recommending only needs the catalog index; the frame (raw lyrics
+        included) is for offline analysis and for saving artifacts.
+        """
+        self.df = None
+        self.data_processor.df = None
+
+    @staticmethod
+    def normalize_rows(audio_features, lyrics_features=None):
+        """Normalize every row over audio + lyrics jointly
+        
+        A dot product across both blocks then equals cosine similarity on the
+        concatenation. The TF-IDF block is first L2-normalized on its own.
+        """
+        audio_features = np.asarray(audio_features, dtype=np.float64)
+        squared_norms = np.einsum('ij,ij->i', audio_features, audio_features)
+        
+        if lyrics_features is not None:
+            lyrics_features = normalize(lyrics_features, norm='l2', axis=1)
+            squared_norms = squared_norms + np.asarray(lyrics_features.multiply(lyrics_features).sum(axis=1)).ravel()
+        
+        row_norms = np.sqrt(squared_norms)
+        row_norms[row_norms == 0] = 1
+        row_scale = 1.0 / row_norms
+        row_scale[~np.isfinite(row_scale)] = 0.0  # rows with missing values are zeroed
+        audio_features = np.nan_to_num(audio_features * row_scale[:, None], nan=0.0)
+        
+        if lyrics_features is not None:
+            lyrics_features = sp.csr_matrix(sp.diags(row_scale) @ lyrics_features, dtype=lyrics_features.dtype)
+        return audio_features, lyrics_features
+    
+    def set_feature_dtype(self, feature_dtype: str):
+        """Store both feature blocks as float64, float32 or int8
+
+        int8 uses symmetric scalar quantization with one scale per dimension;
+        the scales are folded into the query at scoring time. Converting an
+        int8 model back to a float dtype keeps the quantization error.
+        """
+        if feature_dtype not in FEATURE_DTYPES:
+            raise ValueError(f"Unknown feature dtype '{feature_dtype}', expected one of {FEATURE_DTYPES}")
+        self.merge_delta()
+        self.feature_dtype = feature_dtype
+        stored = {np.dtype(self.features.dtype).name}
+        if self.lyrics_features is not None:
+            stored.add(np.dtype(self.lyrics_features.dtype).name)
+        if stored == {feature_dtype}:
+            return
+
+        audio_features = dequantize(self.features, self.feature_scale)
+        lyrics_features = None
+        if self.lyrics_features is not None:
+            lyrics_features = dequantize(self.lyrics_features, self.lyrics_scale)
+        if feature_dtype == 'int8':
+            self.feature_scale = column_scale(audio_features)
+            self.lyrics_scale = column_scale(lyrics_features) if lyrics_features is not None else None
+        else:
+            self.feature_scale = self.lyrics_scale = None
+        self.features, self.lyrics_features = self.to_storage(audio_features, lyrics_features, feature_dtype)
+
+    def to_storage(self, audio_features, lyrics_features=None, feature_dtype=None):
+        """Convert float feature rows to the storage dtype, using the existing int8 scales"""
+        feature_dtype = feature_dtype or np.dtype(self.features.dtype).name
+        if feature_dtype == 'int8':
+            audio_features = quantize(audio_features, self.feature_scale)
+            if lyrics_features is not None:
+                lyrics_features = quantize(lyrics_features, self.lyrics_scale)
+            return audio_features, lyrics_features
+        audio_features = np.asarray(audio_features, dtype=feature_dtype)
+        if lyrics_features is not None:
+            lyrics_features = sp.csr_matrix(lyrics_features, dtype=feature_dtype)
+        return audio_features, lyrics_features
+
+    def feature_rows(self, rows) -> Tuple[np.ndarray, Optional[sp.csr_matrix]]:
+        """Float64 audio block and CSR lyrics block (None without lyrics) of catalog rows"""
+        audio_features = dequantize(self.features[rows], self.feature_scale)
+        lyrics_features = None
+        if self.lyrics_features is not None:
+            lyrics_features = dequantize(self.lyrics_features[rows], self.lyrics_scale)
+        return audio_features, lyrics_features
+
+    def reduce_lyrics(self, lyrics_features) -> np.ndarray:
+        """Project TF-IDF rows onto the lyrics components, L2-normalized like the TF-IDF rows"""
+        reduced = np.asarray(lyrics_features @ self.lyrics_components.T)
+        return normalize(reduced, norm='l2', axis=1)
+
+    def reduce_lyrics_block(self, components: np.ndarray):
+        """Replace the sparse lyrics block by its projection onto components
+
+        The projected lyrics are appended to the dense block with the weight
+        the TF-IDF row had, so the joint row normalization is unchanged.
+        Both blocks are left in float64.
+        """
+        self.merge_delta()
+        audio_features, lyrics_features = self.feature_rows(slice(None))
+        lyrics_norms = sp.linalg.norm(lyrics_features, axis=1)
+        self.lyrics_components = components
+        reduced = self.reduce_lyrics(lyrics_features) * lyrics_norms[:, None]
+        self.features, self.lyrics_features = self.normalize_rows(np.hstack([audio_features, reduced]))
+        self.feature_scale = self.lyrics_scale = None
+
+    def warm_start_centroids(self, previous: 'MusicRecommender' = None) -> Optional[np.ndarray]:
+        """The previous snapshot's centroids in this model's feature space, or None"""
+        if previous is None or previous.centroids is None:
+            return None
+        n_base = len(AUDIO_FEATURES) + 2
+        centroids = np.asarray(previous.centroids)
+        if previous.lyrics_components is not None:
+            # Back from the previous lyrics components to its vocabulary
+            centroids = np.hstack([centroids[:, :n_base], centroids[:, n_base:] @ previous.lyrics_components])
+        if self.lyrics_features is None and self.lyrics_components is None:
+            return centroids[:, :n_base]
+        old_vocabulary = getattr(previous.tfidf_vectorizer, 'vocabulary_', {})
+        aligned = align_centroids(centroids, n_base, old_vocabulary, self.tfidf_vectorizer.vocabulary_)
+        if self.lyrics_components is None:
+            return aligned
+        return np.hstack([aligned[:, :n_base], aligned[:, n_base:] @ self.lyrics_components.T])
+
+    def build_catalog(self):
+        """(Re)build the columnar catalog index used for filtering and scoring"""
+        self.catalog = CatalogIndex(self.df)
+        return self.catalog
+    
+    def build_index(self, partitions: Tuple[np.ndarray, np.ndarray] = None):
+        """(Re)build the candidate search index
+
+        IVF partitions are fitted on the current rows unless given as
+        (centroids, labels), e.g. the ones saved with an artifact.
+        """
+        options = {}
+        if self.index_type == 'ivf':
+            options = {'n_probe': self.n_probe, 'popular_fraction': self.popular_fraction,
+                       'popular_probe': self.popular_probe, 'max_popular': self.max_popular,
+                       'n_lists': self.n_lists, 'partitions': partitions}
+        self.index = build_index(self.index_type, self, **options)
+        return self.index
+    
+    def feature_matrix(self):
+        """Return the full (audio + lyrics) feature matrix, sparse when lyrics are present"""
+        if self.lyrics_features is None:
+            return merge(self.features)
+        return sp.hstack([sp.csr_matrix(merge(self.features)), merge(self.lyrics_features)], format='csr')
+    
+    def assign_clusters(self, audio_features, lyrics_features=None) -> np.ndarray:
+        """Label rows with their nearest existing centroid (the KMeans predict rule)"""
+        return nearest_centroid(self.centroids, audio_features, lyrics_features).astype(self.clusters.dtype)
+    
+    def unknown_tracks(self, tracks: pd.DataFrame) -> pd.DataFrame:
+        """Rows of tracks whose track_id is not in the catalog yet, first occurrence only"""
+        known = self.catalog.contains(tracks['track_id'].tolist())
+        return tracks[~known].drop_duplicates('track_id')
+    
+    def add_tracks(self, tracks: pd.DataFrame) -> 'MusicRecommender':
+        """Return a recommender with new tracks appended, without refitting anything
+        
+        Rows are featurized with the frozen scaler and vectorizer and assigned
+        to the nearest existing cluster and search partition; the search
+        index is extended rather than rebuilt. Feature rows, clusters and
+        catalog entries go to a delta segment next to the (possibly
+        memory-mapped) base, which is neither
+        copied nor modified, so the cost grows with the rows added since the
+        last build rather than with the catalog. Requests in flight keep a
+        consistent view until the caller swaps in the result. Tracks already
+        in the catalog are skipped.
+        """
+        tracks = self.unknown_tracks(tracks)
+        if tracks.empty:
+            return self
+        
+        audio_features, tracks = self.data_processor.transform_features(tracks)
+        lyrics_features = None
+        if self.lyrics_features is not None or self.lyrics_components is not None:
+            texts = tracks['processed_lyrics'] if 'processed_lyrics' in tracks.columns else [''] * len(tracks)
+            lyrics_features = self.tfidf_vectorizer.transform(texts)
+        if self.lyrics_components is not None:
+            audio_features = np.hstack([np.asarray(audio_features, dtype=np.float64), self.reduce_lyrics(lyrics_features)])
+            lyrics_features = None
+        audio_features, lyrics_features = self.normalize_rows(audio_features, lyrics_features)
+        labels = self.assign_clusters(audio_features, lyrics_features)
+        
+        updated = copy.copy(self)
+        updated.index = self.index.extend(audio_features, lyrics_features,
+                                          tracks['track_popularity'].fillna(0).to_numpy(dtype=np.int16))
+        audio_features, lyrics_features = self.to_storage(audio_features, lyrics_features)
+        updated.features = append_rows(self.features, audio_features)
+        if lyrics_features is not None:
+            updated.lyrics_features = append_rows(self.lyrics_features, lyrics_features)
+        updated.clusters = append_rows(self.clusters, labels)
+        if self.df is not None:
+            # New rows follow the existing metadata schema (e.g. no raw lyrics for loaded artifacts)
+            columns = [column for column in self.df.columns if column in tracks.columns]
+            updated.df = pd.concat([self.df, tracks[columns]], ignore_index=True)
+        updated.catalog = self.catalog.extend(tracks)
+        
+        base_version, _, added = self.version.partition('+')
+        updated.version = f"{base_version}+{int(added or 0) + len(tracks)}"
+        logger.info(f"Added {len(tracks)} tracks, catalog now has {updated.catalog.n_rows} rows (version {updated.version})")
+        return updated
+
+    def merge_delta(self):
+        """Fold the rows added by add_tracks() into plain blocks and one catalog
+
+        Copies everything once (the memory mapping of the base is lost), so it
+        is for saving and for whole-block conversions, not for serving.
+        """
+        self.features = merge(self.features)
+        if self.lyrics_features is not None:
+            self.lyrics_features = merge(self.lyrics_features)
+        if self.clusters is not None:
+            self.clusters = merge(self.clusters)
+        if self.catalog is not None:
+            self.catalog = self.catalog.merged()
+    
+    def similarity(self, query_audio: np.ndarray, query_lyrics: np.ndarray = None,
+                   rows: np.ndarray = None) -> np.ndarray:
+        """Dot product of normalized queries against catalog rows (all rows by default)
+
+        Queries are either single vectors or matrices with one column per query.
+        The lyrics part is a CSR product, so the cost scales with the number of
+        non-zero TF-IDF entries rather than with the vocabulary size.
+        """
+        features = self.features if rows is None else self.features[rows]
+        scores = stored_product(features, self._stored_query(query_audio, self.feature_scale, features.dtype))
+        if query_lyrics is not None and self.lyrics_features is not None:
+            lyrics_features = self.lyrics_features if rows is None else self.lyrics_features[rows]
+            scores = scores + stored_product(
+                lyrics_features, self._stored_query(query_lyrics, self.lyrics_scale, lyrics_features.dtype))
+        return scores
+
+    @staticmethod
+    def _stored_query(query, scale, stored_dtype):
+        """Fold int8 scales into the query and match the precision of the stored block"""
+        if scale is not None:
+            query = (np.asarray(query).T * scale).T
+        return np.asarray(query, dtype=compute_dtype(stored_dtype))
 
     def calculate_feature_weights(self, 
                                 audio_features: Dict[str, float],
@@ -59,28 +363,120 @@ class MusicRecommender:
         }
         return weights
 
-    def calculate_genre_bonus(self, target_genre, target_subgenre, df):
-        genre_bonus = np.zeros(len(df))
+    def calculate_genre_bonus(self, target_genres, target_subgenres, rows):
+        """Genre match bonus for catalog rows, one column per (genre, subgenre) target"""
+        genre_codes = np.array([self.catalog.genre_code(g) for g in target_genres])
+        subgenre_codes = np.array([self.catalog.subgenre_code(g) for g in target_subgenres])
         
         # Base bonus for genre match
-        genre_match = df['playlist_genre'] == target_genre
-        genre_bonus[genre_match] += 0.1
+        genre_bonus = 0.1 * (self.catalog.genre_codes[rows][:, None] == genre_codes[None, :])
         
         # Additional bonus for subgenre match
-        subgenre_match = df['playlist_subgenre'] == target_subgenre
-        genre_bonus[subgenre_match] += 0.05
+        genre_bonus = genre_bonus + 0.05 * (self.catalog.subgenre_codes[rows][:, None] == subgenre_codes[None, :])
         
         return genre_bonus
 
-    def adjust_by_popularity(self, similarity_scores, df):
+    def adjust_by_popularity(self, similarity_scores, rows):
         # Normalize popularity
-        popularity = df['track_popularity'].values / 100.0
+        popularity = self.catalog.popularity[rows] / 100.0
+        if similarity_scores.ndim == 2:
+            popularity = popularity[:, None]
         
         # Combine similarity and popularity
         adjusted_scores = 0.7 * similarity_scores + 0.3 * popularity
         
         return adjusted_scores
 
+    def lyrics_tfidf(self, lyrics: List[str]) -> sp.csr_matrix:
+        """Preprocess raw query lyrics and TF-IDF them in one vectorizer call (the 'lyrics' stage)"""
+        with self.metrics.stage('lyrics'):
+            processed_lyrics = [self.data_processor.preprocess_lyrics(text) for text in lyrics]
+            return self.tfidf_vectorizer.transform(processed_lyrics)
+
+    def build_queries(self, seeds: List[Dict[str, Any]],
+                      seed_rows: np.ndarray = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Build normalized query matrices (one column per seed) for a batch of seeds
+
+        Seeds with a catalog row in seed_rows (>= 0) reuse that row's precomputed
+        vectors; only the others are featurized from their audio features and
+        lyrics. Returns the audio/date block and the lyrics block, the latter
+        being None when no seed has lyrics.
+        """
+        if seed_rows is None:
+            seed_rows = np.full(len(seeds), -1)
+        known = np.flatnonzero(seed_rows >= 0)
+        year_weight = 3.0
+        audio_feature_names = [
+            'danceability', 'energy', 'loudness', 
+            'speechiness', 'acousticness', 'instrumentalness',
+            'liveness', 'valence', 'tempo'
+        ]
+
+        n_base = len(audio_feature_names) + 2
+        known_audio, known_lyrics = self.feature_rows(seed_rows[known])
+        # Beyond the audio and date columns come the reduced lyrics, if any
+        query_audio = np.zeros((self.features.shape[1], len(seeds)))
+        query_audio[:, known] = known_audio.T
+        for j, seed in enumerate(seeds):
+            if seed_rows[j] >= 0:
+                continue
+            audio_features = seed.get('audio_features') or {}
+            query_audio[:len(audio_feature_names), j] = [audio_features.get(f, 0.5) for f in audio_feature_names]
+
+            release_date = seed.get('release_date')
+            if release_date:
+                release_date_dt = pd.to_datetime(release_date)
+                year_min, year_max = self.year_range
+                year = (release_date_dt.year - year_min) / (year_max - year_min)
+                month = (release_date_dt.month - 1) / 11
+                query_audio[n_base - 2:n_base, j] = [year * year_weight, month]
+            else:
+                query_audio[n_base - 2:n_base, j] = [0.5 * year_weight, 0.5]
+
+        query_lyrics = None
+        lyric_seeds = []
+        if self.has_lyrics:
+            lyric_seeds = [j for j, seed in enumerate(seeds) if seed_rows[j] < 0 and seed.get('lyrics')]
+        if self.lyrics_components is not None and lyric_seeds:
+            reduced_lyrics = self.reduce_lyrics(self.lyrics_tfidf([seeds[j]['lyrics'] for j in lyric_seeds]))
+            query_audio[n_base:, lyric_seeds] = reduced_lyrics.T
+        squared_norms = np.einsum('ij,ij->j', query_audio, query_audio)
+
+        if self.lyrics_features is not None and (lyric_seeds or len(known)):
+            query_lyrics = np.zeros((self.lyrics_features.shape[1], len(seeds)))
+            if len(known):
+                query_lyrics[:, known] = known_lyrics.toarray().T
+            if lyric_seeds:
+                # Lyrics without known terms stay zero
+                lyrics_matrix = normalize(self.lyrics_tfidf([seeds[j]['lyrics'] for j in lyric_seeds]), norm='l2', axis=1)
+                query_lyrics[:, lyric_seeds] = lyrics_matrix.toarray().T
+            squared_norms = squared_norms + np.einsum('ij,ij->j', query_lyrics, query_lyrics)
+
+        norms = np.sqrt(squared_norms)
+        query_audio = np.nan_to_num(query_audio / norms, nan=0.0)
+        if query_lyrics is not None:
+            query_lyrics = np.nan_to_num(query_lyrics / norms, nan=0.0)
+
+        return query_audio, query_lyrics
+
+    def first_eligible_row(self, excluded: np.ndarray, release_year: int = None, year_range: int = 5) -> int:
+        """First catalog row not in excluded (sorted row ids), released within
+        year_range years of release_year if given; -1 if there is none
+
+        Scans blocks of growing size from the start of the catalog, so the
+        cost does not depend on the catalog size unless few rows qualify.
+        """
+        start, block = 0, 1024
+        while start < self.catalog.n_rows:
+            rows = np.arange(start, min(start + block, self.catalog.n_rows))
+            eligible = ~np.isin(rows, excluded, assume_unique=True)
+            if release_year is not None:
+                eligible &= self.catalog.year_window(release_year, year_range, rows)
+            if eligible.any():
+                return int(rows[eligible.argmax()])
+            start, block = start + block, block * 2
+        return -1
+
     def find_similar_songs(self, 
                           audio_features: Dict[str, float],
                           lyrics: str = None,
@@ -90,184 +486,299 @@ class MusicRecommender:
                           playlist_genre: str = '',
                           playlist_subgenre: str = '',
                           user_id: str = None,
-                          exclude_songs: List[str] = None) -> List[Dict[str, Any]]:
+                          exclude_songs: List[str] = None,
+                          track_id: str = None) -> List[Dict[str, Any]]:
+        seed = {
+            'track_id': track_id,
+            'audio_features': audio_features,
+            'lyrics': lyrics,
+            'release_date': release_date,
+            'track_popularity': track_popularity,
+            'playlist_genre': playlist_genre,
+            'playlist_subgenre': playlist_subgenre
+        }
+        return self.find_similar_songs_batch(
+            [seed],
+            n_recommendations=n_recommendations,
+            user_id=user_id,
+            exclude_songs=exclude_songs
+        )[0]
+
+    def find_similar_songs_batch(self,
+                                 seeds: List[Dict[str, Any]],
+                                 n_recommendations: int = 5,
+                                 user_id: str = None,
+                                 exclude_songs: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Recommend songs for several seeds at once
+
+        Each seed is a dict with the keyword arguments of find_similar_songs
+        (audio_features, lyrics, release_date, playlist_genre, ...) and an
+        optional track_id. Seeds whose track_id is in the catalog use the
+        catalog's precomputed vectors, release year and genres, and are never
+        recommended back. All seeds are scored with a single matrix-matrix
+        product against the catalog and one recommendation list is returned
+        per seed.
+        """
+        return self.find_similar_songs_grouped([{
+            'seeds': seeds,
+            'n_recommendations': n_recommendations,
+            'user_id': user_id,
+            'exclude_songs': exclude_songs
+        }])[0]
+
+    def find_similar_songs_grouped(self, groups: List[Dict[str, Any]]) -> List[List[List[Dict[str, Any]]]]:
+        """Score several independent find_similar_songs_batch calls together
+
+        Each group holds the arguments of one call (seeds, n_recommendations,
+        user_id, exclude_songs); exclusions, history and seed tracks only apply
+        within their own group. The seeds of every group are scored in one
+        matrix-matrix product, and the result has one list per group with one
+        recommendation list per seed.
+
+        The time of each stage goes to self.metrics: 'queries' (query vectors,
+        including 'lyrics' preprocessing and TF-IDF), 'candidates' (index
+        lookup), 'filter' (eligibility masks over the candidate rows),
+        'scoring' (similarity and blending), 'top_k' and 'response' (records
+        and user history).
+        """
         if self.features is None:
             self.prepare_data()
 
-        filtered_df = self.df
-        filtered_features = self.features
-        filtered_clusters = self.clusters
-
-        # Exclude already recommended songs
-        if exclude_songs:
-            mask = ~filtered_df['track_id'].isin(exclude_songs)
-            filtered_df = filtered_df[mask]
-            filtered_features = filtered_features[mask]
-            filtered_clusters = filtered_clusters[mask]
-
-        # Get user history
-        if user_id:
-            user_history = self.history.get(user_id, [])
-            mask = ~filtered_df['track_id'].isin(user_history)
-            filtered_df = filtered_df[mask]
-            filtered_features = filtered_features[mask]
-            filtered_clusters = filtered_clusters[mask]
+        lap = self.metrics.stopwatch()
+        seeds = [seed for group in groups for seed in group['seeds']]
+        seed_groups = np.repeat(np.arange(len(groups)), [len(group['seeds']) for group in groups])
+        seed_n = np.array([group.get('n_recommendations', 5) for group in groups], dtype=np.int64)[seed_groups]
+        if not seeds:
+            return [[] for _ in groups]
 
-        year_weight = 3.0
+        n_seeds = len(seeds)
         year_range = 5
-        if release_date:
-            release_year = pd.to_datetime(release_date).year
-            if 'release_date' in self.df.columns:
-                mask = (self.df['release_date'].dt.year >= release_year - year_range) & \
-                       (self.df['release_date'].dt.year <= release_year + year_range)
-                if mask.any():
-                    filtered_df = self.df[mask]
-                    filtered_features = self.features[mask.values]
-                    filtered_clusters = self.clusters[mask.values]
+        seed_rows = np.array([self.catalog.row_of(seed.get('track_id')) for seed in seeds])
+        known = seed_rows >= 0
 
-        # Get weights
-        weights = self.calculate_feature_weights(audio_features, lyrics, release_date)
+        query_audio, query_lyrics = self.build_queries(seeds, seed_rows)
+        lap('queries')
 
-        input_features = []
-        audio_feature_names = [
-            'danceability', 'energy', 'loudness', 
-            'speechiness', 'acousticness', 'instrumentalness',
-            'liveness', 'valence', 'tempo'
-        ]
-        audio_values = [audio_features.get(f, 0.5) for f in audio_feature_names]
-        input_features.extend(audio_values)
-
-        if release_date:
-            release_date_dt = pd.to_datetime(release_date)
-            year = (release_date_dt.year - self.df['release_date'].dt.year.min()) / \
-                   (self.df['release_date'].dt.year.max() - self.df['release_date'].dt.year.min())
-            month = (release_date_dt.month - 1) / 11
-            input_features.extend([year * year_weight, month])
-        else:
-            input_features.extend([0.5 * year_weight, 0.5])
+        candidate_sets = [self.index.candidates(qa, ql) for qa, ql in zip(
+            query_audio.T, query_lyrics.T if query_lyrics is not None else [None] * n_seeds)]
+        rows = None
+        if all(c is not None for c in candidate_sets):
+            rows = np.unique(np.concatenate(candidate_sets))
+        lap('candidates')
 
-        if lyrics and 'processed_lyrics' in self.df.columns:
-            processed_lyrics = self.data_processor.preprocess_lyrics(lyrics)
-            lyrics_features = self.tfidf_vectorizer.transform([processed_lyrics]).toarray()
-            lyrics_features = lyrics_features / np.linalg.norm(lyrics_features, axis=1, keepdims=True)
-            input_features.extend(lyrics_features[0])
+        # Rows excluded for every seed of a group: explicit exclusions, user history
+        # and the group's own seed tracks. Kept as sorted row ids, so no mask spans
+        # the whole catalog unless the whole catalog is scored
+        group_excluded = []
+        for g, group in enumerate(groups):
+            excluded = [self.catalog.rows_for(group.get('exclude_songs') or [])]
+            if group.get('user_id'):
+                excluded.append(self.catalog.rows_for(self.history.get(group['user_id'])))
+            if known[seed_groups == g].any():
+                excluded.append(self.catalog.rows_for(seed.get('track_id') for seed in group['seeds']))
+            group_excluded.append(np.unique(np.concatenate(excluded)))
 
-        input_features = np.array(input_features)
-        input_features = input_features / np.linalg.norm(input_features)
-        input_features = np.nan_to_num(input_features, nan=0.0)
+        # Per-seed release year window, ignored when it would leave nothing to recommend
+        windows = []
+        for j, seed in enumerate(seeds):
+            release_year = None
+            if seed.get('release_date'):
+                release_year = pd.to_datetime(seed['release_date']).year
+            elif known[j] and self.catalog.years is not None and self.catalog.years[seed_rows[j]] != MISSING_YEAR:
+                release_year = int(self.catalog.years[seed_rows[j]])
+            if release_year is not None:
+                excluded = group_excluded[seed_groups[j]]
+                excluded_in_window = self.catalog.year_window(release_year, year_range, excluded).sum()
+                if self.catalog.count_in_window(release_year, year_range) <= excluded_in_window:
+                    release_year = None
+            windows.append(release_year)
 
-        # Calculate similarity with weights
-        similarity_scores = cosine_similarity([input_features], filtered_features)[0] * weights['audio']
+        # Diversity is measured against the first eligible row of each seed in the whole catalog
+        first_rows = np.array([
+            self.first_eligible_row(group_excluded[seed_groups[j]], windows[j], year_range)
+            for j in range(n_seeds)
+        ])
+        has_target = first_rows >= 0
+        target_clusters = self.clusters[np.maximum(first_rows, 0)]
+
+        def eligibility(rows):
+            group_masks = [~np.isin(rows, excluded, assume_unique=True) for excluded in group_excluded]
+            masks = np.empty((len(rows), n_seeds), dtype=bool)
+            for j in range(n_seeds):
+                masks[:, j] = group_masks[seed_groups[j]]
+                if windows[j] is not None:
+                    masks[:, j] &= self.catalog.year_window(windows[j], year_range, rows)
+            return masks
+
+        # Restrict each seed to its index candidates, falling back to a full scan
+        # when any seed is left with too few eligible candidates
+        full_scan = rows is None
+        if not full_scan:
+            seed_masks = eligibility(rows)
+            for j, candidates in enumerate(candidate_sets):
+                seed_masks[:, j] &= np.isin(rows, candidates, assume_unique=True)
+            if (seed_masks.sum(axis=0) >= seed_n).all():
+                scored = seed_masks.any(axis=1)
+                rows, seed_masks = rows[scored], seed_masks[scored]
+            else:
+                full_scan = True
+        if full_scan:
+            rows = np.arange(self.catalog.n_rows)
+            seed_masks = eligibility(rows)
+        lap('filter')
+        self.metrics.observe('recommender_candidates', len(rows),
+                             buckets=SIZE_BUCKETS, help='Catalog rows scored per batch of seeds')
+        scores = self.similarity(query_audio, query_lyrics, rows=None if full_scan else rows)
+        candidate_clusters = self.clusters[rows]
+
+        # Get weights
+        weights = self.calculate_feature_weights(seeds[0].get('audio_features', {}))
+        scores = scores * weights['audio']
 
         # Add genre bonus
-        genre_bonus = self.calculate_genre_bonus(playlist_genre, playlist_subgenre, filtered_df)
-        similarity_scores = similarity_scores + genre_bonus * weights['genre']
+        target_genres = [seed.get('playlist_genre') or '' for seed in seeds]
+        target_subgenres = [seed.get('playlist_subgenre') or '' for seed in seeds]
+        for j in np.flatnonzero(known):
+            row = seed_rows[j]
+            target_genres[j] = target_genres[j] or self.catalog.genre_names[self.catalog.genre_codes[row]]
+            target_subgenres[j] = target_subgenres[j] or self.catalog.subgenre_names[self.catalog.subgenre_codes[row]]
+        genre_bonus = self.calculate_genre_bonus(target_genres, target_subgenres, rows)
+        scores = scores + genre_bonus * weights['genre']
 
         # Add diversity through clusters
-        cluster_diversity = np.zeros(len(filtered_df))
-        target_cluster = filtered_clusters[0] if len(filtered_clusters) > 0 else None
-        if target_cluster is not None:
-            cluster_diversity[filtered_clusters != target_cluster] += 0.1
-        similarity_scores = similarity_scores + cluster_diversity
+        scores = scores + 0.1 * ((candidate_clusters[:, None] != target_clusters[None, :]) & has_target)
 
         # Adjust by popularity
-        similarity_scores = self.adjust_by_popularity(similarity_scores, filtered_df)
-
-        # Collect recommendations
-        recommendations = []
-        for idx in np.argsort(similarity_scores)[::-1][:n_recommendations]:
-            song = filtered_df.iloc[idx]
-            recommendations.append({
-                'track_id': song['track_id'],
-                'track_name': song['track_name'],
-                'track_artist': song['track_artist'],
-                'similarity_score': float(similarity_scores[idx]),
-                'track_popularity': int(song.get('track_popularity', 0)),
-                'playlist_genre': song.get('playlist_genre', ''),
-                'playlist_subgenre': song.get('playlist_subgenre', '')
-            })
+        scores = self.adjust_by_popularity(scores, rows)
+        scores[~seed_masks] = -np.inf
+        lap('scoring')
+
+        # Collect recommendations: partial selection of the top rows per seed,
+        # then a single gather of the response fields for the selected rows
+        top, top_scores = top_k(scores, int(seed_n.max()))
+        lap('top_k')
+        all_recommendations = [[] for _ in groups]
+        for j in range(n_seeds):
+            valid = np.isfinite(top_scores[:seed_n[j], j])
+            all_recommendations[seed_groups[j]].append(
+                self.catalog.records(rows[top[:seed_n[j]][valid, j]], top_scores[:seed_n[j]][valid, j]))
 
         # Update user history
-        if user_id:
-            self.history[user_id] = self.history.get(user_id, []) + [r['track_id'] for r in recommendations]
+        for group, recommendations in zip(groups, all_recommendations):
+            if group.get('user_id'):
+                self.history.add(group['user_id'], [r['track_id'] for recs in recommendations for r in recs])
+        lap('response')
 
-        return recommendations
+        return all_recommendations
     
-    def evaluate_recommendations(self, n_test_songs: int = 10, n_recommendations: int = 5) -> Dict[str, float]:
-        test_indices = random.sample(range(len(self.df)), n_test_songs)
-        metrics = {
-            'precision@5': 0.0,
-            'recall@5': 0.0,
-            'ndcg@5': 0.0
+    def evaluate_recommendations(self, ground_truth: str = 'playlist', k_values=(5, 10, 20),
+                                 n_queries: int = None, batch_size: int = 32,
+                                 n_jobs: int = None) -> Dict[str, float]:
+        """Offline precision/recall/NDCG/MAP/coverage at each k; see evaluation.evaluate"""
+        results = evaluate(self, ground_truth, k_values, n_queries=n_queries,
+                           batch_size=batch_size, n_jobs=n_jobs)
+        return {metric: value for metric, value in results.items() if not isinstance(value, str)}
+
+    def analyze_feature_importance(self, sample_size: int = 1000, k: int = 10,
+                                   band_edges=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+                                   block_size: int = None, random_state: int = 42) -> Dict[str, Any]:
+        """Audio feature profile per similarity band, and what drives the blended score
+
+        Catalog tracks are sampled as seeds and scored against the whole
+        catalog block_size seeds at a time (by default about 4M pairs per
+        block). Every (seed, catalog row) pair is put in a similarity band
+        with np.digitize (values beyond the outer edges go to the outer
+        bands); the mean audio features (scaled, as in self.df) of each band
+        come from one bincount per block followed by one matrix product.
+        Contributions break the blended score of each seed's top k rows (no
+        eligibility filters) down into the audio and release date
+        dimensions, lyrics, genre bonus, cluster diversity and popularity;
+        they sum to the mean top-k score.
+        """
+        if self.features is None:
+            self.prepare_data()
+        if self.df is None:
+            raise ValueError("Feature importance needs the metadata frame; load the artifact with its metadata")
+
+        n_rows = self.catalog.n_rows
+        rng = np.random.default_rng(random_state)
+        sample = rng.choice(n_rows, size=min(sample_size, n_rows), replace=False)
+        block_size = block_size or max(1, min(256, 2**22 // n_rows))
+        band_edges = np.asarray(band_edges, dtype=np.float64)
+        n_bands = len(band_edges) - 1
+        band_features = self.df[AUDIO_FEATURES].to_numpy(dtype=np.float64)
+        dimensions = AUDIO_FEATURES + ['release_year', 'release_month']
+
+        weights = self.calculate_feature_weights({})
+        # The popularity adjustment is linear: score = slope * blended + offset
+        offset = self.adjust_by_popularity(np.zeros(n_rows), np.arange(n_rows))
+        slope = self.adjust_by_popularity(np.ones(n_rows), np.arange(n_rows)) - offset
+
+        band_counts = np.zeros(n_bands, dtype=np.int64)
+        band_sums = np.zeros((n_bands, len(AUDIO_FEATURES)))
+        contributions = np.zeros(len(dimensions) + 4)
+        n_top = 0
+        for start in range(0, len(sample), block_size):
+            seed_rows = sample[start:start + block_size]
+            seed_ids = self.catalog.ids(seed_rows)
+            n_seeds = len(seed_rows)
+            query_audio, query_lyrics = self.build_queries([{'track_id': i} for i in seed_ids.tolist()], seed_rows)
+            scores = self.similarity(query_audio, query_lyrics)
+
+            # Pairs of a seed with its own track go to an extra band that is dropped
+            own = np.zeros((n_rows, n_seeds), dtype=bool)
+            for j, track_id in enumerate(seed_ids.tolist()):
+                own[self.catalog.rows_for([track_id]), j] = True
+            bands = np.where(own, n_bands, np.digitize(scores, band_edges[1:-1]))
+            counts = np.bincount((bands * n_rows + np.arange(n_rows)[:, None]).ravel(),
+                                 minlength=(n_bands + 1) * n_rows).reshape(n_bands + 1, n_rows)[:n_bands]
+            band_counts += counts.sum(axis=1)
+            band_sums += counts @ band_features
+
+            # Blended score as in find_similar_songs_grouped, kept in parts
+            genre_bonus = self.calculate_genre_bonus(
+                self.catalog.genre_names[self.catalog.genre_codes[seed_rows]],
+                self.catalog.subgenre_names[self.catalog.subgenre_codes[seed_rows]],
+                np.arange(n_rows))
+            target_clusters = np.asarray(self.clusters)[(~own).argmax(axis=0)]
+            diversity = 0.1 * (np.asarray(self.clusters)[:, None] != target_clusters[None, :])
+            blended = slope[:, None] * (scores * weights['audio'] + genre_bonus * weights['genre'] + diversity) + offset[:, None]
+            blended[own] = -np.inf
+            top, _ = top_k(blended, k)
+
+            columns = np.broadcast_to(np.arange(n_seeds), top.shape)
+            top_slope = slope[top]
+            top_audio, _ = self.feature_rows(top.ravel())
+            # Columns past the release date are reduced lyrics, counted with the lyrics below
+            n_dims = len(dimensions)
+            audio_parts = top_audio.reshape(top.shape + (-1,))[:, :, :n_dims] * query_audio.T[None, :, :n_dims]
+            audio_parts *= (top_slope * weights['audio'])[:, :, None]
+            lyrics_part = top_slope * weights['audio'] * scores[top, columns] - audio_parts.sum(axis=2)
+            contributions += np.concatenate([
+                audio_parts.sum(axis=(0, 1)),
+                [lyrics_part.sum(),
+                 (top_slope * weights['genre'] * genre_bonus[top, columns]).sum(),
+                 (top_slope * diversity[top, columns]).sum(),
+                 offset[top].sum()]
+            ])
+            n_top += top.size
+
+        band_means = band_sums / np.maximum(band_counts, 1)[:, None]
+        mean_contributions = contributions / max(n_top, 1)
+        return {
+            'bands': [
+                {
+                    'low': float(band_edges[b]),
+                    'high': float(band_edges[b + 1]),
+                    'pairs': int(band_counts[b]),
+                    'feature_means': dict(zip(AUDIO_FEATURES, band_means[b].tolist()))
+                }
+                for b in range(n_bands)
+            ],
+            'contributions': dict(zip(dimensions + ['lyrics', 'genre', 'diversity', 'popularity'],
+                                      mean_contributions.tolist())),
+            'sample_size': int(len(sample))
         }
-        
-        for idx in test_indices:
-            test_song = self.df.iloc[idx]
-            
-            song_features = {
-                'danceability': test_song['danceability'],
-                'energy': test_song['energy'],
-                'loudness': test_song['loudness'],
-                'speechiness': test_song['speechiness'],
-                'acousticness': test_song['acousticness'],
-                'instrumentalness': test_song['instrumentalness'],
-                'liveness': test_song['liveness'],
-                'valence': test_song['valence'],
-                'tempo': test_song['tempo']
-            }
-            
-            recommendations = self.find_similar_songs(
-                audio_features=song_features,
-                lyrics=test_song.get('lyrics', ''),
-                release_date=test_song['track_album_release_date'],
-                n_recommendations=n_recommendations
-            )
-            
-            recommended_ids = [song['track_id'] for song in recommendations]
-            
-            relevant_items = 1
-            precision = relevant_items / n_recommendations
-            metrics['precision@5'] += precision
-            
-            recall = relevant_items / 1
-            metrics['recall@5'] += recall
-            
-            relevance_scores = np.zeros(n_recommendations)
-            if test_song['track_id'] in recommended_ids:
-                relevance_scores[recommended_ids.index(test_song['track_id'])] = 1
-            ndcg = ndcg_score([relevance_scores], [relevance_scores])
-            metrics['ndcg@5'] += ndcg
-        
-        for metric in metrics:
-            metrics[metric] /= n_test_songs
-            
-        return metrics
-    
-    def analyze_feature_importance(self) -> Dict[str, float]:
-        similarity_ranges = [(0.8, 1.0), (0.6, 0.8), (0.4, 0.6), (0.2, 0.4), (0.0, 0.2)]
-        feature_importance = {}
-        
-        sample_size = min(100, len(self.df))
-        sample_indices = random.sample(range(len(self.df)), sample_size)
-        
-        for idx in sample_indices:
-            song_features = self.features[idx]
-            similarities = cosine_similarity([song_features], self.features)[0]
-            
-            for low, high in similarity_ranges:
-                mask = (similarities >= low) & (similarities < high)
-                if mask.any():
-                    for feature in ['danceability', 'energy', 'valence', 'acousticness']:
-                        if feature not in feature_importance:
-                            feature_importance[feature] = []
-                        feature_importance[feature].append(self.df[mask][feature].mean())
-        
-        avg_importance = {}
-        for feature, values in feature_importance.items():
-            if values:
-                avg_importance[feature] = sum(values) / len(values)
-        
-        return avg_importance
 
 def main():
     from data_processor import DataProcessor
@@ -283,16 +794,20 @@ def main():
     recommender.prepare_data()
     
     print("\nEvaluating model performance...")
-    metrics = recommender.evaluate_recommendations(n_test_songs=20)
+    metrics = recommender.evaluate_recommendations(ground_truth='playlist')
     print("\nEvaluation metrics:")
     for metric, value in metrics.items():
         print(f"{metric}: {value:.3f}")
     
     print("\nAnalyzing feature importance...")
     feature_importance = recommender.analyze_feature_importance()
-    print("\nFeature importance by similarity range:")
-    for feature, values in feature_importance.items():
-        print(f"{feature}: {values}")
+    print("\nMean audio features by similarity range:")
+    for band in feature_importance['bands']:
+        means = ', '.join(f"{feature}={value:.3f}" for feature, value in band['feature_means'].items())
+        print(f"[{band['low']:.1f}, {band['high']:.1f}) {band['pairs']} pairs: {means}")
+    print("\nMean contribution to the top recommendations' score:")
+    for feature, value in feature_importance['contributions'].items():
+        print(f"{feature}: {value:.4f}")
     
     print("\nTesting with a specific song...")
     target_song = recommender.df[recommender.df['track_name'] == 'Someone You Loved'].iloc[0]
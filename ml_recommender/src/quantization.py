@@ -0,0 +1,142 @@
+import argparse
+import copy
+import logging
+from typing import Dict, Any, Iterable
+
+import numpy as np
+import scipy.sparse as sp
+
+from comparison import catalog_seeds, compare_variants, sample_rows
+from segments import Segmented, merge
+
+logger = logging.getLogger(__name__)
+
+FEATURE_DTYPES = ('float64', 'float32', 'int8')
+
+# Rows of an int8 block converted to float at a time when scoring
+SCORE_BLOCK_ROWS = 16384
+
+
+def column_scale(matrix) -> np.ndarray:
+    """Per-column int8 scale: the largest absolute value maps to 127"""
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        max_abs = np.zeros(matrix.shape[1])
+        np.maximum.at(max_abs, matrix.indices, np.abs(matrix.data))
+    else:
+        max_abs = np.abs(np.asarray(matrix)).max(axis=0) if len(matrix) else np.zeros(matrix.shape[1])
+    scale = max_abs.astype(np.float64) / 127
+    scale[scale == 0] = 1.0
+    return scale
+
+
+def quantize(matrix, scale: np.ndarray):
+    """Quantize a dense or CSR matrix to int8 with one scale per column
+
+    Values beyond the scale (e.g. tracks added after the scale was fixed)
+    are clipped to +-127.
+    """
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        data = np.clip(np.rint(matrix.data / scale[matrix.indices]), -127, 127).astype(np.int8)
+        return sp.csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape)
+    return np.clip(np.rint(np.asarray(matrix) / scale), -127, 127).astype(np.int8)
+
+
+def dequantize(matrix, scale: np.ndarray = None):
+    """Float64 values of a stored block (rows of it, typically)"""
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        data = matrix.data.astype(np.float64)
+        if scale is not None:
+            data *= scale[matrix.indices]
+        return sp.csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return matrix * scale if scale is not None else matrix
+
+
+def stored_product(matrix, query: np.ndarray) -> np.ndarray:
+    """matrix @ query for a stored feature block (or rows of one) and a query in compute_dtype
+
+    An int8 block would be upcast to the query's dtype as a whole on every
+    product; it is converted SCORE_BLOCK_ROWS rows at a time instead, so
+    scoring needs a float copy of one block of rows, not of the catalog.
+    """
+    if isinstance(matrix, Segmented):
+        return np.concatenate([stored_product(matrix.base, query), stored_product(matrix.delta, query)])
+    if np.dtype(matrix.dtype) != np.int8:
+        return np.asarray(matrix @ query)
+    n_rows = matrix.shape[0]
+    scores = np.empty((n_rows,) + query.shape[1:], dtype=query.dtype)
+    for start in range(0, n_rows, SCORE_BLOCK_ROWS):
+        stop = min(start + SCORE_BLOCK_ROWS, n_rows)
+        if sp.issparse(matrix):
+            # Wrap the block's slice of the CSR arrays; row slicing would copy them first
+            first, last = matrix.indptr[start], matrix.indptr[stop]
+            block = sp.csr_matrix((matrix.data[first:last].astype(query.dtype), matrix.indices[first:last],
+                                   matrix.indptr[start:stop + 1] - first), shape=(stop - start, matrix.shape[1]))
+        else:
+            block = matrix[start:stop].astype(query.dtype)
+        scores[start:stop] = np.asarray(block @ query)
+    return scores
+
+
+def compute_dtype(stored_dtype) -> type:
+    """Dtype used to score against a stored block: float64 stays float64, anything smaller uses float32"""
+    return np.float64 if np.dtype(stored_dtype) == np.float64 else np.float32
+
+
+def storage_bytes(recommender) -> int:
+    """Memory held by the stored feature blocks"""
+    total = np.asarray(recommender.features).nbytes
+    if recommender.lyrics_features is not None:
+        lyrics = merge(recommender.lyrics_features)
+        total += lyrics.data.nbytes + lyrics.indices.nbytes + lyrics.indptr.nbytes
+    return total
+
+
+def dtype_variant(recommender, feature_dtype: str):
+    """Copy of a recommender with its feature blocks stored as feature_dtype"""
+    variant = copy.copy(recommender)
+    variant.set_feature_dtype(feature_dtype)
+    return variant
+
+
+def storage_report(recommender, dtypes: Iterable[str] = ('float32', 'int8'), k: int = 10,
+                   n_queries: int = 200, random_state: int = 42) -> Dict[str, Dict[str, Any]]:
+    """Compare feature storage dtypes against the recommender's current one
+
+    Catalog tracks are used as seeds; see comparison.compare_variants for
+    the overlap and latency columns. Every row also gives the memory of the
+    feature blocks.
+    """
+    seeds = {'catalog': catalog_seeds(recommender, sample_rows(recommender, n_queries, random_state))}
+    builders = {np.dtype(recommender.features.dtype).name: lambda: recommender}
+    builders.update({dtype: lambda dtype=dtype: dtype_variant(recommender, dtype) for dtype in dtypes})
+    return compare_variants(builders, seeds, k, describe=lambda variant, _: {'feature_bytes': storage_bytes(variant)})
+
+
+def main():
+    from data_processor import DataProcessor
+    from feature_store import load_latest
+
+    parser = argparse.ArgumentParser(description='Compare feature storage dtypes on an artifact')
+    parser.add_argument('--artifacts', default='artifacts', help='Artifact root directory')
+    parser.add_argument('--data', default='src/data/spotify_songs.csv', help='Path to the songs CSV')
+    parser.add_argument('--queries', type=int, default=200, help='Number of seed tracks')
+    parser.add_argument('-k', type=int, default=10, help='Recommendations per seed')
+    args = parser.parse_args()
+
+    recommender = load_latest(args.artifacts, DataProcessor(args.data), metadata=False)
+    if recommender is None:
+        raise SystemExit(f"No artifact in {args.artifacts}")
+    recommender.set_feature_dtype('float64')
+    dtypes = [dtype for dtype in FEATURE_DTYPES if dtype != 'float64']
+    report = storage_report(recommender, dtypes, k=args.k, n_queries=args.queries)
+    for dtype, row in report.items():
+        print(f"{dtype:8s} overlap@{args.k}={row[f'overlap@{args.k}']:.4f} "
+              f"features={row['feature_bytes'] / 2**20:.1f}MB latency={row['latency_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
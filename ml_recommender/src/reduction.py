@@ -0,0 +1,110 @@
+import argparse
+import copy
+import logging
+import time
+from typing import Dict, Any, Iterable
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from data_processor import AUDIO_FEATURES
+from comparison import catalog_seeds, compare_variants, sample_rows
+from quantization import storage_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def fit_lyrics_reduction(lyrics_features, n_components: int, random_state: int = 42) -> np.ndarray:
+    """(n_components, vocabulary size) TruncatedSVD basis of the L2-normalized TF-IDF rows
+
+    The basis is fitted once per build and stored with the vectorizer, so
+    catalog rows and query lyrics are projected the same way.
+    """
+    lyrics_features = normalize(lyrics_features, norm='l2', axis=1)
+    n_components = min(n_components, lyrics_features.shape[1] - 1)
+    start = time.perf_counter()
+    svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+    svd.fit(lyrics_features)
+    logger.info(f"Reduced {lyrics_features.shape[1]} lyrics terms to {n_components} components "
+                f"({svd.explained_variance_ratio_.sum():.1%} of the variance) "
+                f"in {time.perf_counter() - start:.1f}s")
+    return svd.components_
+
+
+def reduced_variant(recommender, n_components: int):
+    """Copy of a recommender with its lyrics block reduced to n_components
+
+    Clusters are kept and the centroids projected, so recommendations only
+    differ by the reduction itself.
+    """
+    variant = copy.copy(recommender)
+    variant.reduce_lyrics_block(fit_lyrics_reduction(recommender.lyrics_features, n_components))
+    n_audio = recommender.features.shape[1]
+    centroids = np.asarray(recommender.centroids)
+    variant.centroids = np.hstack([centroids[:, :n_audio], centroids[:, n_audio:] @ variant.lyrics_components.T])
+    variant.lyrics_dims = n_components
+    variant.build_index()
+    return variant
+
+
+def reduction_report(recommender, dims: Iterable[int] = (64, 128, 256), k: int = 10,
+                     n_queries: int = 200, random_state: int = 42) -> Dict[str, Dict[str, Any]]:
+    """Compare lyrics reductions against the recommender's full TF-IDF block
+
+    Seeds are catalog tracks and, to cover query lyrics, the same tracks
+    sent as unknown songs with their lyrics. For every dimension the report
+    gives the mean top-k overlap with the full model and the mean latency of
+    one recommendation (see comparison.compare_variants), plus the memory of
+    the feature blocks.
+    """
+    if recommender.lyrics_features is None:
+        raise ValueError("The recommender has no TF-IDF lyrics block to reduce")
+    if recommender.df is None or 'lyrics' not in recommender.df.columns:
+        raise ValueError("The lyrics comparison needs the raw lyrics; prepare the recommender from the CSV")
+    rows = sample_rows(recommender, n_queries, random_state)
+    sample = recommender.df.iloc[rows]
+    seeds = {
+        'catalog': catalog_seeds(recommender, rows),
+        'lyrics': [
+            {
+                'audio_features': {feature: float(row[feature]) for feature in AUDIO_FEATURES},
+                'lyrics': row['lyrics'] if isinstance(row['lyrics'], str) else None,
+                'release_date': str(row['track_album_release_date']),
+                'playlist_genre': row['playlist_genre'],
+                'playlist_subgenre': row['playlist_subgenre']
+            }
+            for _, row in sample.iterrows()
+        ]
+    }
+    builders = {'tfidf': lambda: recommender}
+    for n_components in dims:
+        builders[f'svd{n_components}'] = lambda n_components=n_components: reduced_variant(recommender, n_components)
+    return compare_variants(builders, seeds, k, describe=lambda variant, reference: {
+        'feature_bytes': storage_bytes(variant)
+    })
+
+
+def main():
+    from data_processor import DataProcessor
+    from model import MusicRecommender
+
+    parser = argparse.ArgumentParser(description='Compare lyrics reductions against the full TF-IDF block')
+    parser.add_argument('--data', default='src/data/spotify_songs.csv', help='Path to the songs CSV')
+    parser.add_argument('--dims', type=int, nargs='+', default=[64, 128, 256], help='Reduced dimensions to compare')
+    parser.add_argument('--queries', type=int, default=200, help='Number of seed tracks')
+    parser.add_argument('-k', type=int, default=10, help='Recommendations per seed')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    recommender = MusicRecommender(DataProcessor(args.data))
+    recommender.prepare_data()
+    report = reduction_report(recommender, args.dims, k=args.k, n_queries=args.queries)
+    for name, row in report.items():
+        print(f"{name:8s} overlap@{args.k}={row[f'overlap@{args.k}']:.4f} "
+              f"lyrics overlap@{args.k}={row[f'lyrics_overlap@{args.k}']:.4f} "
+              f"features={row['feature_bytes'] / 2**20:.1f}MB latency={row['latency_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from model import MusicRecommender
+from feature_store import load_artifact, resolve_artifact, set_latest
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Holds the active recommender and swaps in new versions atomically
+
+    Readers take one reference with `active` at the start of a request and use
+    it throughout, so a swap never changes the model under an in-flight
+    request. New artifact versions are loaded and warmed up in a background
+    thread and only published once ready.
+    """
+
+    def __init__(self, artifact_dir: str, processor_factory: Callable, recommender_options: Dict[str, Any],
+                 prepare: Optional[Callable[[MusicRecommender], MusicRecommender]] = None,
+                 refresh: Optional[Callable[[MusicRecommender], MusicRecommender]] = None):
+        self.artifact_dir = artifact_dir
+        self.processor_factory = processor_factory  # each version needs its own fitted DataProcessor
+        self.recommender_options = recommender_options
+        self.prepare = prepare  # applied to every new model right before it goes live
+        self.refresh = refresh  # applied through update() on every watch() poll
+        self._active = None
+        self._lock = threading.Lock()  # serializes swaps, never held by readers
+        self._loader = None
+        self._stop = threading.Event()
+        self.loading_version = None
+        self.last_error = None
+        self.activated_at = None
+
+    @property
+    def active(self) -> Optional[MusicRecommender]:
+        return self._active
+
+    def activate(self, recommender: MusicRecommender) -> MusicRecommender:
+        """Publish a recommender as the active model
+
+        prepare runs under the swap lock, so nothing applied through update()
+        in the meantime (e.g. ingested tracks) is lost by the swap.
+        """
+        with self._lock:
+            if self.prepare is not None:
+                recommender = self.prepare(recommender)
+            self._publish(recommender)
+            return recommender
+
+    def update(self, fn: Callable[[MusicRecommender], MusicRecommender]) -> MusicRecommender:
+        """Atomically replace the active model with fn(active), e.g. to add tracks"""
+        with self._lock:
+            updated = fn(self._active)
+            if updated is not self._active:
+                self._publish(updated)
+            return updated
+
+    def _publish(self, recommender: MusicRecommender) -> None:
+        previous = self._active.version if self._active is not None else None
+        self._active = recommender
+        self.activated_at = time.time()
+        logger.info(f"Active model version {previous} -> {recommender.version}")
+
+    def load_version(self, version: Optional[str] = None) -> MusicRecommender:
+        """Load and warm up an artifact version (latest by default) without publishing it"""
+        path = resolve_artifact(self.artifact_dir, version)
+        if path is None:
+            raise FileNotFoundError(f"No artifact {version or 'LATEST'} in {self.artifact_dir}")
+        # Serving only needs the memory-mapped arrays, not the metadata frame
+        recommender = load_artifact(path, self.processor_factory(), metadata=False, **self.recommender_options)
+        self.warm_up(recommender)
+        return recommender
+
+    @staticmethod
+    def warm_up(recommender: MusicRecommender) -> None:
+        """Score one query so memory-mapped pages are read before serving traffic"""
+        query_audio = np.zeros(recommender.features.shape[1])
+        query_lyrics = None
+        if recommender.lyrics_features is not None:
+            query_lyrics = np.zeros(recommender.lyrics_features.shape[1])
+        recommender.similarity(query_audio, query_lyrics)
+
+    def load_async(self, version: Optional[str] = None, publish: bool = False) -> bool:
+        """Start loading a version in the background; False if a load is already running
+
+        With publish, LATEST is pointed at the version once it is live, so
+        every process watching the artifact directory (and every restart)
+        moves to it too instead of reverting it at the next poll. It stays
+        there until another artifact is published.
+        """
+        with self._lock:
+            if self._loader is not None and self._loader.is_alive():
+                return False
+            self.loading_version = version or 'LATEST'
+            self._loader = threading.Thread(target=self._load, args=(version, publish), name='model-loader',
+                                            daemon=True)
+            self._loader.start()
+            return True
+
+    def _load(self, version: Optional[str], publish: bool = False) -> None:
+        try:
+            self.activate(self.load_version(version))
+            if publish and version is not None:
+                set_latest(self.artifact_dir, version)
+            self.last_error = None
+        except Exception as e:
+            logger.exception(f"Loading model version {version or 'LATEST'} failed, keeping the active model")
+            self.last_error = str(e)
+        finally:
+            self.loading_version = None
+
+    def watch(self, interval: float) -> None:
+        """Poll the LATEST pointer and load new artifact versions as they appear
+
+        Lets every worker process pick up a version published by another
+        process (a refit or an offline build) without a restart. Each poll
+        also applies refresh, e.g. to add tracks ingested by other workers.
+        """
+        def poll():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll_once()
+                except Exception:
+                    logger.exception("Polling for model updates failed")
+
+        self._stop.clear()
+        threading.Thread(target=poll, name='model-watcher', daemon=True).start()
+
+    def poll_once(self) -> None:
+        """Start loading LATEST if it is not the active version, otherwise apply refresh"""
+        path = resolve_artifact(self.artifact_dir)
+        active = self._active
+        if active is None:
+            return
+        # Versions with ingested tracks are named '<artifact version>+<count>'
+        if path is not None and path.name != active.version.partition('+')[0]:
+            self.load_async()
+        elif self.refresh is not None:
+            self.update(self.refresh)
+
+    def stop(self) -> None:
+        """Stop the watch() thread after its current poll"""
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        recommender = self._active
+        return {
+            'version': recommender.version if recommender is not None else None,
+            'n_tracks': recommender.catalog.n_rows if recommender is not None else 0,
+            'index_type': recommender.index_type if recommender is not None else None,
+            'activated_at': self.activated_at,
+            'loading_version': self.loading_version,
+            'last_error': self.last_error
+        }
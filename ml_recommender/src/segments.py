@@ -0,0 +1,102 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+class Segmented:
+    """Read-only concatenation of a base block and a short block of appended rows
+
+    The base is typically memory-mapped from an artifact and shared between
+    worker processes; rows added while serving go to the delta block, so
+    appending costs the size of the delta rather than of the catalog, and
+    the base pages stay shared. Indexing with row ids reads from whichever
+    part holds each row. Blocks are dense arrays, CSR matrices or
+    catalog.StringColumn; merge() folds both parts into one (at refit or
+    when saving).
+    """
+
+    def __init__(self, base, delta):
+        self.base = base
+        self.delta = delta
+        self.n_base = base.shape[0] if hasattr(base, 'shape') else len(base)
+
+    @property
+    def shape(self):
+        return (self.n_base + self.delta.shape[0],) + tuple(self.base.shape[1:])
+
+    @property
+    def dtype(self):
+        return self.base.dtype
+
+    def __len__(self) -> int:
+        return self.n_base + (self.delta.shape[0] if hasattr(self.delta, 'shape') else len(self.delta))
+
+    def append(self, rows) -> 'Segmented':
+        """Return a block with rows appended to the delta; this one is left unchanged"""
+        return Segmented(self.base, stack([self.delta, rows]))
+
+    def _split(self, rows):
+        """Base rows, delta rows and the position of each requested row once both are stacked"""
+        rows = np.arange(len(self))[rows] if isinstance(rows, slice) else np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        in_delta = rows >= self.n_base
+        n_delta = np.count_nonzero(in_delta)
+        if not n_delta or in_delta[len(rows) - n_delta:].all():
+            # Delta rows all come last (e.g. sorted rows): stacking keeps the order
+            n_base_rows = len(rows) - n_delta
+            return rows[:n_base_rows], rows[n_base_rows:] - self.n_base, None
+        order = np.empty(len(rows), dtype=np.int64)
+        order[~in_delta] = np.arange(len(rows) - n_delta)
+        order[in_delta] = np.arange(len(rows) - n_delta, len(rows))
+        return rows[~in_delta], rows[in_delta] - self.n_base, order
+
+    def __getitem__(self, rows):
+        if np.ndim(rows) == 0 and not isinstance(rows, slice):
+            return self.base[rows] if rows < self.n_base else self.delta[rows - self.n_base]
+        base_rows, delta_rows, order = self._split(rows)
+        if not len(delta_rows):
+            return self.base[base_rows]
+        stacked = stack([self.base[base_rows], self.delta[delta_rows]])
+        return stacked if order is None else stacked[order]
+
+    def take(self, rows) -> list:
+        """StringColumn.take across both parts"""
+        base_rows, delta_rows, order = self._split(rows)
+        values = self.base.take(base_rows) + self.delta.take(delta_rows)
+        return values if order is None else [values[i] for i in order]
+
+    def to_numpy(self) -> np.ndarray:
+        return np.concatenate([self.base.to_numpy(), self.delta.to_numpy()])
+
+    def __matmul__(self, other):
+        return np.concatenate([np.asarray(self.base @ other), np.asarray(self.delta @ other)])
+
+    def __array__(self, dtype=None, copy=None):
+        merged = np.concatenate([np.asarray(self.base), np.asarray(self.delta)])
+        return merged if dtype is None else merged.astype(dtype)
+
+
+def stack(blocks):
+    """Concatenate row blocks of the same kind (dense, CSR or StringColumn)"""
+    if sp.issparse(blocks[0]):
+        return sp.vstack(blocks, format='csr', dtype=blocks[0].dtype)
+    if hasattr(blocks[0], 'concat'):
+        merged = blocks[0]
+        for block in blocks[1:]:
+            merged = merged.concat(block)
+        return merged
+    return np.concatenate(blocks)
+
+
+def append_rows(block, rows):
+    """block with rows appended, keeping the block itself as the shared base"""
+    if isinstance(block, Segmented):
+        return block.append(rows)
+    return Segmented(block, rows)
+
+
+def merge(block):
+    """One plain block holding all rows of block"""
+    if isinstance(block, Segmented):
+        return stack([block.base, block.delta])
+    return block
@@ -0,0 +1,47 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Select the k best rows of each score column
+
+    Uses partial selection (np.argpartition) instead of a full sort, then
+    orders the selection by score descending with ties broken by ascending
+    row id, so the result does not depend on the partition algorithm.
+    Accepts a vector or an (n_rows, n_queries) matrix and returns row ids
+    and scores shaped (k, n_queries), or (k,) for a vector.
+    """
+    vector = scores.ndim == 1
+    if vector:
+        scores = scores[:, None]
+    n_rows, n_queries = scores.shape
+    k = min(k, n_rows)
+    if k <= 0:
+        empty = np.empty((0, n_queries), dtype=np.int64)
+        return (empty[:, 0], scores[:0, 0]) if vector else (empty, scores[:0])
+
+    if k < n_rows:
+        selected = np.argpartition(-scores, k - 1, axis=0)[:k]
+        selected_scores = np.take_along_axis(scores, selected, axis=0)
+
+        # Rows tied with the k-th score may have been cut arbitrarily; re-select
+        # those columns from every row reaching the threshold
+        threshold = selected_scores.min(axis=0)
+        tied = (scores >= threshold).sum(axis=0) > k
+        for j in np.flatnonzero(tied):
+            rows = np.flatnonzero(scores[:, j] >= threshold[j])
+            order = np.lexsort((rows, -scores[rows, j]))[:k]
+            selected[:, j] = rows[order]
+        selected_scores = np.take_along_axis(scores, selected, axis=0)
+    else:
+        selected = np.repeat(np.arange(n_rows)[:, None], n_queries, axis=1)
+        selected_scores = scores
+
+    order = np.lexsort((selected, -selected_scores), axis=0)
+    selected = np.take_along_axis(selected, order, axis=0)
+    selected_scores = np.take_along_axis(selected_scores, order, axis=0)
+
+    if vector:
+        return selected[:, 0], selected_scores[:, 0]
+    return selected, selected_scores
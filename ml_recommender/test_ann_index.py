@@ -0,0 +1,77 @@
+import copy
+
+import numpy as np
+
+from ann_index import IVFIndex, build_index, recall_at_k
+from conftest import feature_seed
+
+
+def test_probing_every_partition_matches_exact_search(recommender, track_ids):
+    """Candidate rows are only a restriction: with every partition probed the results are exact"""
+    ivf = copy.copy(recommender)
+    ivf.index = build_index('ivf', recommender, n_lists=20, n_probe=20, popular_fraction=0.0)
+
+    rng = np.random.default_rng(1)
+    seeds = [{'track_id': track_id} for track_id in rng.choice(track_ids, 10)]
+    seeds += [feature_seed(rng) for _ in range(5)]
+    assert (ivf.find_similar_songs_batch(seeds, n_recommendations=10)
+            == recommender.find_similar_songs_batch(seeds, n_recommendations=10))
+
+
+def test_default_index_keeps_served_recall(recommender):
+    report = recall_at_k(recommender, build_index('ivf', recommender), k=10, n_queries=50)
+    assert report['recall@10'] >= 0.9
+    assert report['scanned_fraction'] < 0.5
+
+
+def test_partitions_scale_with_the_catalog(recommender):
+    index = build_index('ivf', recommender)
+    n_rows = recommender.catalog.n_rows
+    assert len(index.centroids) == round(np.sqrt(n_rows))
+    assert index.n_rows == n_rows
+    # Saved partitions rebuild the same inverted lists
+    rebuilt = build_index('ivf', recommender, partitions=(index.centroids, index.row_labels()))
+    np.testing.assert_array_equal(rebuilt.list_rows, index.list_rows)
+    np.testing.assert_array_equal(rebuilt.list_offsets, index.list_offsets)
+
+
+def test_popular_rows_are_candidates(recommender):
+    index = build_index('ivf', recommender, n_probe=1, popular_fraction=0.1, popular_probe=3)
+    popularity = np.asarray(recommender.catalog.popularity)
+    tier = np.flatnonzero(popularity >= index.tier_threshold)
+    assert len(tier) >= 0.1 * len(popularity)
+    assert len(index.popular_rows) == np.ceil(0.1 * len(popularity))
+    assert (np.delete(popularity, index.popular_rows) <= index.popular_threshold).all()
+
+    query_audio, query_lyrics = recommender.build_queries([feature_seed(np.random.default_rng(2))])
+    candidates = index.candidates(query_audio[:, 0], query_lyrics[:, 0])
+    assert np.all(np.diff(candidates) > 0)
+    # The head for every query, and the popular rows of the popular_probe closest partitions
+    assert np.isin(index.popular_rows, candidates).all()
+    probed = index.probe(query_audio[:, 0], query_lyrics[:, 0], 3)
+    labels = index.row_labels()
+    assert np.isin(tier[np.isin(labels[tier], probed)], candidates).all()
+
+
+def test_popular_head_is_capped_by_row_count(recommender):
+    index = build_index('ivf', recommender, popular_fraction=0.5, max_popular=40)
+    popularity = np.asarray(recommender.catalog.popularity)
+    assert len(index.popular_rows) == 40
+    # Ties at the cut keep the lowest rows
+    at_threshold = np.flatnonzero(popularity == index.popular_threshold)
+    kept = np.intersect1d(at_threshold, index.popular_rows)
+    np.testing.assert_array_equal(kept, at_threshold[:len(kept)])
+
+
+def test_extended_index_covers_appended_rows():
+    centroids = np.eye(3)
+    index = IVFIndex(centroids, labels=[0, 1, 2, 0], n_audio_features=3, n_probe=1,
+                     popularity=np.array([10, 20, 30, 90]), popular_fraction=0.25, popular_probe=1)
+    # The new rows are nearest to partitions 1 and 2
+    extended = index.extend(np.array([[0.1, 0.9, 0.0], [0.0, 0.2, 0.8]]), popularity=np.array([95, 5]))
+    np.testing.assert_array_equal(extended.row_labels(), [0, 1, 2, 0, 1, 2])
+
+    # Row 5 (cluster 2) is probed, row 4 (cluster 1) is popular, row 3 was popular already
+    np.testing.assert_array_equal(extended.candidates(np.array([0.0, 0.0, 1.0])), [2, 3, 4, 5])
+    # The original index is unchanged and still covers only its own rows
+    np.testing.assert_array_equal(index.candidates(np.array([0.0, 0.0, 1.0])), [2, 3])
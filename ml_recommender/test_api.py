@@ -0,0 +1,212 @@
+import asyncio
+import copy
+import json
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from data_processor import DataProcessor
+from executor import BoundedExecutor
+from feature_store import load_latest, resolve_artifact, save_artifact
+from ingest import TRACK_COLUMNS, IngestLog
+
+
+@pytest.fixture(scope='module')
+def api(prepared, catalog_csv, tmp_path_factory):
+    """The API module serving an artifact of the prepared recommender, and a test client"""
+    from fastapi.testclient import TestClient
+
+    artifact_dir = tmp_path_factory.mktemp('artifacts')
+    save_artifact(prepared, artifact_dir)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('RECOMMENDER_ARTIFACT_DIR', str(artifact_dir))
+        mp.setenv('RECOMMENDER_DATA_PATH', str(catalog_csv))
+        mp.setenv('RECOMMENDER_INGEST_LOG', str(artifact_dir / 'ingested_tracks.csv'))
+        mp.setenv('RECOMMENDER_CACHE_SIZE', '64')
+        mp.syspath_prepend(str(ROOT / 'src' / 'api'))
+        sys.modules.pop('main', None)
+        import main
+        with TestClient(main.app) as client:
+            yield main, client
+
+
+def make_stale(artifact_dir):
+    """Rewrite the LATEST artifact's manifest as if an older release had written it"""
+    path = resolve_artifact(artifact_dir)
+    manifest = json.loads((path / 'manifest.json').read_text())
+    manifest['format_version'] -= 1
+    (path / 'manifest.json').write_text(json.dumps(manifest))
+    return manifest['version']
+
+
+def recommend(client, track_ids, headers=None, **fields):
+    body = {'songs': [{'spotify_id': track_id} for track_id in track_ids], 'n_recommendations': 5}
+    body.update(fields)
+    return client.post('/recommend', json=body, headers=headers)
+
+
+def test_cached_results_are_invalidated_by_a_new_model_version(api, track_ids):
+    main, client = api
+    original = main.registry.active
+    first = recommend(client, track_ids[:2])
+    assert first.status_code == 200
+    hits = client.get('/cache').json()['hits']
+
+    cached = recommend(client, track_ids[:2])
+    assert cached.json() == first.json()
+    assert client.get('/cache').json()['hits'] == hits + 1
+
+    swapped = copy.copy(original)
+    swapped.version = original.version + '-test'
+    main.registry.activate(swapped)
+    try:
+        fresh = recommend(client, track_ids[:2])
+        assert fresh.json()['model_version'] == swapped.version
+        assert client.get('/cache').json()['hits'] == hits + 1
+    finally:
+        main.registry.activate(original)
+
+
+def test_seeds_are_resolved_by_spotify_id(api, track_ids):
+    _, client = api
+    response = recommend(client, [track_ids[0], 'not-in-the-catalog'])
+    assert response.status_code == 200
+    assert response.json()['unresolved'] == ['not-in-the-catalog']
+    recommended = [rec['track_id'] for rec in response.json()['recommendations']]
+    assert len(recommended) == 5 and track_ids[0] not in recommended
+
+
+def test_saturated_executor_rejects_with_429(api, track_ids, monkeypatch):
+    main, client = api
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    monkeypatch.setattr(main, 'scoring_executor', executor)
+    release = threading.Event()
+    busy = threading.Thread(target=lambda: asyncio.run(executor.run(release.wait)))
+    busy.start()
+    try:
+        while executor.pending < 1:
+            time.sleep(0.001)
+        # A user_id skips the result cache, so the request needs the executor
+        response = recommend(client, track_ids[:2], user_id='saturated')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/executor').json()['rejected'] == 1
+    finally:
+        release.set()
+        busy.join()
+    # The slot is freed once the work finishes
+    assert recommend(client, track_ids[:2], user_id='saturated').status_code == 200
+    executor.shutdown()
+
+
+def test_ingested_tracks_are_served_and_followed(api, new_tracks):
+    main, client = api
+    original = main.registry.active
+    payload = {'tracks': json.loads(new_tracks.iloc[:4][TRACK_COLUMNS].to_json(orient='records'))}
+    try:
+        response = client.post('/tracks', json=payload)
+        assert response.json()['added'] == 4
+        assert main.registry.active.catalog.contains(new_tracks['track_id'].iloc[:4]).all()
+
+        # Tracks another worker logged are picked up on the next poll, and logged tracks are not added again
+        IngestLog(main.INGEST_LOG).append(new_tracks.iloc[4:6])
+        main.registry.update(main.follow_ingest_log)
+        assert main.registry.active.catalog.contains(new_tracks['track_id'].iloc[:6]).all()
+        assert client.post('/tracks', json=payload).json()['added'] == 0
+        assert len(main.ingest_log.read()) == 6
+
+        seeds = recommend(client, [new_tracks['track_id'].iloc[5]])
+        assert seeds.json()['unresolved'] == []
+        assert seeds.json()['model_version'] == main.registry.active.version
+    finally:
+        main.registry.activate(original)
+
+
+def test_refit_compacts_the_ingest_log_it_covers(api, new_tracks):
+    main, _ = api
+    log = IngestLog(main.INGEST_LOG)
+    if log.read().empty:
+        log.append(new_tracks.iloc[:6])
+    logged = log.read()
+    refitted = main.refit_model()
+
+    manifest = json.loads((resolve_artifact(main.ARTIFACT_DIR) / 'manifest.json').read_text())
+    assert manifest['version'] == refitted.version
+    assert manifest['ingest_offset'] == refitted.ingest_offset == log.read_since(0)[1]
+    # Covered rows left the live log, but the next refit still reads them
+    assert log.read_since(refitted.ingest_offset)[0].empty
+    assert len(pd.read_csv(log.path)) == 0
+    assert list(log.read()['track_id']) == list(logged['track_id'])
+
+    # A worker starting from the artifact has nothing to replay until new tracks are logged
+    loaded = load_latest(main.ARTIFACT_DIR, DataProcessor(main.DATA_PATH))
+    assert loaded.catalog.contains(logged['track_id']).all()
+    assert main.replay_ingest_log(loaded) is loaded
+    log.append(new_tracks.iloc[6:7])
+    assert main.replay_ingest_log(loaded).catalog.contains(new_tracks['track_id'].iloc[6:7]).all()
+
+
+def test_stale_artifact_falls_back_to_a_rebuild(prepared, catalog_csv, tmp_path, monkeypatch, caplog):
+    save_artifact(prepared, tmp_path)
+    stale_version = make_stale(tmp_path)
+    monkeypatch.setenv('RECOMMENDER_ARTIFACT_DIR', str(tmp_path))
+    monkeypatch.setenv('RECOMMENDER_DATA_PATH', str(catalog_csv))
+    monkeypatch.setenv('RECOMMENDER_INGEST_LOG', str(tmp_path / 'ingested_tracks.csv'))
+    monkeypatch.syspath_prepend(str(ROOT / 'src' / 'api'))
+    monkeypatch.delitem(sys.modules, 'main', raising=False)
+
+    with caplog.at_level('WARNING'):
+        import main
+    assert main.registry.active.version != stale_version
+    assert main.registry.active.catalog.n_rows == prepared.catalog.n_rows
+    assert 'format version' in caplog.text
+
+
+def parse_timing(header):
+    return {stage: float(duration) for stage, duration in
+            (entry.split(';dur=') for entry in header.split(', '))}
+
+
+def parse_samples(text):
+    """Prometheus text format as {sample name with labels: value}"""
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+def test_debug_timing_header_breaks_down_scored_requests_only(api, track_ids):
+    _, client = api
+    assert 'X-Debug-Timing' not in recommend(client, track_ids[2:4], user_id='timed').headers
+
+    scored = recommend(client, track_ids[2:4], user_id='timed', headers={'X-Debug-Timing': '1'})
+    timings = parse_timing(scored.headers['X-Debug-Timing'])
+    assert {'queries', 'candidates', 'filter', 'scoring', 'top_k', 'response', 'total'} <= set(timings)
+    assert all(duration >= 0 for duration in timings.values())
+    assert sum(duration for stage, duration in timings.items() if stage != 'total') <= timings['total']
+
+    recommend(client, track_ids[4:6])
+    cached = recommend(client, track_ids[4:6], headers={'X-Debug-Timing': 'true'})
+    assert list(parse_timing(cached.headers['X-Debug-Timing'])) == ['total']
+
+
+def test_metrics_count_requests_in_cumulative_buckets(api, track_ids):
+    _, client = api
+    before = parse_samples(client.get('/metrics').text)
+    recommend(client, track_ids[6:8])
+    recommend(client, track_ids[6:8])
+
+    response = client.get('/metrics')
+    assert response.headers['content-type'].startswith('text/plain')
+    assert '# TYPE recommender_request_seconds histogram' in response.text
+    after = parse_samples(response.text)
+    for cache in ('hit', 'miss'):
+        requests = f'recommender_requests_total{{cache="{cache}",status="200"}}'
+        assert after[requests] == before.get(requests, 0) + 1
+        buckets = [value for name, value in after.items()
+                   if name.startswith(f'recommender_request_seconds_bucket{{cache="{cache}",')]
+        assert buckets == sorted(buckets)
+        assert buckets[-1] == after[f'recommender_request_seconds_count{{cache="{cache}"}}']
+    assert after['recommender_cache_hits_total'] >= 1
@@ -0,0 +1,46 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.metrics import adjusted_rand_score
+
+from clustering import align_centroids, fit_clusters, inertia, nearest_centroid
+
+
+def test_align_centroids_maps_shared_terms_and_zeroes_new_ones():
+    # Two audio columns, then one column per term of the old vocabulary
+    centroids = np.array([[0.1, 0.2, 1.0, 2.0, 3.0],
+                          [0.3, 0.4, 4.0, 5.0, 6.0]])
+    old_vocabulary = {'love': 0, 'night': 1, 'rain': 2}
+    new_vocabulary = {'rain': 0, 'fire': 1, 'love': 2}
+
+    aligned = align_centroids(centroids, 2, old_vocabulary, new_vocabulary)
+    np.testing.assert_array_equal(aligned, [[0.1, 0.2, 3.0, 0.0, 1.0],
+                                            [0.3, 0.4, 6.0, 0.0, 4.0]])
+    # Nothing in common: only the audio columns carry over
+    np.testing.assert_array_equal(align_centroids(centroids, 2, old_vocabulary, {'sun': 0}),
+                                  [[0.1, 0.2, 0.0], [0.3, 0.4, 0.0]])
+
+
+def test_nearest_centroid_matches_the_kmeans_assignment():
+    rng = np.random.default_rng(4)
+    audio = rng.random((200, 3))
+    lyrics = sp.random(200, 12, density=0.2, format='csr', random_state=5)
+    matrix = sp.hstack([sp.csr_matrix(audio), lyrics]).tocsr()
+    labels, centroids = fit_clusters(matrix, n_clusters=6)
+
+    distances = ((matrix.toarray()[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+    np.testing.assert_array_equal(nearest_centroid(centroids, audio, lyrics), distances.argmin(axis=1))
+    np.testing.assert_array_equal(nearest_centroid(centroids, audio, lyrics), labels)
+    # Audio-only rows ignore the lyrics columns of the centroids
+    audio_distances = ((audio[:, None, :] - centroids[None, :, :3]) ** 2).sum(axis=2) + \
+        (centroids[None, :, 3:] ** 2).sum(axis=2)
+    np.testing.assert_array_equal(nearest_centroid(centroids, audio), audio_distances.argmin(axis=1))
+
+
+def test_warm_start_from_converged_centroids_keeps_the_clustering():
+    rng = np.random.default_rng(6)
+    matrix = np.vstack([rng.normal(center, 0.1, size=(60, 2)) for center in ([0, 0], [3, 0], [0, 3])])
+    for method in ('kmeans', 'minibatch'):
+        labels, centroids = fit_clusters(matrix, n_clusters=3, method=method)
+        warm_labels, warm_centroids = fit_clusters(matrix, n_clusters=3, method=method, init=centroids)
+        assert adjusted_rand_score(labels, warm_labels) == 1.0
+        assert inertia(matrix, warm_labels, warm_centroids) <= inertia(matrix, labels, centroids) * 1.01
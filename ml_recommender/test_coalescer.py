@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import pytest
+
+from coalescer import RequestCoalescer
+from executor import BoundedExecutor, Saturated
+
+
+class RecordingBatch:
+    """Batch function that records each batch and fails on items marked 'bad'"""
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, key, items):
+        with self.lock:
+            self.batches.append((key, list(items)))
+        if 'bad' in items:
+            raise ValueError('bad item')
+        return [f'{key}:{item}' for item in items]
+
+
+def test_concurrent_items_are_batched_and_fanned_out():
+    batch_fn = RecordingBatch()
+    executor = BoundedExecutor(max_workers=1, max_queue=64)
+    coalescer = RequestCoalescer(batch_fn, executor, max_batch=8, max_wait=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(*(coalescer.submit('model', i) for i in range(20)))
+
+    try:
+        assert asyncio.run(submit_all()) == [f'model:{i}' for i in range(20)]
+    finally:
+        executor.shutdown()
+    sizes = [len(items) for _, items in batch_fn.batches]
+    assert sum(sizes) == 20 and max(sizes) == 8 and len(sizes) < 20
+    assert coalescer.stats()['batches'] == len(sizes)
+
+
+def test_batches_never_mix_keys():
+    batch_fn = RecordingBatch()
+    executor = BoundedExecutor(max_workers=2, max_queue=64)
+    coalescer = RequestCoalescer(batch_fn, executor, max_batch=32, max_wait=0.01)
+    old, new = object(), object()
+
+    async def submit_all():
+        return await asyncio.gather(*(coalescer.submit(old if i % 2 else new, i) for i in range(10)))
+
+    try:
+        results = asyncio.run(submit_all())
+    finally:
+        executor.shutdown()
+    assert results == [f'{old if i % 2 else new}:{i}' for i in range(10)]
+    assert sorted(len(items) for _, items in batch_fn.batches) == [5, 5]
+    for key, items in batch_fn.batches:
+        assert all((i % 2 == 1) == (key is old) for i in items)
+
+
+def test_failed_batch_is_retried_item_by_item():
+    batch_fn = RecordingBatch()
+    executor = BoundedExecutor(max_workers=1, max_queue=64)
+    coalescer = RequestCoalescer(batch_fn, executor, max_batch=8, max_wait=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(*(coalescer.submit('model', item) for item in ['a', 'bad', 'b']),
+                                    return_exceptions=True)
+
+    try:
+        good, bad, other = asyncio.run(submit_all())
+    finally:
+        executor.shutdown()
+    assert (good, other) == ('model:a', 'model:b')
+    assert isinstance(bad, ValueError)
+    assert batch_fn.batches[0][1] == ['a', 'bad', 'b']
+    assert sorted(items[0] for _, items in batch_fn.batches[1:]) == ['a', 'b', 'bad']
+
+
+def test_full_wait_queue_rejects():
+    executor = BoundedExecutor(max_workers=1, max_queue=2)
+    coalescer = RequestCoalescer(RecordingBatch(), executor, max_batch=8, max_wait=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(*(coalescer.submit('model', i) for i in range(3)),
+                                    return_exceptions=True)
+
+    try:
+        results = asyncio.run(submit_all())
+    finally:
+        executor.shutdown()
+    assert results[:2] == ['model:0', 'model:1']
+    assert isinstance(results[2], Saturated)
+    assert coalescer.stats()['rejected'] == 1
+
+
+def test_coalesced_requests_match_single_requests(recommender, track_ids):
+    """Requests scored in one grouped batch get the results they get on their own"""
+    groups = [{'seeds': [{'track_id': track_id}], 'n_recommendations': 5} for track_id in track_ids[:6]]
+    batch_fn = lambda model, items: model.find_similar_songs_grouped(items)
+    executor = BoundedExecutor(max_workers=1, max_queue=64)
+    coalescer = RequestCoalescer(batch_fn, executor, max_batch=8, max_wait=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(*(coalescer.submit(recommender, group) for group in groups))
+
+    try:
+        coalesced = asyncio.run(submit_all())
+    finally:
+        executor.shutdown()
+    assert coalescer.stats()['batches'] == 1
+    for group, (recs,) in zip(groups, coalesced):
+        expected = recommender.find_similar_songs_grouped([group])[0][0]
+        assert [rec['track_id'] for rec in recs] == [rec['track_id'] for rec in expected]
+        assert [rec['similarity_score'] for rec in recs] == pytest.approx(
+            [rec['similarity_score'] for rec in expected], rel=1e-9)
@@ -0,0 +1,75 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import columnar
+from data.columnar import PARSED_DATE_COLUMN, convert, iter_table, read_table, resolve
+from data.data_loader import DataLoader
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def songs_csv(catalog_csv, tmp_path):
+    return shutil.copy(catalog_csv, tmp_path / 'songs.csv')
+
+
+def age(path, seconds):
+    """Move a file's modification time back by some seconds"""
+    modified = os.stat(path).st_mtime - seconds
+    os.utime(path, (modified, modified))
+
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.feather'])
+def test_columnar_copy_is_created_and_read_instead_of_the_csv(songs_csv, tmp_path, suffix):
+    from_csv = read_table(songs_csv)
+    assert resolve(songs_csv) == songs_csv
+
+    copy = convert(songs_csv, tmp_path / f'songs{suffix}')
+    assert copy.exists() and resolve(songs_csv) == copy
+    assert not list(tmp_path.glob('*.tmp'))
+    from_copy = read_table(songs_csv)
+    pd.testing.assert_frame_equal(from_copy.drop(columns=PARSED_DATE_COLUMN), from_csv)
+    assert from_copy[PARSED_DATE_COLUMN].notna().all()
+    assert isinstance(from_copy['playlist_genre'].dtype, pd.CategoricalDtype)
+
+    projected = read_table(songs_csv, ['energy', 'track_id', 'not_a_column'])
+    assert sorted(projected.columns) == ['energy', 'track_id']
+    chunks = list(iter_table(songs_csv, ['energy'], chunksize=500))
+    assert [len(chunk) for chunk in chunks] == [500, 500, 500]
+    assert chunks[0]['energy'].dtype == np.float32
+
+
+def test_columnar_copy_newer_than_the_csv_is_reused(songs_csv, monkeypatch):
+    copy = convert(songs_csv)
+    age(songs_csv, 10)
+    written = copy.stat().st_mtime_ns
+    monkeypatch.setattr(columnar, 'convert', lambda *args: pytest.fail('an up to date copy was rebuilt'))
+
+    assert len(read_table(songs_csv)) == len(pd.read_csv(songs_csv))
+    assert copy.stat().st_mtime_ns == written
+
+
+def test_columnar_copy_is_rebuilt_once_the_csv_is_newer(songs_csv):
+    copy = convert(songs_csv)
+    age(copy, 10)
+    pd.read_csv(songs_csv).head(100).to_csv(songs_csv, index=False)
+
+    assert len(read_table(songs_csv)) == 100
+    assert copy.stat().st_mtime >= os.stat(songs_csv).st_mtime
+    assert len(pd.read_parquet(copy)) == 100
+    assert len(DataLoader(songs_csv).load_data(['track_id'])) == 100
+
+
+def test_text_columns_are_filled_whatever_their_string_dtype(songs_csv):
+    loader = DataLoader(songs_csv)
+    data = loader.load_data(['track_id', 'lyrics', 'energy'])
+    data.loc[:9, 'lyrics'] = None
+    data['track_id'] = data['track_id'].astype('string')
+    data.loc[:4, 'track_id'] = pd.NA
+    processed = loader.preprocess_data()
+    assert (processed['lyrics'].iloc[:10] == '').all()
+    assert (processed['track_id'].iloc[:5] == '').all()
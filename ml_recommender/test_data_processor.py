@@ -0,0 +1,50 @@
+import numpy as np
+
+import lyrics_pipeline
+from data_processor import DataProcessor, _lemma
+from lyrics_pipeline import LyricsPreprocessor
+
+LYRICS = ['Dancing all night with the stars', 'Hearts breaking in the rain', np.nan,
+          'Dancing all night with the stars', 'Running home to you']
+
+
+def preprocess(cache_path, lyrics=LYRICS):
+    """Lyrics processed by a fresh DataProcessor sharing the cache file, and its preprocessor"""
+    preprocessor = LyricsPreprocessor(DataProcessor(None), cache_path=cache_path, n_jobs=1)
+    return preprocessor.process(lyrics), preprocessor
+
+
+def test_processed_lyrics_are_cached_across_processors(tmp_path):
+    cache_path = str(tmp_path / 'lyrics.db')
+    first, preprocessor = preprocess(cache_path)
+    assert (preprocessor.cache_hits, preprocessor.cache_misses) == (0, 3)
+    assert first[2] == '' and first[0] == first[3]
+    assert first[1] == preprocessor.data_processor.preprocess_lyrics(LYRICS[1])
+
+    second, preprocessor = preprocess(cache_path)
+    assert second == first
+    assert (preprocessor.cache_hits, preprocessor.cache_misses) == (3, 0)
+
+    _, preprocessor = preprocess(cache_path, LYRICS + ['Something new'])
+    assert (preprocessor.cache_hits, preprocessor.cache_misses) == (3, 1)
+
+
+def test_lyrics_cache_is_invalidated_when_the_preprocessing_changes(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'lyrics.db')
+    original, _ = preprocess(cache_path)
+
+    monkeypatch.setattr(DataProcessor, 'preprocess_lyrics', lambda self, text: text.upper())
+    monkeypatch.setattr(lyrics_pipeline, 'PIPELINE_VERSION', lyrics_pipeline.PIPELINE_VERSION + '-upper')
+    changed, preprocessor = preprocess(cache_path)
+    assert (preprocessor.cache_hits, preprocessor.cache_misses) == (0, 3)
+    assert changed[0] == LYRICS[0].upper() != original[0]
+    assert changed[2] == ''
+
+
+def test_lemmas_are_memoized_by_token_across_processors():
+    _lemma.cache_clear()
+    first, second = DataProcessor(None), DataProcessor(None)
+    assert first.lemmatize('hearts') == 'heart'
+    assert second.lemmatize('hearts') == 'heart'
+    info = _lemma.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
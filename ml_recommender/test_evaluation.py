@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from evaluation import evaluate, ranking_metrics, track_labels
+
+
+class FixedRecommender:
+    """Recommender double returning canned recommendations per seed track"""
+
+    def __init__(self, playlists, recommendations):
+        self.df = pd.DataFrame({'track_id': list(playlists), 'playlist_id': list(playlists.values())})
+        self.catalog = self
+        self.recommendations = recommendations
+
+    def ids(self):
+        return self.df['track_id'].to_numpy()
+
+    def find_similar_songs_grouped(self, groups):
+        return [[[{'track_id': track_id} for track_id in self.recommendations[group['seeds'][0]['track_id']]]]
+                for group in groups]
+
+
+def test_ranking_metrics_match_hand_computed_values():
+    metrics = ranking_metrics(np.array([[1, 0, 1, 0, 0]], dtype=bool), np.array([3]), [5])
+    assert metrics['precision@5'] == pytest.approx(0.4)
+    assert metrics['recall@5'] == pytest.approx(2 / 3)
+    # DCG 1 + 1/log2(4) over the ideal 1 + 1/log2(3) + 1/log2(4)
+    assert metrics['ndcg@5'] == pytest.approx(0.7039, abs=1e-4)
+    # Precision at the two hits, (1/1 + 2/3), over the 3 relevant tracks
+    assert metrics['map@5'] == pytest.approx(0.5556, abs=1e-4)
+    assert metrics['hit_rate@5'] == 1.0
+
+
+def test_repeated_recommendations_count_once():
+    recommender = FixedRecommender(
+        {'a': 'p1', 'b': 'p1', 'c': 'p1', 'd': 'p2', 'e': 'p2'},
+        {'a': ['b', 'b', 'c'], 'b': ['a', 'a', 'a'], 'c': ['d', 'a', 'b'], 'd': ['e'], 'e': []}
+    )
+    results = evaluate(recommender, 'playlist', ks=(1, 3), n_jobs=1)
+
+    relevant = np.array([[1, 0, 1], [1, 0, 0], [0, 1, 1], [1, 0, 0], [0, 0, 0]], dtype=bool)
+    expected = ranking_metrics(relevant, np.array([2, 2, 2, 1, 1]), (1, 3))
+    for metric, value in expected.items():
+        assert results[metric] == pytest.approx(value), metric
+    assert results['precision@3'] == pytest.approx(6 / 15)
+    assert results['queries'] == 5
+    # Every track is recommended somewhere in the top 3, but a and b both lead with b
+    assert results['coverage@3'] == 1.0
+    assert results['coverage@1'] == pytest.approx(4 / 5)
+
+
+def test_tracks_without_a_shared_label_are_not_queries():
+    recommender = FixedRecommender({'a': 'p1', 'b': 'p1', 'c': 'p2'}, {'a': ['b'], 'b': ['c'], 'c': ['a']})
+    track_ids, incidence = track_labels(recommender)
+    assert list(track_ids) == ['a', 'b', 'c'] and incidence.shape == (3, 2)
+    results = evaluate(recommender, 'playlist', ks=(1,), n_jobs=1)
+    assert results['queries'] == 2
+    assert results['precision@1'] == pytest.approx(0.5)
+
+    with pytest.raises(ValueError):
+        evaluate(FixedRecommender({'a': 'p1', 'b': 'p2'}, {}), 'playlist', n_jobs=1)
+
+
+def test_model_evaluation_delegates_to_evaluate(recommender):
+    options = dict(n_queries=50, batch_size=16, n_jobs=1)
+    results = recommender.evaluate_recommendations('artist', (5, 10), **options)
+    expected = evaluate(recommender, 'artist', (5, 10), **options)
+    assert 'ground_truth' not in results
+    assert set(results) == set(expected) - {'ground_truth'}
+    for metric, value in results.items():
+        if metric != 'queries_per_second':
+            assert value == pytest.approx(expected[metric]), metric
@@ -0,0 +1,50 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import feature_seed
+from data_processor import DataProcessor
+from feature_store import load_artifact, load_latest, resolve_artifact, save_artifact
+from model import new_version
+
+
+def test_artifact_round_trip(recommender, track_ids, tmp_path):
+    """A loaded artifact serves the same recommendations as the model that was saved"""
+    path = save_artifact(recommender, tmp_path)
+    assert resolve_artifact(tmp_path) == path
+
+    loaded = load_latest(tmp_path, DataProcessor('unused.csv'), metadata=False)
+    assert loaded.version == recommender.version
+    assert loaded.df is None
+    assert isinstance(loaded.features, np.memmap)
+    np.testing.assert_array_equal(loaded.features, recommender.features)
+    np.testing.assert_array_equal(loaded.clusters, recommender.clusters)
+    assert (loaded.lyrics_features != recommender.lyrics_features).nnz == 0
+
+    rng = np.random.default_rng(0)
+    seeds = [{'track_id': track_id} for track_id in rng.choice(track_ids, 5)]
+    seeds += [feature_seed(rng) for _ in range(3)]
+    assert (loaded.find_similar_songs_batch(seeds, n_recommendations=10)
+            == recommender.find_similar_songs_batch(seeds, n_recommendations=10))
+
+
+def test_artifact_versions_are_immutable(recommender, tmp_path):
+    save_artifact(recommender, tmp_path)
+    with pytest.raises(FileExistsError):
+        save_artifact(recommender, tmp_path)
+
+
+def test_stale_artifact_format_is_rejected(recommender, tmp_path):
+    path = save_artifact(recommender, tmp_path)
+    manifest = json.loads((path / 'manifest.json').read_text())
+    manifest['format_version'] -= 1
+    (path / 'manifest.json').write_text(json.dumps(manifest))
+    with pytest.raises(ValueError, match='format version'):
+        load_artifact(path, DataProcessor('unused.csv'))
+
+
+def test_versions_built_in_the_same_second_differ():
+    versions = [new_version() for _ in range(1000)]
+    assert len(set(versions)) == len(versions)
+    assert [version.split('-')[0] for version in versions] == sorted(version.split('-')[0] for version in versions)
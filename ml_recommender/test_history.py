@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+import history
+from history import InMemoryHistoryStore, SQLiteHistoryStore
+
+
+class Clock:
+    """Stand-in for the time module whose clocks only move when told to"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(history, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(**options):
+        if request.param == 'memory':
+            return InMemoryHistoryStore(**options)
+        return SQLiteHistoryStore(str(tmp_path / 'history.db'), **options)
+    return make
+
+
+def test_history_is_capped_to_the_most_recent_items(make_store):
+    store = make_store(max_items=5)
+    store.add('u', [f't{i}' for i in range(4)])
+    store.add('u', [f't{i}' for i in range(4, 8)])
+    assert store.get('u') == ['t3', 't4', 't5', 't6', 't7']
+    assert store.get('other') == []
+
+    store.clear('u')
+    assert store.get('u') == []
+
+
+def test_history_expires_after_the_ttl(make_store, clock):
+    store = make_store(ttl=60)
+    store.add('u', ['old'])
+    clock.now += 30
+    assert store.get('u') == ['old']
+
+    clock.now += 61
+    assert store.get('u') == []
+    store.add('u', ['new'])
+    assert store.get('u') == ['new']
+
+
+def test_in_memory_store_evicts_least_recently_used_users():
+    store = InMemoryHistoryStore(max_users=2)
+    store.add('a', ['t1'])
+    store.add('b', ['t2'])
+    store.get('a')  # reading counts as use, so b is now the oldest
+    store.add('c', ['t3'])
+    assert len(store) == 2
+    assert store.get('b') == []
+    assert store.get('a') == ['t1'] and store.get('c') == ['t3']
+
+
+def test_sqlite_history_persists_across_store_instances(tmp_path, clock):
+    path = str(tmp_path / 'history.db')
+    SQLiteHistoryStore(path, max_items=3).add('u', ['t1', 't2', 't3', 't4'])
+    reopened = SQLiteHistoryStore(path, max_items=3, ttl=60)
+    assert reopened.get('u') == ['t2', 't3', 't4']
+    # Trimming on add kept the table bounded, not just the reads
+    assert reopened._conn.execute('SELECT COUNT(*) FROM history').fetchone()[0] == 3
+
+    clock.now += 120
+    reopened.add('v', ['t5'])
+    reopened.purge_expired()
+    assert SQLiteHistoryStore(path).get('u') == []
+    assert SQLiteHistoryStore(path).get('v') == ['t5']
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_concurrent_writers_lose_nothing(kind, tmp_path):
+    if kind == 'memory':
+        stores = [InMemoryHistoryStore(max_items=1000)] * 4
+    else:
+        # Every writer has its own connection to the same file, like separate worker processes
+        stores = [SQLiteHistoryStore(str(tmp_path / 'history.db'), max_items=1000) for _ in range(4)]
+
+    def write(worker):
+        for i in range(25):
+            stores[worker].add('shared', [f'w{worker}-{i}'])
+            stores[worker].add(f'user{worker}', [f'{i}'])
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    shared = stores[0].get('shared')
+    assert sorted(shared) == sorted(f'w{worker}-{i}' for worker in range(4) for i in range(25))
+    for worker in range(4):
+        # Each writer's own appends keep their order
+        assert [track for track in shared if track.startswith(f'w{worker}-')] == \
+            [f'w{worker}-{i}' for i in range(25)]
+        assert stores[0].get(f'user{worker}') == [f'{i}' for i in range(25)]
@@ -0,0 +1,109 @@
+import copy
+import os
+
+import numpy as np
+import pytest
+
+from conftest import N_TRACKS, feature_seed
+from data_processor import DataProcessor
+from feature_store import load_latest, save_artifact
+from ingest import IngestLog
+from segments import Segmented
+
+
+@pytest.mark.parametrize('index_type', ['exact', 'ivf'])
+def test_added_tracks_match_a_merged_rebuild(prepared, new_tracks, tmp_path, index_type):
+    """Tracks added to a memory-mapped model are served as if the blocks were merged"""
+    save_artifact(prepared, tmp_path)
+    loaded = load_latest(tmp_path, DataProcessor('unused.csv'), metadata=False, index_type=index_type)
+    updated = loaded.add_tracks(new_tracks.iloc[:100]).add_tracks(new_tracks.iloc[50:])
+
+    # The mapped base is shared, not copied, and the loaded model is unchanged
+    assert isinstance(updated.features, Segmented) and updated.features.base is loaded.features
+    assert loaded.catalog.n_rows == N_TRACKS
+    assert updated.catalog.n_rows == N_TRACKS + len(new_tracks)
+    assert updated.catalog.row_of(new_tracks['track_id'].iloc[-1]) == N_TRACKS + len(new_tracks) - 1
+
+    # Same rows and the same (extended) index, with every block merged into one array
+    reference = copy.copy(updated)
+    reference.merge_delta()
+    assert isinstance(reference.features, np.ndarray)
+
+    rng = np.random.default_rng(9)
+    ids = reference.catalog.ids()
+    seeds = [{'track_id': track_id} for track_id in rng.choice(ids, 10)]
+    seeds += [{'track_id': track_id} for track_id in new_tracks['track_id'].iloc[-5:]]
+    seeds += [feature_seed(rng) for _ in range(3)]
+    groups = [{'seeds': seeds[i:i + 6], 'n_recommendations': 10,
+               'exclude_songs': list(new_tracks['track_id'].iloc[:5])} for i in range(0, len(seeds), 6)]
+    expected = reference.find_similar_songs_grouped(groups)
+    assert updated.find_similar_songs_grouped(groups) == expected
+
+    # Saving folds the added rows into the new artifact. Loading it keeps the IVF
+    # partitions but picks the always-scanned popular rows again over every row
+    save_artifact(updated, tmp_path)
+    reloaded = load_latest(tmp_path, DataProcessor('unused.csv'), metadata=False, index_type=index_type)
+    assert reloaded.version == updated.version
+    if index_type == 'ivf':
+        np.testing.assert_array_equal(reloaded.index.row_labels(), updated.index.row_labels())
+        reference.build_index(partitions=(updated.index.centroids, updated.index.row_labels()))
+    assert reloaded.find_similar_songs_grouped(groups) == reference.find_similar_songs_grouped(groups)
+
+
+def test_known_tracks_are_not_added_again(recommender, new_tracks, track_ids):
+    updated = recommender.add_tracks(new_tracks.iloc[:10])
+    again = updated.add_tracks(new_tracks.iloc[:10])
+    assert again is updated
+    assert updated.add_tracks(new_tracks.iloc[:10].assign(track_id=track_ids[:10])) is updated
+
+
+def test_segmented_rows_read_from_both_parts():
+    base, delta = np.arange(12.0).reshape(6, 2), np.arange(100.0, 106.0).reshape(3, 2)
+    block = Segmented(base, delta).append(np.array([[200.0, 201.0]]))
+    merged = np.concatenate([base, delta, [[200.0, 201.0]]])
+
+    assert block.shape == (10, 2) and len(block) == 10
+    for rows in ([8, 1, 9, 0], np.arange(10), [7, 8], slice(2, 9), merged[:, 0] > 4):
+        np.testing.assert_array_equal(block[rows], merged[rows])
+    assert block[9][0] == 200.0
+    np.testing.assert_array_equal(block @ np.array([1.0, -1.0]), merged @ np.array([1.0, -1.0]))
+    np.testing.assert_array_equal(np.asarray(block), merged)
+
+
+def test_ingest_log_reads_what_was_appended_since_an_offset(new_tracks, tmp_path):
+    log = IngestLog(str(tmp_path / 'log' / 'ingested.csv'))
+    empty, empty_end = log.read_since(0)
+    assert empty.empty
+
+    start, end = log.append(new_tracks.iloc[:3])
+    assert start == empty_end and end > start
+    # Another process appending to the same file continues at the end of the log
+    assert IngestLog(log.path).append(new_tracks.iloc[3:5]) == (end, log.read_since(0)[1])
+
+    since, offset = log.read_since(end)
+    assert list(since['track_id']) == list(new_tracks['track_id'].iloc[3:5])
+    assert log.read_since(offset)[0].empty
+    assert list(log.read()['track_id']) == list(new_tracks['track_id'].iloc[:5])
+    np.testing.assert_allclose(log.read()['energy'], new_tracks['energy'].iloc[:5], rtol=1e-6)
+
+
+def test_compacted_rows_move_to_the_archive_and_offsets_stay_valid(new_tracks, tmp_path):
+    log = IngestLog(str(tmp_path / 'ingested.csv'))
+    _, behind = log.append(new_tracks.iloc[:1])
+    _, covered = log.append(new_tracks.iloc[1:3])
+    _, end = log.append(new_tracks.iloc[3:5])
+    size = os.path.getsize(log.path)
+
+    assert log.compact(covered) > 0
+    assert os.path.getsize(log.path) < size and os.path.exists(log.archive_path)
+    assert log.compact(covered) == 0
+    # Refits still see every track, readers of the live log only the uncovered ones
+    assert list(log.read()['track_id']) == list(new_tracks['track_id'].iloc[:5])
+    assert list(log.read_since(covered)[0]['track_id']) == list(new_tracks['track_id'].iloc[3:5])
+    # A reader that fell behind before the compaction still gets everything after its offset
+    assert list(log.read_since(behind)[0]['track_id']) == list(new_tracks['track_id'].iloc[1:5])
+    assert log.read_since(end)[0].empty and log.read_since(end)[1] == end
+
+    start, after = IngestLog(log.path).append(new_tracks.iloc[5:6])
+    assert start == end and after > end
+    assert list(log.read_since(covered)[0]['track_id']) == list(new_tracks['track_id'].iloc[3:6])
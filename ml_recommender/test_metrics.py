@@ -0,0 +1,60 @@
+import threading
+
+from metrics import Metrics, timing_header
+
+
+def test_histogram_buckets_render_cumulative_counts():
+    metrics = Metrics()
+    for seconds in (0.0003, 0.002, 0.002, 0.004, 7.0):
+        metrics.observe('request_seconds', seconds, buckets=(0.001, 0.0025, 0.005, 5.0), help='Latency', cache='miss')
+
+    lines = metrics.render().splitlines()
+    assert lines[:2] == ['# HELP request_seconds Latency', '# TYPE request_seconds histogram']
+    assert lines[2:] == [
+        'request_seconds_bucket{cache="miss",le="0.001"} 1',
+        'request_seconds_bucket{cache="miss",le="0.0025"} 3',
+        'request_seconds_bucket{cache="miss",le="0.005"} 4',
+        'request_seconds_bucket{cache="miss",le="5.0"} 4',
+        'request_seconds_bucket{cache="miss",le="+Inf"} 5',
+        f'request_seconds_sum{{cache="miss"}} {0.0003 + 0.002 + 0.002 + 0.004 + 7.0!r}',
+        'request_seconds_count{cache="miss"} 5',
+    ]
+
+
+def test_bucket_bounds_are_inclusive_and_counters_add_up():
+    metrics = Metrics()
+    metrics.observe('size', 10, buckets=(10, 100))
+    metrics.inc('requests_total', status=200)
+    metrics.inc('requests_total', 2, status=200)
+    metrics.callback('pending', lambda: 3)
+    text = metrics.render()
+    assert 'size_bucket{le="10"} 1' in text
+    assert 'requests_total{status="200"} 3' in text
+    assert '# TYPE pending gauge\npending 3' in text
+
+
+def test_stage_timings_are_collected_per_thread():
+    metrics = Metrics()
+    other = {}
+
+    def record_elsewhere():
+        with metrics.collect() as timings:
+            metrics.record_stage('scoring', 5.0)
+        other.update(timings)
+
+    with metrics.collect() as timings:
+        lap = metrics.stopwatch()
+        lap('queries')
+        with metrics.stage('scoring'):
+            thread = threading.Thread(target=record_elsewhere)
+            thread.start()
+            thread.join()
+        metrics.record_stage('scoring', 1.0)
+    metrics.record_stage('scoring', 1.0)  # outside collect(), only the histogram sees it
+
+    assert set(timings) == {'queries', 'scoring'}
+    assert 1.0 <= timings['scoring'] < 5.0
+    assert other == {'scoring': 5.0}
+    assert 'recommender_stage_seconds_count{stage="scoring"} 4' in metrics.render()
+    assert timing_header({'scoring': 0.0125}, 0.02) == 'scoring;dur=12.500, total;dur=20.000'
+    assert timing_header({}, 0.001) == 'total;dur=1.000'
@@ -0,0 +1,136 @@
+import numpy as np
+
+from catalog import MISSING_YEAR
+from conftest import feature_seed
+
+YEAR_RANGE = 5
+
+
+def reference_ranking(model, seeds, n_recommendations, exclude_songs=()):
+    """The find_similar_songs scoring, one seed at a time over every catalog row
+
+    Follows the original per-seed implementation: 0.6 * similarity, the genre
+    bonus, the cluster diversity bonus against the first eligible row and the
+    popularity blend, with a +-5 year window that is ignored when it leaves
+    nothing to recommend. Excluded tracks stay excluded inside the window, and
+    seeds that are catalog tracks are excluded along with them.
+    """
+    catalog = model.catalog
+    ids = catalog.ids()
+    rows = np.array([catalog.row_of(seed.get('track_id')) for seed in seeds])
+    excluded = list(exclude_songs) + [seed['track_id'] for seed, row in zip(seeds, rows) if row >= 0]
+    not_excluded = ~np.isin(ids, excluded)
+
+    features = np.asarray(model.features)
+    lyrics = model.lyrics_features.toarray() if model.lyrics_features is not None else None
+    years = np.asarray(catalog.years)
+    clusters = np.asarray(model.clusters)
+    genres, subgenres = np.asarray(catalog.genre_codes), np.asarray(catalog.subgenre_codes)
+    popularity = np.asarray(catalog.popularity) / 100.0
+
+    results = []
+    for seed, row in zip(seeds, rows):
+        query_audio, query_lyrics = model.build_queries([seed], np.array([row]))
+        similarity = features @ query_audio[:, 0]
+        if query_lyrics is not None and lyrics is not None:
+            similarity = similarity + lyrics @ query_lyrics[:, 0]
+
+        eligible = not_excluded.copy()
+        if seed.get('release_date'):
+            year = int(seed['release_date'][:4])
+        else:
+            year = int(years[row]) if row >= 0 and years[row] != MISSING_YEAR else None
+        if year is not None:
+            in_window = eligible & (years >= year - YEAR_RANGE) & (years <= year + YEAR_RANGE)
+            if in_window.any():
+                eligible = in_window
+
+        genre = seed.get('playlist_genre') or (catalog.genre_names[genres[row]] if row >= 0 else '')
+        subgenre = seed.get('playlist_subgenre') or (catalog.subgenre_names[subgenres[row]] if row >= 0 else '')
+        bonus = 0.1 * (genres == catalog.genre_code(genre)) + 0.05 * (subgenres == catalog.subgenre_code(subgenre))
+        diversity = 0.1 * (clusters != clusters[np.flatnonzero(eligible)[0]])
+        scores = 0.7 * (0.6 * similarity + 0.1 * bonus + diversity) + 0.3 * popularity
+
+        candidates = np.flatnonzero(eligible)
+        order = np.lexsort((candidates, -scores[candidates]))[:n_recommendations]
+        results.append([(ids[i], scores[i]) for i in candidates[order]])
+    return results
+
+
+def assert_same_ranking(recommendations, reference):
+    """Same track ids in the same order, and scores equal up to BLAS rounding"""
+    assert len(recommendations) == len(reference)
+    for recs, expected in zip(recommendations, reference):
+        assert [rec['track_id'] for rec in recs] == [track_id for track_id, _ in expected]
+        np.testing.assert_allclose([rec['similarity_score'] for rec in recs],
+                                   [score for _, score in expected], rtol=1e-9)
+
+
+def ranking(recs):
+    return [(rec['track_id'], rec['similarity_score']) for rec in recs]
+
+
+def test_batched_scoring_matches_reference(recommender, track_ids):
+    rng = np.random.default_rng(3)
+    seeds = [{'track_id': track_id} for track_id in rng.choice(track_ids, 6, replace=False)]
+    seeds += [feature_seed(rng) for _ in range(4)]
+    seeds.append({'audio_features': {'energy': 0.9}})
+    exclude_songs = list(rng.choice(track_ids, 40, replace=False))
+
+    recommendations = recommender.find_similar_songs_batch(seeds, n_recommendations=15,
+                                                           exclude_songs=exclude_songs)
+    assert_same_ranking(recommendations, reference_ranking(recommender, seeds, 15, exclude_songs))
+
+
+def test_batch_equals_single_seed_calls(recommender, track_ids):
+    rng = np.random.default_rng(4)
+    seeds = [feature_seed(rng) for _ in range(5)]
+    batch = recommender.find_similar_songs_batch(seeds, n_recommendations=10)
+    single = [recommender.find_similar_songs_batch([seed], n_recommendations=10)[0] for seed in seeds]
+    assert_same_ranking(batch, [ranking(recs) for recs in single])
+
+
+def test_year_window_keeps_exclusions(recommender):
+    """Tracks excluded by the caller are not brought back by the release year window"""
+    years = np.asarray(recommender.catalog.years)
+    ids = recommender.catalog.ids()
+    year = int(np.median(years[years != MISSING_YEAR]))
+    in_window = (years >= year - YEAR_RANGE) & (years <= year + YEAR_RANGE)
+    window_ids = np.unique(ids[in_window])
+    kept = set(window_ids[:3])
+    exclude_songs = [track_id for track_id in window_ids if track_id not in kept]
+
+    seed = feature_seed(np.random.default_rng(5), release_year=year)
+    recs = recommender.find_similar_songs_batch([seed], n_recommendations=10, exclude_songs=exclude_songs)[0]
+    assert {rec['track_id'] for rec in recs} == kept
+
+
+def test_year_window_is_ignored_when_everything_in_it_is_excluded(recommender):
+    years = np.asarray(recommender.catalog.years)
+    ids = recommender.catalog.ids()
+    year = int(np.median(years[years != MISSING_YEAR]))
+    in_window = (years >= year - YEAR_RANGE) & (years <= year + YEAR_RANGE)
+    exclude_songs = list(np.unique(ids[in_window]))
+
+    seed = feature_seed(np.random.default_rng(6), release_year=year)
+    recs = recommender.find_similar_songs_batch([seed], n_recommendations=10, exclude_songs=exclude_songs)[0]
+    assert len(recs) == 10
+    assert not {rec['track_id'] for rec in recs} & set(exclude_songs)
+    assert_same_ranking([recs], reference_ranking(recommender, [seed], 10, exclude_songs))
+
+
+def test_catalog_seeds_are_not_recommended_back(recommender, track_ids):
+    ids = recommender.catalog.ids()
+    duplicated = next(track_id for track_id in track_ids if (ids == track_id).sum() > 1)
+    seeds = [{'track_id': duplicated}, {'track_id': track_ids[0]}, feature_seed(np.random.default_rng(7))]
+
+    recommendations = recommender.find_similar_songs_batch(seeds, n_recommendations=50)
+    for recs in recommendations:
+        assert not {rec['track_id'] for rec in recs} & {duplicated, track_ids[0]}
+
+
+def test_catalog_seed_ranks_from_its_catalog_row(recommender, track_ids):
+    """A seed given only by track id takes its vectors, release year and genres from the catalog"""
+    seed = {'track_id': track_ids[10]}
+    recs = recommender.find_similar_songs_batch([seed], n_recommendations=10)[0]
+    assert_same_ranking([recs], reference_ranking(recommender, [seed], 10))
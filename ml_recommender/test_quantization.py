@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from conftest import feature_seed
+import quantization
+from quantization import column_scale, dequantize, dtype_variant, quantize, stored_product
+from segments import Segmented
+
+
+@pytest.fixture
+def blocks():
+    rng = np.random.default_rng(5)
+    dense = rng.normal(size=(50, 6)) * np.array([1.0, 0.01, 5.0, 0.2, 1.0, 0.0])
+    lyrics = sp.random(50, 40, density=0.1, format='csr', random_state=6)
+    return dense, lyrics
+
+
+def test_int8_round_trip_is_within_half_a_scale_step(blocks):
+    for matrix in blocks:
+        scale = column_scale(matrix)
+        restored = dequantize(quantize(matrix, scale), scale)
+        dense = matrix.toarray() if sp.issparse(matrix) else matrix
+        restored = restored.toarray() if sp.issparse(restored) else restored
+        assert np.all(np.abs(restored - dense) <= scale / 2 + 1e-12)
+    # Columns without values keep a unit scale instead of dividing by zero
+    assert column_scale(blocks[0])[5] == 1.0
+
+
+def test_values_beyond_the_scale_are_clipped(blocks):
+    dense, _ = blocks
+    scale = column_scale(dense)
+    quantized = quantize(dense * 3, scale)
+    assert quantized.dtype == np.int8
+    assert quantized.max() == 127 and quantized.min() == -127
+
+
+def test_stored_product_matches_float64_scoring(blocks, monkeypatch):
+    # Small score blocks, so every product runs over several of them
+    monkeypatch.setattr(quantization, 'SCORE_BLOCK_ROWS', 7)
+    rng = np.random.default_rng(7)
+    for matrix in blocks:
+        scale = column_scale(matrix)
+        stored = quantize(matrix, scale)
+        query = rng.normal(size=(matrix.shape[1], 3))
+        expected = dequantize(stored, scale) @ query
+        # The model folds the scales into the query and scores in float32
+        scores = stored_product(stored, (query * scale[:, None]).astype(np.float32))
+        assert scores.dtype == np.float32
+        np.testing.assert_allclose(scores, expected, rtol=1e-5, atol=1e-5)
+
+        segmented = Segmented(stored[:20], stored[20:])
+        np.testing.assert_allclose(stored_product(segmented, (query * scale[:, None]).astype(np.float32)),
+                                   expected, rtol=1e-5, atol=1e-5)
+
+
+def test_int8_model_scores_its_dequantized_features(recommender):
+    quantized = dtype_variant(recommender, 'int8')
+    assert quantized.features.dtype == np.int8 and quantized.lyrics_features.dtype == np.int8
+    rng = np.random.default_rng(8)
+    seeds = [feature_seed(rng) for _ in range(4)]
+    query_audio, query_lyrics = quantized.build_queries(seeds)
+
+    audio_features, lyrics_features = quantized.feature_rows(slice(None))
+    expected = audio_features @ query_audio + lyrics_features @ query_lyrics
+    np.testing.assert_allclose(quantized.similarity(query_audio, query_lyrics), expected, rtol=1e-4, atol=1e-5)
+    # Quantization moves each score by little compared with the score range
+    reference = recommender.similarity(*recommender.build_queries(seeds))
+    assert np.abs(quantized.similarity(query_audio, query_lyrics) - reference).max() < 0.05
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from data_processor import AUDIO_FEATURES
+from reduction import reduced_variant
+
+N_BASE = len(AUDIO_FEATURES) + 2
+
+
+def unit_rows(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope='module')
+def reduced(prepared):
+    return reduced_variant(prepared, 16)
+
+
+def test_reduced_variant_replaces_the_lyrics_block(prepared, reduced):
+    assert reduced.lyrics_features is None and reduced.lyrics_components.shape[0] == 16
+    assert reduced.features.shape == (prepared.features.shape[0], N_BASE + 16)
+    np.testing.assert_allclose(np.linalg.norm(reduced.features, axis=1), 1.0)
+    assert reduced.centroids.shape == (prepared.centroids.shape[0], N_BASE + 16)
+    # The original model keeps its sparse lyrics
+    assert prepared.lyrics_features is not None and prepared.lyrics_components is None
+
+
+def test_query_lyrics_are_projected_like_the_catalog_rows(prepared, reduced):
+    lyrics = prepared.df['lyrics']
+    rows = np.flatnonzero(lyrics.notna().to_numpy())[:20]
+    rows = rows[np.abs(reduced.features[rows, N_BASE:]).sum(axis=1) > 0]
+    assert len(rows) >= 10
+
+    query_audio, query_lyrics = reduced.build_queries([{'lyrics': lyrics.iloc[row]} for row in rows])
+    assert query_lyrics is None
+    # Up to the weight the lyrics get next to the audio, a track's own lyrics land on its catalog projection
+    np.testing.assert_allclose(unit_rows(query_audio[N_BASE:].T), unit_rows(reduced.features[rows, N_BASE:]),
+                               atol=1e-6)
+
+
+def test_added_tracks_are_projected_like_the_catalog_rows(reduced, new_tracks):
+    tracks = new_tracks.iloc[:5]
+    updated = reduced.add_tracks(tracks)
+    rows = updated.catalog.rows_for(tracks['track_id'])
+    query_audio, _ = reduced.build_queries([{'lyrics': text} for text in tracks['lyrics']])
+    np.testing.assert_allclose(unit_rows(np.asarray(updated.features[rows])[:, N_BASE:]),
+                               unit_rows(query_audio[N_BASE:].T), atol=1e-6)
@@ -0,0 +1,105 @@
+import copy
+import time
+
+import pytest
+
+from data_processor import DataProcessor
+from feature_store import resolve_artifact, save_artifact
+from registry import ModelRegistry
+
+
+@pytest.fixture
+def artifacts(prepared, tmp_path):
+    """Three artifact versions of the prepared recommender; 'v3' is LATEST"""
+    for version in ('v1', 'v2', 'v3'):
+        model = copy.copy(prepared)
+        model.version = version
+        save_artifact(model, tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def registry(artifacts):
+    registry = ModelRegistry(str(artifacts), processor_factory=lambda: DataProcessor('unused.csv'),
+                             recommender_options={})
+    yield registry
+    registry.stop()
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_load_async_swaps_in_a_version(registry):
+    registry.activate(registry.load_version())
+    assert registry.active.version == 'v3'
+
+    assert registry.load_async('v1')
+    wait_for(lambda: registry.loading_version is None)
+    assert registry.active.version == 'v1' and registry.last_error is None
+    # Without publish, LATEST is left alone
+    assert resolve_artifact(registry.artifact_dir).name == 'v3'
+
+
+def test_failed_load_keeps_the_active_model(registry):
+    registry.activate(registry.load_version('v2'))
+    assert registry.load_async('missing', publish=True)
+    wait_for(lambda: registry.loading_version is None)
+    assert registry.active.version == 'v2'
+    assert 'missing' in registry.last_error
+    assert resolve_artifact(registry.artifact_dir).name == 'v3'
+
+
+def test_activate_applies_prepare_and_update_keeps_it(artifacts):
+    def tag(model):
+        model = copy.copy(model)
+        model.version += '+1'
+        return model
+
+    registry = ModelRegistry(str(artifacts), processor_factory=lambda: DataProcessor('unused.csv'),
+                             recommender_options={}, prepare=tag)
+    active = registry.activate(registry.load_version('v1'))
+    assert registry.active is active and active.version == 'v1+1'
+    assert registry.update(lambda model: model) is active
+    assert registry.update(tag).version == 'v1+1+1'
+
+
+def test_watch_follows_latest(registry, prepared, artifacts):
+    registry.activate(registry.load_version('v2'))
+    registry.watch(0.01)
+    wait_for(lambda: registry.active.version == 'v3')
+
+    model = copy.copy(prepared)
+    model.version = 'v4'
+    save_artifact(model, artifacts)
+    wait_for(lambda: registry.active.version == 'v4')
+
+
+def test_published_version_is_not_reverted_by_the_watcher(registry):
+    registry.activate(registry.load_version())
+    registry.watch(0.01)
+    assert registry.load_async('v1', publish=True)
+    wait_for(lambda: registry.active.version == 'v1' and registry.loading_version is None)
+    assert resolve_artifact(registry.artifact_dir).name == 'v1'
+
+    time.sleep(0.2)  # many polls
+    assert registry.active.version == 'v1'
+    # Another worker watching the same directory follows the rollback
+    other = ModelRegistry(registry.artifact_dir, processor_factory=lambda: DataProcessor('unused.csv'),
+                          recommender_options={})
+    assert other.load_version().version == 'v1'
+
+
+def test_poll_refreshes_the_active_version(artifacts):
+    refreshed = []
+    registry = ModelRegistry(str(artifacts), processor_factory=lambda: DataProcessor('unused.csv'),
+                             recommender_options={}, refresh=lambda model: refreshed.append(model) or model)
+    registry.poll_once()
+    assert refreshed == []  # nothing active yet
+
+    registry.activate(registry.load_version())
+    registry.poll_once()
+    assert refreshed == [registry.active]
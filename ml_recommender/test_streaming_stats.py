@@ -0,0 +1,92 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.streaming_stats import CategoricalSummary, NumericSummary
+
+
+@pytest.fixture(scope='module')
+def songs(catalog_csv, tmp_path_factory):
+    """The test catalog with some missing values, and the path of its CSV"""
+    frame = pd.read_csv(catalog_csv)
+    rng = np.random.default_rng(3)
+    for column in ['energy', 'tempo', 'playlist_genre']:
+        frame.loc[rng.random(len(frame)) < 0.1, column] = np.nan
+    path = tmp_path_factory.mktemp('stats') / 'songs.csv'
+    frame.to_csv(path, index=False)
+    return pd.read_csv(path), path
+
+
+def summarize(path, numeric_columns, categorical_columns, chunksize=200, **options):
+    numeric = NumericSummary(numeric_columns)
+    categorical = CategoricalSummary(categorical_columns, **options)
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        numeric.update(chunk)
+        categorical.update(chunk)
+    return numeric, categorical
+
+
+def test_numeric_summary_matches_pandas(songs):
+    frame, path = songs
+    columns = frame.select_dtypes(include=[np.number]).columns
+    numeric, _ = summarize(path, columns, [])
+
+    expected = frame[columns].describe()
+    for column, stats in numeric.describe().items():
+        for stat, value in stats.items():
+            assert value == pytest.approx(expected.loc[stat, column], rel=1e-9, abs=1e-9), (column, stat)
+    assert numeric.missing_values() == frame[columns].isna().sum().to_dict()
+    pd.testing.assert_frame_equal(pd.DataFrame(numeric.correlations()), frame[columns].corr(), atol=1e-9)
+
+
+def test_categorical_summary_matches_pandas(songs):
+    frame, path = songs
+    columns = ['playlist_genre', 'track_artist', 'track_id']
+    _, categorical = summarize(path, [], columns)
+
+    summary = categorical.summary(top_n=3)
+    for column in columns:
+        assert summary[column]['unique_values'] == frame[column].nunique()
+        assert summary[column]['missing_values'] == frame[column].isna().sum()
+        assert summary[column]['count_error'] == 0
+    genres = frame['playlist_genre'].value_counts()
+    assert summary['playlist_genre']['most_common'] == genres.head(3).to_dict()
+
+
+def test_distinct_values_are_estimated_once_counts_are_dropped(songs):
+    frame, path = songs
+    _, categorical = summarize(path, [], ['track_id'], capacity=100)
+    assert categorical.count_error['track_id'] > 0
+    assert len(categorical.counts['track_id']) == 100
+    # The HyperLogLog estimate takes over from the truncated value counts
+    assert categorical.distinct('track_id') == pytest.approx(frame['track_id'].nunique(), rel=0.05)
+
+
+def test_merged_summaries_match_one_pass_and_leave_the_other_unchanged(songs):
+    frame, path = songs
+    numeric_columns = ['energy', 'tempo', 'track_popularity']
+    categorical_columns = ['playlist_genre', 'track_artist']
+    numeric, categorical = summarize(path, numeric_columns, categorical_columns)
+
+    chunks = pd.read_csv(path, chunksize=len(frame) // 3)
+    first, second = next(chunks), pd.concat(chunks)
+    merged = NumericSummary(numeric_columns).update(first)
+    other = NumericSummary(numeric_columns).update(second)
+    assert not np.array_equal(merged.shift, other.shift)
+    before = copy.deepcopy(other)
+    merged.merge(other)
+    for name in ['shift', 'sums', 'squares', 'products', 'pair_counts']:
+        np.testing.assert_array_equal(getattr(other, name), getattr(before, name))
+    assert other.describe() == before.describe()
+
+    one_pass = numeric.describe()
+    for column, stats in merged.describe().items():
+        assert stats == pytest.approx(one_pass[column], rel=1e-9)
+    pd.testing.assert_frame_equal(pd.DataFrame(merged.correlations()), pd.DataFrame(numeric.correlations()),
+                                  atol=1e-9)
+
+    merged_categorical = CategoricalSummary(categorical_columns).update(first)
+    merged_categorical.merge(CategoricalSummary(categorical_columns).update(second))
+    assert merged_categorical.summary() == categorical.summary()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from topk import top_k
+
+
+def reference_top_k(scores, k):
+    """Full sort by score descending, ties by ascending row id"""
+    order = np.lexsort((np.arange(len(scores)), -scores))[:k]
+    return order, scores[order]
+
+
+def test_ties_at_the_cut_keep_the_lowest_rows():
+    scores = np.array([0.5, 0.9, 0.7, 0.7, 0.1, 0.7, 0.7, 0.9])
+    rows, top_scores = top_k(scores, 4)
+    np.testing.assert_array_equal(rows, [1, 7, 2, 3])
+    np.testing.assert_array_equal(top_scores, [0.9, 0.9, 0.7, 0.7])
+
+
+def test_matches_a_full_sort_column_by_column():
+    rng = np.random.default_rng(0)
+    # Few distinct values, so most cuts fall inside a run of ties
+    scores = rng.integers(0, 5, size=(200, 6)).astype(float)
+    scores[rng.random(scores.shape) < 0.1] = -np.inf
+    for k in (1, 7, 50, 200, 250):
+        rows, top_scores = top_k(scores, k)
+        for j in range(scores.shape[1]):
+            expected_rows, expected_scores = reference_top_k(scores[:, j], k)
+            np.testing.assert_array_equal(rows[:, j], expected_rows)
+            np.testing.assert_array_equal(top_scores[:, j], expected_scores)
+
+
+def test_empty_selection():
+    rows, top_scores = top_k(np.ones((4, 2)), 0)
+    assert rows.shape == (0, 2) and top_scores.shape == (0, 2)
+